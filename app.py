@@ -3,10 +3,14 @@ import time
 import threading
 import os
 import datetime
-import queue
+from collections import deque
+from functools import lru_cache
+from itertools import islice
 
 # Importa as classes e serviços de dentro do seu pacote src
 from src.services.simulation import PaymentSimulator
+from src.services.event_bus import EventBus, INFO, COR, ORIGEM, ANIMACAO, formatar_mensagem, expandir_animacao
+from src.services.metrics import Metricas
 
 # --- Configurações Iniciais ---
 output_dir = "data/output"
@@ -19,6 +23,11 @@ logger = logging.getLogger(__name__)
 
 logger.info("app.py: Script iniciado.")
 
+# --- Limites do Log na Tela ---
+LIMITE_LOG = 2000 # Mensagens guardadas na sessão (memória constante em simulações longas)
+JANELA_LOG = 300 # Mensagens mais recentes renderizadas a cada atualização
+INTERVALO_METRICAS = 0.5 # Segundos entre redesenhos da tabela de métricas
+
 st.set_page_config(
     page_title="Simulador de Fluxo de Pagamentos",
     page_icon="💳",
@@ -30,7 +39,8 @@ st.write("Este aplicativo simula o complexo fluxo de transações financeiras, i
 
 # --- Inicialização do Estado da Sessão do Streamlit ---
 if 'log_messages' not in st.session_state:
-    st.session_state.log_messages = ["Clique em 'Iniciar Simulação' para começar..."]
+    st.session_state.log_messages = deque(["Clique em 'Iniciar Simulação' para começar..."], maxlen=LIMITE_LOG)
+    st.session_state.total_log_messages = 1
     logger.info("app.py: st.session_state.log_messages inicializado.")
 if 'simulation_running' not in st.session_state:
     st.session_state.simulation_running = False
@@ -38,16 +48,11 @@ if 'simulation_running' not in st.session_state:
 if 'thread_finished' not in st.session_state:
     st.session_state.thread_finished = False
     logger.info("app.py: st.session_state.thread_finished inicializado.")
-if 'log_queue' not in st.session_state:
-    st.session_state.log_queue = queue.Queue()
-    logger.info("app.py: st.session_state.log_queue inicializado.")
-
-# --- Placeholders para Atualizações Dinâmicas na UI ---
-status_placeholder = st.empty()
-# Novo placeholder para a animação
-animation_placeholder = st.empty()
-log_placeholder = st.empty()
-
+if 'eventos' not in st.session_state:
+    st.session_state.eventos = EventBus()
+    logger.info("app.py: st.session_state.eventos inicializado.")
+if 'metricas' not in st.session_state:
+    st.session_state.metricas = None
 
 # --- Funções Auxiliares para Animação ---
 def get_image_path(entity_name):
@@ -56,167 +61,219 @@ def get_image_path(entity_name):
     return f"{base_path}/{entity_name}.png"
 
 
+# Definição das entidades e seus IDs (para consistência com o CSS)
+ENTITIES = {
+    "client": {"label": "Cliente"},
+    "store": {"label": "Estabelecimento"},
+    "acquirer": {"label": "Adquirente"},
+    "flag": {"label": "Bandeira"},
+    "issuer": {"label": "Emissor"},
+    "bcb": {"label": "Banco Central"},
+}
+
+# CSS para layout e destaque (injetado uma única vez por execução do script, fora dos quadros)
+ANIMATION_CSS = """
+<style>
+    .animation-container {
+        display: flex;
+        justify-content: space-around;
+        align-items: flex-start; /* Alinha no topo para que a descrição não mova */
+        padding: 10px;
+        margin-bottom: 20px;
+        background-color: #f0f2f6;
+        border-radius: 10px;
+        flex-wrap: wrap; /* Permite que os itens quebrem a linha em telas menores */
+    }
+    .entity-box {
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+        text-align: center;
+        margin: 10px;
+        padding: 10px;
+        border: 2px solid transparent; /* Borda transparente padrão */
+        border-radius: 8px;
+        transition: border-color 0.3s ease-in-out, box-shadow 0.3s ease-in-out; /* Transição suave */
+        min-width: 120px; /* Garante largura mínima */
+    }
+    .entity-box.active {
+        border-color: #4CAF50; /* Borda verde para entidade ativa */
+        box-shadow: 0 0 10px rgba(76, 175, 80, 0.5); /* Sombra suave */
+    }
+    .entity-box img {
+        width: 80px;
+        height: 80px;
+        object-fit: contain;
+        margin-bottom: 5px;
+    }
+    .flow-indicator {
+        font-size: 1.1em;
+        font-weight: bold;
+        color: #555;
+        margin-top: 10px;
+        width: 100%; /* Ocupa a largura total para centralizar */
+        text-align: center;
+        min-height: 25px; /* Para evitar pular o layout */
+        display: flex; /* Para alinhar o ícone do pagamento */
+        justify-content: center;
+        align-items: center;
+    }
+</style>
+"""
+
+TOKEN_IMG = "<img src='assets/images/payment_token.png' width='25px' style='vertical-align:middle; margin: 0 5px;'>"
+
+# flow_paths emitidos pelas entidades/serviços (src/); os quadros deles são pré-compilados
+KNOWN_FLOW_PATHS = (
+    "acquirer_to_bcb_report", "acquirer_to_flag", "acquirer_to_flag_capture", "acquirer_to_flag_representment",
+    "acquirer_to_store_chargeback", "acquirer_to_store_denial", "acquirer_to_store_payment", "acquirer_to_store_receipt",
+    "client_to_issuer_chargeback", "client_to_store", "client_to_store_token", "flag_to_acquirer",
+    "flag_to_acquirer_chargeback", "flag_to_acquirer_settlement", "flag_to_acquirer_settlement_file", "flag_to_acquirer_sftp",
+    "flag_to_bcb_report", "flag_to_issuer", "flag_to_issuer_cb_resolution", "flag_to_issuer_evaluation",
+    "flag_to_issuer_settlement", "flag_to_issuer_settlement_file", "flag_to_issuer_sftp", "issuer_approves",
+    "issuer_bill_generated", "issuer_denies", "issuer_to_bcb_report", "issuer_to_client_bill",
+    "issuer_to_client_cb_decision", "issuer_to_flag_chargeback", "store_to_acquirer", "store_to_acquirer_defense",
+)
+
+
+def _compile_flow_path(flow_path_display):
+    """Converte um flow_path no HTML do indicador de fluxo (usado só na pré-compilação)."""
+    if not flow_path_display:
+        return ""
+    # Substitui '_to_' e '_from_' por setas para visualização do fluxo
+    # e insere o ícone de pagamento no meio do fluxo
+    path_parts = flow_path_display.split('_to_')
+    if len(path_parts) == 2:
+        source = path_parts[0].capitalize()
+        dest = path_parts[1].capitalize()
+        flow_display = f"{source} &#8594; {TOKEN_IMG} &#8594; {dest}"
+    else: # Handle 'from' cases or simpler flows
+        path_parts = flow_path_display.split('_from_')
+        if len(path_parts) == 2:
+            source = path_parts[1].capitalize() # 'from' é o destino, então o segundo é a origem
+            dest = path_parts[0].capitalize()
+            flow_display = f"{source} &#8594; {TOKEN_IMG} &#8594; {dest}"
+        elif 'token' not in flow_path_display:
+            # Se não tiver token, talvez seja um passo interno ou de setup
+            flow_display = "" # Limpa para não mostrar "client -> store" sem o token
+        else:
+            flow_display = flow_path_display.replace('token', '<img src="assets/images/payment_token.png" width="25px" style="vertical-align:middle; margin: 0 5px;">')
+    return f"<br><small>{flow_display}</small>" # Usa small para o fluxo
+
+
+def _compile_container(active_entities):
+    """HTML das seis caixas de entidade, com destaque nas ativas."""
+    boxes = []
+    for entity_id, data in ENTITIES.items():
+        active_class = "active" if entity_id in active_entities else ""
+        boxes.append(f"""
+        <div class="entity-box {active_class}">
+            <img src="{get_image_path(entity_id)}" alt="{data['label']}">
+            <strong>{data['label']}</strong>
+        </div>
+        """)
+    return "<div class='animation-container'>" + "".join(boxes) + "</div>"
+
+
+# Pré-compilação: as 64 combinações de entidades ativas e todos os flow_paths conhecidos
+ENTITY_MASKS = {entity_id: 1 << bit for bit, entity_id in enumerate(ENTITIES)}
+CONTAINER_FRAMES = tuple(
+    _compile_container([entity_id for entity_id, bit in ENTITY_MASKS.items() if mask & bit])
+    for mask in range(1 << len(ENTITIES))
+)
+FLOW_FRAMES = {flow_path: _compile_flow_path(flow_path) for flow_path in KNOWN_FLOW_PATHS}
+FLOW_FRAMES[None] = ""
+
+
+@lru_cache(maxsize=256)
+def _flow_frame_fallback(flow_path_display):
+    # flow_path fora da lista conhecida: compila uma vez e guarda
+    return _compile_flow_path(flow_path_display)
+
+
 def draw_animation_step(step_data):
     """
     Desenha um passo da animação com base nos dados recebidos.
     step_data: Dicionário com 'description', 'active_entities', 'flow_path'
+    O quadro é montado com pedaços pré-compilados: só a descrição é inserida na hora.
     """
     description = step_data.get('description', '')
-    active_entities = step_data.get('active_entities', [])
+    mask = 0
+    for entity_id in step_data.get('active_entities', ()):
+        mask |= ENTITY_MASKS.get(entity_id, 0)
     flow_path_display = step_data.get('flow_path', None)
+    flow_html = FLOW_FRAMES.get(flow_path_display)
+    if flow_html is None:
+        flow_html = _flow_frame_fallback(flow_path_display)
 
-    # Definição das entidades e seus IDs (para consistência com o CSS)
-    entities = {
-        "client": {"label": "Cliente"},
-        "store": {"label": "Estabelecimento"},
-        "acquirer": {"label": "Adquirente"},
-        "flag": {"label": "Bandeira"},
-        "issuer": {"label": "Emissor"},
-        "bcb": {"label": "Banco Central"},
-    }
+    html_content = f"{CONTAINER_FRAMES[mask]}<div class='flow-indicator'>{description}{flow_html}</div>"
+    animation_placeholder.markdown(html_content, unsafe_allow_html=True)
 
-    # CSS para layout e destaque
-    css = """
-    <style>
-        .animation-container {
-            display: flex;
-            justify-content: space-around;
-            align-items: flex-start; /* Alinha no topo para que a descrição não mova */
-            padding: 10px;
-            margin-bottom: 20px;
-            background-color: #f0f2f6;
-            border-radius: 10px;
-            flex-wrap: wrap; /* Permite que os itens quebrem a linha em telas menores */
-        }
-        .entity-box {
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            text-align: center;
-            margin: 10px;
-            padding: 10px;
-            border: 2px solid transparent; /* Borda transparente padrão */
-            border-radius: 8px;
-            transition: border-color 0.3s ease-in-out, box-shadow 0.3s ease-in-out; /* Transição suave */
-            min-width: 120px; /* Garante largura mínima */
-        }
-        .entity-box.active {
-            border-color: #4CAF50; /* Borda verde para entidade ativa */
-            box-shadow: 0 0 10px rgba(76, 175, 80, 0.5); /* Sombra suave */
-        }
-        .entity-box img {
-            width: 80px;
-            height: 80px;
-            object-fit: contain;
-            margin-bottom: 5px;
-        }
-        .flow-indicator {
-            font-size: 1.1em;
-            font-weight: bold;
-            color: #555;
-            margin-top: 10px;
-            width: 100%; /* Ocupa a largura total para centralizar */
-            text-align: center;
-            min-height: 25px; /* Para evitar pular o layout */
-            display: flex; /* Para alinhar o ícone do pagamento */
-            justify-content: center;
-            align-items: center;
-        }
-    </style>
-    """
-    
-    html_content = f"{css}<div class='animation-container'>"
-
-    # Adiciona as entidades ao container, com destaque se estiverem ativas
-    for entity_id, data in entities.items():
-        is_active = entity_id in active_entities
-        active_class = "active" if is_active else ""
-        
-        img_src = get_image_path(entity_id) 
-        
-        html_content += f"""
-        <div class="entity-box {active_class}">
-            <img src="{img_src}" alt="{data['label']}">
-            <strong>{data['label']}</strong>
-        </div>
-        """
-    html_content += "</div>"
-
-    # Adiciona a descrição da etapa e o indicador de fluxo
-    html_content += f"<div class='flow-indicator'>{description}"
-    if flow_path_display:
-        # Substitui '_to_' e '_from_' por setas para visualização do fluxo
-        # e insere o ícone de pagamento no meio do fluxo
-        path_parts = flow_path_display.split('_to_')
-        if len(path_parts) == 2:
-            source = path_parts[0].capitalize()
-            dest = path_parts[1].capitalize()
-            flow_display = f"{source} &#8594; <img src='assets/images/payment_token.png' width='25px' style='vertical-align:middle; margin: 0 5px;'> &#8594; {dest}"
-        else: # Handle 'from' cases or simpler flows
-            path_parts = flow_path_display.split('_from_')
-            if len(path_parts) == 2:
-                source = path_parts[1].capitalize() # 'from' é o destino, então o segundo é a origem
-                dest = path_parts[0].capitalize()
-                flow_display = f"{source} &#8594; <img src='assets/images/payment_token.png' width='25px' style='vertical-align:middle; margin: 0 5px;'> &#8594; {dest}"
-            else: # Fallback para casos não mapeados, ou fluxo simples
-                 flow_display = flow_path_display.replace('_', ' &#8594; ')
-                 # Se não tiver token, talvez seja um passo interno ou de setup
-                 if 'token' not in flow_path_display:
-                     flow_display = "" # Limpa para não mostrar "client -> store" sem o token
-                 else:
-                     flow_display = flow_path_display.replace('token', '<img src="assets/images/payment_token.png" width="25px" style="vertical-align:middle; margin: 0 5px;">')
-
-
-        html_content += f"<br><small>{flow_display}</small>" # Usa small para o fluxo
-
-    html_content += "</div>"
 
-    animation_placeholder.markdown(html_content, unsafe_allow_html=True)
+# CSS da animação injetado uma vez, antes dos quadros (que passam a levar só o HTML)
+st.markdown(ANIMATION_CSS, unsafe_allow_html=True)
 
+# --- Placeholders para Atualizações Dinâmicas na UI ---
+status_placeholder = st.empty()
+# Novo placeholder para a animação
+animation_placeholder = st.empty()
+log_placeholder = st.empty()
+metricas_placeholder = st.empty()
 
 
+# --- Formatação dos Eventos da Simulação (na thread principal, só para o que é exibido) ---
+COLOR_MAP = {
+    "white": "black", "blue": "#1E90FF", "green": "#32CD32",
+    "red": "#FF4500", "yellow": "#FFD700", "magenta": "#DA70D6",
+    "lightblue": "#ADD8E6", "black": "black",
+}
 
-# --- Callback para Enviar Logs da Simulação para a FILA (na thread secundária) ---
-def streamlit_log_callback(q: queue.Queue, message: str, color_tag: str = "black", animation_data=None):
-    """
-    Formata a mensagem com cores HTML e a coloca na fila,
-    junto com dados para a animação.
-    """
-    color_map = {
-        "white": "black", "blue": "#1E90FF", "green": "#32CD32",
-        "red": "#FF4500", "yellow": "#FFD700", "magenta": "#DA70D6",
-        "lightblue": "#ADD8E6", "black": "black",
-    }
-    html_color = color_map.get(color_tag, "black")
-    
-    formatted_message = f"<span style='color: {html_color};'>{message}</span>"
-    
-    try:
-        # Coloca um dicionário na fila com a mensagem formatada e os dados da animação
-        q.put({"log_message": formatted_message, "animation_data": animation_data}) 
-        logger.debug(f"app.py: Mensagem colocada na fila: {message}")
-    except Exception as e:
-        logger.error(f"app.py: Erro ao colocar log na fila: {e}", exc_info=True)
+
+def formatar_evento_html(evento):
+    """Formata a mensagem de um evento do EventBus com a cor HTML correspondente."""
+    html_color = COLOR_MAP.get(evento[COR], "black")
+    return f"<span style='color: {html_color};'>{formatar_mensagem(evento)}</span>"
+
+
+def render_log_tail():
+    """Renderiza só a cauda do log (as JANELA_LOG mensagens mais recentes)."""
+    mensagens = st.session_state.log_messages
+    ocultas = st.session_state.total_log_messages - min(len(mensagens), JANELA_LOG)
+    cauda = "<br>".join(islice(mensagens, max(len(mensagens) - JANELA_LOG, 0), None))
+    if ocultas > 0:
+        cauda = f"<small><i>... {ocultas} mensagens anteriores omitidas ...</i></small><br>{cauda}"
+    log_placeholder.markdown(cauda, unsafe_allow_html=True)
+
+
+def render_metricas():
+    """Tabela de latência por etapa (só as etapas já chamadas), se a coleta estiver ligada."""
+    metricas = st.session_state.metricas
+    if metricas is None:
+        return
+    linhas = [linha for linha in metricas.resumo() if linha["chamadas"]]
+    if linhas:
+        with metricas_placeholder.container():
+            st.subheader("Latência por etapa (ms)")
+            st.dataframe(linhas, use_container_width=True, hide_index=True)
 
 
 # --- Função para Rodar a Simulação em uma Thread Separada ---
-def run_simulation_in_thread_target(log_queue_ref: queue.Queue, log_callback_func, output_dir_path):
+def run_simulation_in_thread_target(eventos: EventBus, output_dir_path, metricas=None):
     """
-    Função alvo para a thread de simulação.
+    Função alvo para a thread de simulação. As entidades publicam eventos em lote no
+    EventBus; a thread principal drena o buffer em bloco. Com metricas, as etapas do
+    simulador são cronometradas e a thread principal lê o resumo periodicamente.
     """
     logger.info("app.py: Thread de simulação iniciada.")
     try:
-        # A PaymentSimulator agora espera um log_callback que pode receber 3 argumentos
-        simulator = PaymentSimulator(
-            output_dir=output_dir_path, 
-            log_callback=lambda msg, color, anim_data=None: log_callback_func(log_queue_ref, msg, color, anim_data)
-        )
+        simulator = PaymentSimulator(output_dir=output_dir_path, eventos=eventos, metricas=metricas)
         simulator.run_full_simulation()
     except Exception as e:
         # Em caso de erro crítico, ainda podemos logar e passar dados de animação
-        log_callback_func(log_queue_ref, f"ERRO CRÍTICO NA SIMULAÇÃO (THREAD): {e}", "red", {"description": "ERRO NA SIMULAÇÃO", "active_entities": [], "flow_path": None})
+        eventos.publicar((INFO, None, "ERRO CRÍTICO NA SIMULAÇÃO (THREAD): %s", (e,), "red", ("ERRO NA SIMULAÇÃO", (), None)))
         logger.error(f"app.py: Erro na thread de simulação: {e}", exc_info=True)
     finally:
+        eventos.flush() # Publica o último lote desta thread antes de sinalizar o fim
         st.session_state.thread_finished = True
         logger.info("app.py: st.session_state.thread_finished definido como True.")
 
@@ -224,16 +281,21 @@ def run_simulation_in_thread_target(log_queue_ref: queue.Queue, log_callback_fun
 # --- Lógica Principal do Streamlit App ---
 logger.info(f"app.py: Início da lógica principal. simulation_running: {st.session_state.simulation_running}")
 
+coletar_metricas = st.sidebar.checkbox("Coletar métricas por etapa", value=False,
+                                       help="Cronometra autorização, captura, liquidação, chargeback e regulatórios.")
+
 if st.button("Iniciar Simulação", disabled=st.session_state.simulation_running):
     logger.info("app.py: Botão 'Iniciar Simulação' clicado.")
     st.session_state.simulation_running = True
-    st.session_state.log_messages = [] # Limpa o log ao iniciar
+    st.session_state.log_messages = deque(maxlen=LIMITE_LOG) # Limpa o log ao iniciar
+    st.session_state.total_log_messages = 0
     st.session_state.thread_finished = False # Reseta o flag da thread
     
-    with st.session_state.log_queue.mutex:
-        st.session_state.log_queue.queue.clear() # Limpa a fila ao iniciar
+    st.session_state.eventos = EventBus() # Buffer novo a cada execução
+    st.session_state.metricas = Metricas() if coletar_metricas else None
     
     log_placeholder.empty() # Limpa o placeholder do log na UI
+    metricas_placeholder.empty()
     status_placeholder.empty() # Limpa o placeholder de status na UI
     animation_placeholder.empty() # Limpa o placeholder da animação
 
@@ -244,9 +306,9 @@ if st.button("Iniciar Simulação", disabled=st.session_state.simulation_running
         "flow_path": None
     })
     
-    # Inicia a thread de simulação, passando a fila de logs e a função de callback
-    thread = threading.Thread(target=run_simulation_in_thread_target, 
-                              args=(st.session_state.log_queue, streamlit_log_callback, output_dir))
+    # Inicia a thread de simulação, passando o bus de eventos
+    thread = threading.Thread(target=run_simulation_in_thread_target,
+                              args=(st.session_state.eventos, output_dir, st.session_state.metricas))
     thread.start()
     logger.info("app.py: Thread de simulação disparada.")
 
@@ -255,36 +317,34 @@ if st.session_state.simulation_running:
     logger.info("app.py: Entrando no loop de atualização de logs e animação.")
     status_placeholder.info("Simulação em andamento...")
     
-    while not st.session_state.thread_finished or not st.session_state.log_queue.empty():
-        # Processa todas as mensagens na fila para manter a UI atualizada
-        while not st.session_state.log_queue.empty():
-            try:
-                item = st.session_state.log_queue.get_nowait()
-                
-                # Adiciona a mensagem ao log textual
-                st.session_state.log_messages.append(item["log_message"])
-                
-                # ATUALIZA A ANIMAÇÃO
-                if item["animation_data"]:
-                    draw_animation_step(item["animation_data"])
-                    time.sleep(0.05) # Pequena pausa para a animação ser visível (ajuste conforme necessário)
-                
-                logger.debug(f"app.py: Item processado da fila: {item['log_message'][:50]}...")
-            except queue.Empty:
-                break
-            except Exception as e:
-                logger.error(f"app.py: Erro ao processar item da fila: {e}", exc_info=True)
-                break
-
-        # Renderiza o log textual acumulado
-        current_log_content = "<br>".join(st.session_state.log_messages)
-        log_placeholder.markdown(current_log_content, unsafe_allow_html=True)
-        
+    eventos = st.session_state.eventos
+    proximas_metricas = 0.0
+    while not st.session_state.thread_finished or len(eventos):
+        # Drena todos os eventos publicados de uma vez para manter a UI atualizada
+        lote = eventos.drenar()
+        if lote:
+            # Só formata o que cabe no deque; o excedente sairia pela ponta de qualquer forma
+            st.session_state.log_messages.extend([formatar_evento_html(evento) for evento in lote[-LIMITE_LOG:]])
+            st.session_state.total_log_messages += len(lote)
+
+            # ATUALIZA A ANIMAÇÃO: só o quadro mais recente do lote é desenhado
+            ultimo_quadro = next((evento for evento in reversed(lote) if evento[ANIMACAO]), None)
+            if ultimo_quadro is not None:
+                draw_animation_step(expandir_animacao(ultimo_quadro[ANIMACAO], ultimo_quadro[ORIGEM]))
+
+            # Renderiza a cauda do log só quando chegaram mensagens novas
+            render_log_tail()
+            logger.debug(f"app.py: {len(lote)} eventos drenados do EventBus.")
+
+        if time.monotonic() >= proximas_metricas:
+            render_metricas()
+            proximas_metricas = time.monotonic() + INTERVALO_METRICAS
+
         time.sleep(0.1) # Pequena pausa geral para evitar sobrecarga de CPU
 
     logger.info("app.py: Saindo do loop de atualização de logs e animação.")
-    final_log_content = "<br>".join(st.session_state.log_messages)
-    log_placeholder.markdown(final_log_content, unsafe_allow_html=True)
+    render_log_tail()
+    render_metricas()
     
     status_placeholder.success("Simulação concluída! Verifique a pasta `data/output/` para os arquivos gerados.")
     st.session_state.simulation_running = False
@@ -293,8 +353,8 @@ if st.session_state.simulation_running:
 
 # --- Exibir o log inicial/final e a animação inicial quando a simulação não está rodando ---
 else:
-    initial_log_content = "<br>".join(st.session_state.log_messages)
-    log_placeholder.markdown(initial_log_content, unsafe_allow_html=True)
+    render_log_tail()
+    render_metricas()
     
     # Desenha o estado inicial da animação ao carregar o app ou após a simulação
     draw_animation_step({
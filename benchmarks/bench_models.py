@@ -0,0 +1,75 @@
+# benchmarks/bench_models.py
+"""
+Microbenchmark dos modelos: custo de construção e memória alocada por objeto,
+comparando Transacao/Chargeback com as variantes compactas (__slots__, um relógio por objeto).
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_models --quantidade 200000
+"""
+import argparse
+import datetime
+import gc
+import time
+import tracemalloc
+
+from src.models.chargeback import Chargeback, ChargebackCompacto
+from src.models.transaction import Transacao, TransacaoCompacta
+
+
+def _transacao_original(i):
+    # Mesmo padrão de uso de antes: datetime.now() lido para o objeto
+    return Transacao(f"TXN{i:09d}", 150.0, "credito", "456789", datetime.datetime.now(), nsu=f"{i:08d}", id_estabelecimento="ESTAB001", id_portador="PORT001")
+
+
+def _transacao_compacta(i):
+    return TransacaoCompacta(f"TXN{i:09d}", 150.0, "credito", "456789", nsu=f"{i:08d}", id_estabelecimento="ESTAB001", id_portador="PORT001")
+
+
+def _chargeback(classe, data_solicitacao):
+    def construir(i):
+        cb = classe(f"CB{i:09d}", f"TXN{i:09d}", "Mercadoria Não Recebida", 150.0, data_solicitacao())
+        cb.update_status(classe.STATUS_DOCUMENTACAO_SOLICITADA)
+        cb.update_status(classe.STATUS_DOCUMENTACAO_ENVIADA)
+        cb.update_status(classe.STATUS_REAPRESENTADO)
+        cb.update_status(classe.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO)
+        return cb
+    return construir
+
+
+def medir(construtor, quantidade):
+    """Retorna (ns por objeto, bytes alocados por objeto)."""
+    gc.collect()
+    inicio = time.perf_counter_ns()
+    objetos = [construtor(i) for i in range(quantidade)]
+    duracao = time.perf_counter_ns() - inicio
+    del objetos
+
+    gc.collect()
+    tracemalloc.start()
+    objetos = [construtor(i) for i in range(quantidade)]
+    alocado, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objetos
+    return duracao / quantidade, alocado / quantidade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quantidade", type=int, default=100000)
+    args = parser.parse_args()
+
+    casos = [
+        ("Transacao", _transacao_original),
+        ("TransacaoCompacta", _transacao_compacta),
+        ("Chargeback (5 status)", _chargeback(Chargeback, datetime.datetime.now)),
+        # A variante compacta lê o relógio ela mesma (data_solicitacao=None)
+        ("ChargebackCompacto (5 status)", _chargeback(ChargebackCompacto, lambda: None)),
+    ]
+    print(f"{'modelo':<32}{'ns/objeto':>12}{'bytes/objeto':>15}")
+    for nome, construtor in casos:
+        ns, nbytes = medir(construtor, args.quantidade)
+        print(f"{nome:<32}{ns:>12.0f}{nbytes:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
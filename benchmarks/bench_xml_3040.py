@@ -0,0 +1,90 @@
+# benchmarks/bench_xml_3040.py
+"""
+Throughput (MB/s de XML) e pico de memória do faturamento 3040: a montagem original
+(lista com todas as linhas, gravada no fim) contra o EscritorXML em fluxo, com e sem gzip.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_xml_3040 --quantidade 500000
+"""
+import argparse
+import datetime
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.models.transaction import Transacao
+from src.services.file_generator import iter_faturamento_3040_records, write_faturamento_3040_file
+
+
+def _faturamento_original(transactions, filename):
+    # Implementação anterior de generate_faturamento_3040_file: nove strings por transação em uma lista
+    faturamento_xml_content = ['<FaturamentoReport>\n']
+    for t in transactions:
+        if t.status == "LIQUIDADA_EMISSOR":
+            faturamento_xml_content.append(f'  <Transacao id="{t.id}">\n')
+            faturamento_xml_content.append(f'    <PortadorID>{t.id_portador}</PortadorID>\n')
+            faturamento_xml_content.append(f'    <NumeroCartaoBIN>{t.numero_cartao_bin}</NumeroCartaoBIN>\n')
+            faturamento_xml_content.append(f'    <ValorCompra>{t.valor:.2f}</ValorCompra>\n')
+            faturamento_xml_content.append(f'    <DataHoraCompra>{t.data_hora.isoformat()}</DataHoraCompra>\n')
+            faturamento_xml_content.append(f'    <CodigoAutorizacao>{t.codigo_autorizacao}</CodigoAutorizacao>\n')
+            faturamento_xml_content.append(f'    <NSUAdquirente>{t.nsu}</NSUAdquirente>\n')
+            faturamento_xml_content.append(f'    <StatusFaturamento>FATURADO</StatusFaturamento>\n')
+            faturamento_xml_content.append(f'  </Transacao>\n')
+    faturamento_xml_content.append('</FaturamentoReport>\n')
+    with open(filename, 'w') as f:
+        f.writelines(faturamento_xml_content)
+
+
+def _transacoes(quantidade):
+    """Transações liquidadas, criadas antes das medições (o custo e a memória medidos são só do escritor)."""
+    base = datetime.datetime(2024, 1, 1)
+    return [Transacao(f"TXN{i:09d}", 10.0 + i % 5000, "credito", "456789", base,
+                      status="LIQUIDADA_EMISSOR", nsu=f"{i:08d}", codigo_autorizacao=f"{i % 999999:06d}",
+                      id_estabelecimento="ESTAB001", id_portador=f"PORT{i % 1000:04d}")
+            for i in range(quantidade)]
+
+
+def medir(escrever, transacoes, filename):
+    """Retorna (segundos, pico de memória em bytes)."""
+    gc.collect()
+    inicio = time.perf_counter()
+    escrever(transacoes, filename)
+    duracao = time.perf_counter() - inicio
+
+    gc.collect()
+    tracemalloc.start()
+    escrever(transacoes, filename)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quantidade", type=int, default=200000)
+    args = parser.parse_args()
+
+    transacoes = _transacoes(args.quantidade)
+    with tempfile.TemporaryDirectory() as diretorio:
+        xml = os.path.join(diretorio, "faturamento.xml")
+        casos = [
+            ("lista (original)", xml, _faturamento_original),
+            ("EscritorXML", xml,
+             lambda transacoes, filename: write_faturamento_3040_file(iter_faturamento_3040_records(transacoes), filename)),
+            ("EscritorXML + gzip", xml + ".gz",
+             lambda transacoes, filename: write_faturamento_3040_file(iter_faturamento_3040_records(transacoes), filename, compactar=True)),
+        ]
+        tamanho_xml = None
+        print(f"{'escritor':<22}{'segundos':>10}{'MB/s (XML)':>12}{'arquivo MB':>12}{'pico MB':>10}")
+        for nome, filename, escrever in casos:
+            duracao, pico = medir(escrever, transacoes, filename)
+            tamanho_arquivo = os.path.getsize(filename)
+            tamanho_xml = tamanho_xml or tamanho_arquivo # O primeiro caso grava o XML sem compressão
+            print(f"{nome:<22}{duracao:>10.3f}{tamanho_xml / duracao / 1e6:>12.1f}"
+                  f"{tamanho_arquivo / 1e6:>12.1f}{pico / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
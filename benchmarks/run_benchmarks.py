@@ -0,0 +1,275 @@
+# benchmarks/run_benchmarks.py
+"""
+Suíte de benchmarks por etapa do PaymentSimulator: autorização (unitária e em lote),
+captura, liquidação, CNAB, faturamento 3040, chargebacks e regulatórios, em várias escalas.
+Para cada etapa: throughput, latência p50/p95/p99 (por chamada ou por lote) e pico de RSS.
+Os resultados (JSON) são comparados com um baseline, só nas escalas executadas; qualquer
+regressão além da tolerância, ou etapa do baseline ausente numa escala executada, termina
+com código 1. Com --estrito, escala do baseline não executada ou nenhuma etapa comparada
+também falham.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.run_benchmarks                      # escalas rápidas (1000 e 100000)
+    python -m benchmarks.run_benchmarks --escalas 1000 100000 10000000 --baseline grande.json --estrito
+    python -m benchmarks.run_benchmarks --salvar-baseline
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.models.entities import StatusTransacao, Transacao, _CODIGO_POR_STATUS
+from src.models.id_allocator import ALOCADOR_PADRAO, configurar_alocador_padrao
+from src.models.transaction_table import ListaTransacoes
+from src.services.chargeback_lifecycle import MotorCicloChargeback
+from src.services.file_generator import write_faturamento_3040_file_from_table
+from src.services.settlement_engine import MotorLiquidacao, escrever_cnab_pagamentos
+from src.services.simulation import PaymentSimulator
+from src.services.workload import GeradorCarga
+
+ESCALAS_PADRAO = (1_000, 100_000) # 10_000_000 só sob demanda (--escalas)
+BASELINE_PADRAO = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+TAMANHO_LOTE = 1 << 16
+AMOSTRA_UNITARIA = 20_000 # Chamadas medidas uma a uma nas etapas por transação
+TAXA_DISPUTA = 0.0075
+DIAS_CICLO_CHARGEBACK = 120
+
+
+class Etapa:
+    """Cronometra as amostras (chamadas ou lotes) de uma etapa e resume no dict do JSON."""
+    def __init__(self, nome):
+        self.nome = nome
+        self.amostras = []
+        self.itens = 0
+        self.pico_rss_kb = 0
+
+    def medir(self, funcao, *args, itens=1):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        self.amostras.append(time.perf_counter() - inicio)
+        self.itens += itens
+        # ru_maxrss é o pico do processo (KB no Linux), que só cresce: pico até o fim desta etapa
+        self.pico_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return resultado
+
+    def resumo(self):
+        duracao = sum(self.amostras)
+        p50, p95, p99 = np.percentile(self.amostras, (50, 95, 99)) * 1000 if self.amostras else (0.0, 0.0, 0.0)
+        return {
+            "itens": self.itens,
+            "amostras": len(self.amostras),
+            "duracao_s": duracao,
+            "throughput": self.itens / duracao if duracao > 0 else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "pico_rss_mb": self.pico_rss_kb / 1024,
+        }
+
+
+def _em_lotes(linhas, tamanho=TAMANHO_LOTE):
+    for inicio in range(0, len(linhas), tamanho):
+        yield linhas[inicio:inicio + tamanho]
+
+
+def executar_escala(transacoes, seed=42):
+    """Roda todas as etapas sobre um dia de `transacoes` (carga sintética); retorna {etapa: resumo}."""
+    logging.basicConfig(level=logging.WARNING)
+    configurar_alocador_padrao(ALOCADOR_PADRAO.no, ALOCADOR_PADRAO.shard) # Único processo da escala que gera ids
+    saida = tempfile.mkdtemp(prefix="bench_")
+    simulator = PaymentSimulator(output_dir=saida, pacing="unpaced", seed=seed, saldo_inicial=1e9)
+    tabela = simulator.tabela
+    etapas = []
+
+    def etapa(nome):
+        etapas.append(Etapa(nome))
+        return etapas[-1]
+
+    # 1. Autorização: caminho unitário (Estabelecimento → Adquirente → Bandeira → Emissor), num
+    # simulador à parte para as etapas seguintes verem exatamente `transacoes`, e em lote
+    unitaria = etapa("autorizacao_unitaria")
+    amostra = PaymentSimulator(output_dir=saida, pacing="unpaced", seed=seed, saldo_inicial=1e9)
+    for i in range(min(transacoes, AMOSTRA_UNITARIA)):
+        unitaria.medir(amostra.estab_1.iniciar_transacao, amostra.portador_1, 10.00, amostra.adquirente, amostra.bandeira, amostra.emissor)
+    del amostra
+
+    lote = etapa("autorizacao_lote")
+    gerador = GeradorCarga(seed)
+    simulator.emissor.cadastrar_portadores_lote(gerador.portador_ids)
+    pendente = _CODIGO_POR_STATUS[StatusTransacao.PENDENTE]
+    for carga in gerador.lotes(transacoes, TAMANHO_LOTE):
+        def autorizar(carga=carga):
+            linhas = tabela.adicionar_lote(simulator.adquirente.alocador.ids_transacao_lote(len(carga)), carga.portador_ids,
+                                           carga.estabelecimento_ids, carga.valores_centavos, carga.tipos, pendente,
+                                           carga.timestamps_ns, carga.bins)
+            simulator.adquirente.receber_lote(tabela, np.arange(linhas.start, linhas.stop), carga.portador_ids,
+                                              simulator.bandeira, simulator.emissor)
+        lote.medir(autorizar, itens=len(carga))
+
+    # 2. Captura: lotes da adquirente para Bandeira.processar_captura
+    captura = etapa("captura")
+    for linhas in _em_lotes(simulator.adquirente.transacoes_aprovadas.linhas):
+        lista = ListaTransacoes()
+        lista.adicionar_linhas(tabela, Transacao, linhas)
+        captura.medir(simulator.bandeira.processar_captura, lista, itens=len(linhas))
+    simulator.adquirente.limpar_transacoes_aprovadas()
+
+    # 3. Liquidação (arquivos da bandeira e conciliação de adquirente e emissor)
+    capturadas = len(simulator.bandeira.transacoes_capturadas)
+    etapa("liquidacao").medir(simulator.bandeira.iniciar_liquidacao, simulator.adquirente, simulator.emissor, saida, itens=capturadas)
+    liquidadas = np.flatnonzero(tabela.coluna("status") == _CODIGO_POR_STATUS[StatusTransacao.LIQUIDATED])
+
+    # 4. CNAB de pagamento (posições líquidas e uma instrução por conta) e 5. faturamento 3040
+    # (arquivos apagados logo após a medição)
+    def escrever_cnab(tabela, linhas, arquivo):
+        return escrever_cnab_pagamentos(MotorLiquidacao().liquidar(tabela, linhas), arquivo)
+
+    for nome, escrever, arquivo in (("cnab", escrever_cnab, "cnab.txt"),
+                                    ("faturamento_3040", write_faturamento_3040_file_from_table, "faturamento.xml")):
+        arquivo = os.path.join(saida, arquivo)
+        etapa(nome).medir(escrever, tabela, liquidadas, arquivo, itens=len(liquidadas))
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+    # 6. Chargebacks: registro unitário na Bandeira e ciclo de vida em lote das disputas do dia
+    rng = np.random.default_rng([seed, 2])
+    disputadas = np.sort(rng.choice(liquidadas, min(len(liquidadas), max(1, round(len(liquidadas) * TAXA_DISPUTA))), replace=False))
+    registro = etapa("chargeback_registro")
+    for linha in disputadas[:AMOSTRA_UNITARIA].tolist():
+        txn_id = tabela.ids[linha].decode("ascii")
+        registro.medir(simulator.bandeira.registrar_chargeback, f"CB{txn_id}", txn_id, "Mercadoria Não Recebida")
+    motor = MotorCicloChargeback(seed=seed)
+    motor.abrir_lote(disputadas, tabela.valor_centavos[disputadas], tabela.estabelecimento[disputadas])
+    ciclo = etapa("chargeback_ciclo")
+    for _ in range(DIAS_CICLO_CHARGEBACK):
+        ciclo.medir(motor.avancar, itens=0)
+    ciclo.itens = len(disputadas)
+
+    # 7. Regulatórios (CADOC 3040/5817/6334 sobre a agregação da tabela)
+    etapa("regulatorios").medir(simulator.regulatory_reporter.generate_all_reports, None, tabela, simulator.adquirente.nome,
+                                itens=len(tabela))
+
+    for arquivo in os.listdir(saida):
+        os.remove(os.path.join(saida, arquivo))
+    os.rmdir(saida)
+    return {e.nome: e.resumo() for e in etapas}
+
+
+def comparar(resultados, baseline, tolerancia, duracao_minima, estrito=False):
+    """
+    Compara os resultados com o baseline. Retorna (falhas, comparadas, puladas): falhas são
+    as regressões (throughput abaixo, p99 ou RSS acima do baseline além da tolerância) e as
+    etapas do baseline que não aparecem numa escala executada; puladas, as etapas novas ou
+    curtas demais no baseline para medir sem ruído e as escalas do baseline não executadas
+    (falhas se estrito).
+    """
+    falhas, puladas = [], []
+    comparadas = 0
+    escalas_base = baseline.get("escalas", {})
+    for escala, etapas_base in escalas_base.items():
+        etapas = resultados["escalas"].get(escala)
+        if etapas is None:
+            (falhas if estrito else puladas).append(f"{escala} (escala do baseline não executada)")
+            continue
+        for nome in etapas_base.keys() - etapas.keys():
+            falhas.append(f"{escala} {nome}: etapa do baseline ausente nos resultados")
+    for escala, etapas in resultados["escalas"].items():
+        for nome, atual in etapas.items():
+            base = escalas_base.get(escala, {}).get(nome)
+            if base is None:
+                puladas.append(f"{escala} {nome} (fora do baseline)")
+                continue
+            if base["duracao_s"] < duracao_minima:
+                puladas.append(f"{escala} {nome} ({base['duracao_s']:.3f}s no baseline)")
+                continue
+            comparadas += 1
+            verificacoes = (
+                ("throughput", atual["throughput"] < base["throughput"] * (1 - tolerancia)),
+                ("p99_ms", atual["p99_ms"] > base["p99_ms"] * (1 + tolerancia)),
+                ("pico_rss_mb", atual["pico_rss_mb"] > base["pico_rss_mb"] * (1 + tolerancia)),
+            )
+            for metrica, piorou in verificacoes:
+                if piorou:
+                    falhas.append(f"{escala} {nome} {metrica}: {atual[metrica]:.2f} (baseline {base[metrica]:.2f})")
+    return falhas, comparadas, puladas
+
+
+def _imprimir(escala, etapas):
+    print(f"\n== {escala} transações ==")
+    print(f"{'etapa':<22}{'itens':>11}{'segundos':>10}{'itens/s':>13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>9}")
+    for nome, r in etapas.items():
+        print(f"{nome:<22}{r['itens']:>11}{r['duracao_s']:>10.3f}{r['throughput']:>13.0f}"
+              f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['pico_rss_mb']:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS_PADRAO))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", default=None, help="Arquivo JSON com os resultados desta execução.")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO)
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como novo baseline (sem comparar).")
+    parser.add_argument("--tolerancia", type=float, default=0.30, help="Piora relativa aceita antes de falhar (0.30 = 30%%).")
+    parser.add_argument("--duracao-minima", type=float, default=0.05,
+                        help="Etapas que levaram menos que isso (s) no baseline não são comparadas.")
+    parser.add_argument("--estrito", action="store_true",
+                        help="Falha também com escala do baseline não executada ou sem nenhuma etapa comparada.")
+    args = parser.parse_args()
+
+    resultados = {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {"python": platform.python_version(), "numpy": np.__version__, "plataforma": platform.platform(),
+                     "cpus": os.cpu_count()},
+        "escalas": {},
+    }
+    # Um processo novo (spawn) por escala: o pico de RSS de uma escala não contamina a próxima
+    contexto = multiprocessing.get_context("spawn")
+    for escala in args.escalas:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+            etapas = pool.submit(executar_escala, escala, args.seed).result()
+        resultados["escalas"][str(escala)] = etapas
+        _imprimir(escala, etapas)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2)
+    if args.salvar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"\nBaseline gravado em {args.baseline}.")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nSem baseline em {args.baseline}; nada a comparar (use --salvar-baseline).")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    cpus_base = baseline.get("ambiente", {}).get("cpus")
+    if cpus_base != resultados["ambiente"]["cpus"]:
+        print(f"\nAviso: baseline gravado com {cpus_base} CPU(s), esta máquina tem {resultados['ambiente']['cpus']}.")
+    falhas, comparadas, puladas = comparar(resultados, baseline, args.tolerancia, args.duracao_minima, args.estrito)
+    if puladas:
+        print(f"\n{len(puladas)} etapa(s) não comparada(s): {', '.join(puladas)}.")
+    if falhas:
+        print(f"\nFALHA NA COMPARAÇÃO ({len(falhas)}) com {args.baseline}:", file=sys.stderr)
+        for falha in falhas:
+            print(f"  - {falha}", file=sys.stderr)
+        return 1
+    if not comparadas:
+        print(f"\nNenhuma etapa comparada com {args.baseline}.", file=sys.stderr if args.estrito else sys.stdout)
+        return 1 if args.estrito else 0
+    print(f"\nSem regressões em {comparadas} etapa(s) comparada(s) com {args.baseline} (tolerância {args.tolerancia:.0%}).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# benchmarks/stress_id_allocator.py
+"""
+Teste de estresse do AlocadorIds: gera ids em várias threads de um mesmo alocador e em
+vários processos (um shard por processo) e confere que nenhum id, NSU ou código de
+autorização se repete. Termina com código 1 se houver colisão.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.stress_id_allocator --threads 8 --processos 4 --por-trabalhador 250000
+"""
+import argparse
+import multiprocessing
+import sys
+import threading
+import time
+
+from src.models.id_allocator import AlocadorIds
+
+GERADORES = ("proximo_id_transacao", "proximo_nsu", "proximo_codigo_autorizacao")
+
+
+def _gerar(alocador, metodo, quantidade, destino):
+    proximo = getattr(alocador, metodo)
+    destino.extend(proximo() for _ in range(quantidade))
+
+
+def _gerar_em_threads(alocador, metodo, threads, por_thread):
+    resultados = [[] for _ in range(threads)]
+    trabalhadores = [threading.Thread(target=_gerar, args=(alocador, metodo, por_thread, resultados[i]))
+                     for i in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    return [valor for parcial in resultados for valor in parcial]
+
+
+def _trabalho_processo(args):
+    shard, metodo, threads, por_thread = args
+    # Cada processo usa o seu próprio shard
+    return _gerar_em_threads(AlocadorIds("01", shard), metodo, threads, por_thread)
+
+
+def _conferir(nome, valores, esperado):
+    unicos = len(set(valores))
+    ok = unicos == len(valores) == esperado
+    print(f"  {nome:<40}{len(valores):>12}{unicos:>12}  {'OK' if ok else 'COLISÃO'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processos", type=int, default=4)
+    parser.add_argument("--por-trabalhador", type=int, default=200000)
+    args = parser.parse_args()
+
+    ok = True
+    print(f"  {'caso':<40}{'gerados':>12}{'únicos':>12}")
+    for metodo in GERADORES:
+        inicio = time.perf_counter()
+        valores = _gerar_em_threads(AlocadorIds("01", 0), metodo, args.threads, args.por_trabalhador)
+        duracao = time.perf_counter() - inicio
+        ok &= _conferir(f"{metodo} (threads)", valores, args.threads * args.por_trabalhador)
+        print(f"  {'':<40}{len(valores) / duracao:>12.0f} ids/s")
+
+        por_thread = args.por_trabalhador // args.threads or 1
+        with multiprocessing.get_context("spawn").Pool(args.processos) as pool:
+            partes = pool.map(_trabalho_processo, [(shard, metodo, args.threads, por_thread) for shard in range(args.processos)])
+        valores = [valor for parte in partes for valor in parte]
+        ok &= _conferir(f"{metodo} (processos)", valores, args.processos * args.threads * por_thread)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 # src/models/chargeback.py
 import datetime
 import logging
+from array import array
+import numpy as np
+from src.models.clock import agora_ns, ns_para_datetime, datetime_para_ns
 logger = logging.getLogger(__name__)
 
-class Chargeback:
+class _StatusChargeback:
+    __slots__ = ()
     STATUS_INICIADO = "CB_INICIADO"
     STATUS_DOCUMENTACAO_SOLICITADA = "CB_DOC_SOLICITADA"
     STATUS_DOCUMENTACAO_ENVIADA = "CB_DOC_ENVIADA"
@@ -13,7 +17,51 @@ class Chargeback:
     STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO = "CB_RESOLVIDO_ESTAB"
     STATUS_CANCELADO = "CB_CANCELADO"
 
-    def __init__(self, id_chargeback, transacao_original_id, motivo, valor, data_solicitacao, status=STATUS_INICIADO):
+class TransicaoInvalida(ValueError):
+    """Mudança de status de chargeback fora da tabela de transições."""
+
+
+# Próximos status permitidos a partir de cada status (os resolvidos/cancelado são finais)
+TRANSICOES_CHARGEBACK = {
+    _StatusChargeback.STATUS_INICIADO: frozenset((
+        _StatusChargeback.STATUS_DOCUMENTACAO_SOLICITADA,
+        _StatusChargeback.STATUS_REAPRESENTADO, # Estabelecimento já defende na notificação
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, # Estabelecimento aceita a disputa
+        _StatusChargeback.STATUS_CANCELADO,
+    )),
+    _StatusChargeback.STATUS_DOCUMENTACAO_SOLICITADA: frozenset((
+        _StatusChargeback.STATUS_DOCUMENTACAO_ENVIADA,
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, # Prazo de defesa expirado
+        _StatusChargeback.STATUS_CANCELADO,
+    )),
+    _StatusChargeback.STATUS_DOCUMENTACAO_ENVIADA: frozenset((
+        _StatusChargeback.STATUS_REAPRESENTADO,
+        _StatusChargeback.STATUS_CANCELADO,
+    )),
+    _StatusChargeback.STATUS_REAPRESENTADO: frozenset((
+        _StatusChargeback.STATUS_ARBITRAGEM,
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR,
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO,
+    )),
+    _StatusChargeback.STATUS_ARBITRAGEM: frozenset((
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR,
+        _StatusChargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO,
+    )),
+    _StatusChargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR: frozenset(),
+    _StatusChargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO: frozenset(),
+    _StatusChargeback.STATUS_CANCELADO: frozenset(),
+}
+
+
+def validar_transicao(atual, novo):
+    if novo not in TRANSICOES_CHARGEBACK:
+        raise ValueError(f"Status de chargeback desconhecido: {novo}")
+    if novo not in TRANSICOES_CHARGEBACK[atual]:
+        raise TransicaoInvalida(f"Transição de chargeback inválida: {atual} -> {novo}")
+
+
+class Chargeback(_StatusChargeback):
+    def __init__(self, id_chargeback, transacao_original_id, motivo, valor, data_solicitacao, status=_StatusChargeback.STATUS_INICIADO):
         self.id = id_chargeback
         self.transacao_original_id = transacao_original_id
         self.motivo = motivo
@@ -26,6 +74,7 @@ class Chargeback:
 
     def update_status(self, new_status):
         old_status = self.status
+        validar_transicao(old_status, new_status)
         self.status = new_status
         self.historico_status.append((datetime.datetime.now(), new_status))
         logger.debug(f"Chargeback {self.id} status atualizado de {old_status} para {new_status}.")
@@ -33,3 +82,83 @@ class Chargeback:
     def __repr__(self):
         return (f"Chargeback(ID: {self.id}, TXN Original: {self.transacao_original_id}, "
                 f"Motivo: {self.motivo}, Status: {self.status})")
+
+
+# Código inteiro de cada status, usado pelas variantes compactas
+STATUS_CHARGEBACK = (
+    Chargeback.STATUS_INICIADO,
+    Chargeback.STATUS_DOCUMENTACAO_SOLICITADA,
+    Chargeback.STATUS_DOCUMENTACAO_ENVIADA,
+    Chargeback.STATUS_REAPRESENTADO,
+    Chargeback.STATUS_ARBITRAGEM,
+    Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR,
+    Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO,
+    Chargeback.STATUS_CANCELADO,
+)
+CODIGO_STATUS_CHARGEBACK = {status: codigo for codigo, status in enumerate(STATUS_CHARGEBACK)}
+
+# A mesma tabela de transições como matriz booleana [de, para] por código, para validar lotes
+MATRIZ_TRANSICOES = np.zeros((len(STATUS_CHARGEBACK), len(STATUS_CHARGEBACK)), dtype=bool)
+for _de, _destinos in TRANSICOES_CHARGEBACK.items():
+    for _para in _destinos:
+        MATRIZ_TRANSICOES[CODIGO_STATUS_CHARGEBACK[_de], CODIGO_STATUS_CHARGEBACK[_para]] = True
+
+
+def _codigo_status(status):
+    try:
+        return CODIGO_STATUS_CHARGEBACK[status]
+    except KeyError:
+        raise ValueError(f"Status de chargeback desconhecido: {status}") from None
+
+
+class ChargebackCompacto(_StatusChargeback):
+    """
+    Variante enxuta de Chargeback: __slots__ e histórico guardado em um único array de
+    int64 com pares (código do status, ns desde a epoch), uma leitura de relógio por mudança.
+    historico_status e o repr continuam iguais aos do Chargeback.
+    """
+    __slots__ = ("id", "transacao_original_id", "motivo", "valor", "_historico", "documentos_enviados")
+
+    def __init__(self, id_chargeback, transacao_original_id, motivo, valor, data_solicitacao=None, status=_StatusChargeback.STATUS_INICIADO):
+        self.id = id_chargeback
+        self.transacao_original_id = transacao_original_id
+        self.motivo = motivo
+        self.valor = valor
+        ns = agora_ns() if data_solicitacao is None else datetime_para_ns(data_solicitacao)
+        self._historico = array("q", (_codigo_status(status), ns))
+        self.documentos_enviados = False
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Chargeback %s criado com status %s.", id_chargeback, status)
+
+    @property
+    def status(self):
+        return STATUS_CHARGEBACK[self._historico[-2]]
+
+    @property
+    def data_solicitacao(self):
+        return ns_para_datetime(self._historico[1])
+
+    @property
+    def historico_status(self):
+        h = self._historico
+        return [(ns_para_datetime(h[i + 1]), STATUS_CHARGEBACK[h[i]]) for i in range(0, len(h), 2)]
+
+    @property
+    def historico_codigos(self):
+        """Histórico bruto: array int64 com pares (código, ns)."""
+        return self._historico
+
+    def update_status(self, new_status):
+        historico = self._historico
+        old_codigo = historico[-2]
+        novo_codigo = _codigo_status(new_status)
+        if not MATRIZ_TRANSICOES[old_codigo, novo_codigo]:
+            raise TransicaoInvalida(f"Transição de chargeback inválida: {STATUS_CHARGEBACK[old_codigo]} -> {new_status}")
+        historico.append(novo_codigo)
+        historico.append(agora_ns())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Chargeback %s status atualizado de %s para %s.", self.id, STATUS_CHARGEBACK[old_codigo], new_status)
+
+    def __repr__(self):
+        return (f"Chargeback(ID: {self.id}, TXN Original: {self.transacao_original_id}, "
+                f"Motivo: {self.motivo}, Status: {self.status})")
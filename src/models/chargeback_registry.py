@@ -0,0 +1,167 @@
+# src/models/chargeback_registry.py
+import bisect
+import logging
+from src.models.clock import agora_ns
+from src.models.chargeback import Chargeback, ChargebackCompacto
+
+logger = logging.getLogger(__name__)
+
+# Status que encerram a disputa; os demais contam como abertos
+STATUS_FINAIS = frozenset((
+    Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR,
+    Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO,
+    Chargeback.STATUS_CANCELADO,
+))
+
+PRAZO_DEFESA_DIAS = 30 # Prazo padrão para a defesa do estabelecimento
+_NS_POR_DIA = 86_400 * 1_000_000_000
+
+
+class RegistroChargebacks:
+    """
+    Registro de chargebacks (ChargebackCompacto) com índices secundários mantidos a cada
+    mudança: por transação original, por estabelecimento e portador (todos e só os abertos),
+    por status e por dia de prazo. Consultas como "disputas abertas do ESTAB001" ou
+    "prazos vencendo até amanhã" leem só o conjunto indexado, sem varrer o registro.
+    """
+    def __init__(self, prazo_dias=PRAZO_DEFESA_DIAS):
+        self.prazo_dias = prazo_dias
+        self._chargebacks = {} # cb_id -> ChargebackCompacto
+        self._por_transacao = {} # txn_id -> cb_id
+        self._estabelecimento = {} # cb_id -> estabelecimento_id
+        self._portador = {} # cb_id -> portador_id
+        self._prazo = {} # cb_id -> prazo (ns desde a epoch)
+        self._por_estabelecimento = {} # estabelecimento_id -> {cb_id}
+        self._por_portador = {}
+        self._abertos_por_estabelecimento = {}
+        self._abertos_por_portador = {}
+        self._por_status = {} # status -> {cb_id}
+        self._por_dia_prazo = {} # dia do prazo -> {cb_id} (só abertos)
+        self._dias_prazo = [] # Chaves de _por_dia_prazo em ordem, para as consultas por intervalo
+
+    def registrar(self, cb_id, txn_id, estabelecimento_id=None, portador_id=None, valor=0.0, motivo=None, prazo_ns=None):
+        """Abre um chargeback (status INICIADO) e o inclui em todos os índices; retorna o chargeback."""
+        if cb_id in self._chargebacks:
+            raise ValueError(f"Chargeback {cb_id} já registrado.")
+        chargeback = ChargebackCompacto(cb_id, txn_id, motivo, valor)
+        if prazo_ns is None:
+            prazo_ns = chargeback.historico_codigos[1] + self.prazo_dias * _NS_POR_DIA
+        self._chargebacks[cb_id] = chargeback
+        self._por_transacao[txn_id] = cb_id
+        self._estabelecimento[cb_id] = estabelecimento_id
+        self._portador[cb_id] = portador_id
+        self._prazo[cb_id] = prazo_ns
+        self._por_estabelecimento.setdefault(estabelecimento_id, set()).add(cb_id)
+        self._por_portador.setdefault(portador_id, set()).add(cb_id)
+        self._por_status.setdefault(chargeback.status, set()).add(cb_id)
+        self._indexar_aberto(cb_id)
+        return chargeback
+
+    def _indexar_aberto(self, cb_id):
+        self._abertos_por_estabelecimento.setdefault(self._estabelecimento[cb_id], set()).add(cb_id)
+        self._abertos_por_portador.setdefault(self._portador[cb_id], set()).add(cb_id)
+        dia = self._prazo[cb_id] // _NS_POR_DIA
+        bucket = self._por_dia_prazo.get(dia)
+        if bucket is None:
+            bucket = self._por_dia_prazo[dia] = set()
+            bisect.insort(self._dias_prazo, dia)
+        bucket.add(cb_id)
+
+    def _desindexar_aberto(self, cb_id):
+        self._abertos_por_estabelecimento[self._estabelecimento[cb_id]].discard(cb_id)
+        self._abertos_por_portador[self._portador[cb_id]].discard(cb_id)
+        dia = self._prazo[cb_id] // _NS_POR_DIA
+        bucket = self._por_dia_prazo[dia]
+        bucket.discard(cb_id)
+        if not bucket:
+            del self._por_dia_prazo[dia]
+            del self._dias_prazo[bisect.bisect_left(self._dias_prazo, dia)]
+
+    def atualizar_status(self, cb_id, status):
+        """Muda o status (com histórico) e move o chargeback entre os índices."""
+        chargeback = self._chargebacks[cb_id]
+        anterior = chargeback.status
+        if status == anterior:
+            return chargeback
+        chargeback.update_status(status)
+        self._por_status[anterior].discard(cb_id)
+        self._por_status.setdefault(status, set()).add(cb_id)
+        aberto_antes, aberto_agora = anterior not in STATUS_FINAIS, status not in STATUS_FINAIS
+        if aberto_antes and not aberto_agora:
+            self._desindexar_aberto(cb_id)
+        elif aberto_agora and not aberto_antes:
+            self._indexar_aberto(cb_id)
+        return chargeback
+
+    def atualizar_prazo(self, cb_id, prazo_ns):
+        aberto = self.aberto(cb_id)
+        if aberto:
+            self._desindexar_aberto(cb_id)
+        self._prazo[cb_id] = prazo_ns
+        if aberto:
+            self._indexar_aberto(cb_id)
+
+    def aberto(self, cb_id):
+        return self._chargebacks[cb_id].status not in STATUS_FINAIS
+
+    def obter(self, cb_id, default=None):
+        return self._chargebacks.get(cb_id, default)
+
+    def por_transacao(self, txn_id):
+        """Chargeback da transação original (aberto ou não), ou None."""
+        cb_id = self._por_transacao.get(txn_id)
+        return None if cb_id is None else self._chargebacks[cb_id]
+
+    def estabelecimento_de(self, cb_id):
+        return self._estabelecimento[cb_id]
+
+    def portador_de(self, cb_id):
+        return self._portador[cb_id]
+
+    def prazo_de(self, cb_id):
+        return self._prazo[cb_id]
+
+    def _chargebacks_de(self, cb_ids):
+        chargebacks = self._chargebacks
+        return [chargebacks[cb_id] for cb_id in cb_ids]
+
+    def por_estabelecimento(self, estabelecimento_id, abertos=False):
+        indice = self._abertos_por_estabelecimento if abertos else self._por_estabelecimento
+        return self._chargebacks_de(indice.get(estabelecimento_id, ()))
+
+    def por_portador(self, portador_id, abertos=False):
+        indice = self._abertos_por_portador if abertos else self._por_portador
+        return self._chargebacks_de(indice.get(portador_id, ()))
+
+    def por_status(self, status):
+        return self._chargebacks_de(self._por_status.get(status, ()))
+
+    def com_prazo_ate(self, limite_ns=None):
+        """Chargebacks abertos com prazo até limite_ns (padrão: agora), do prazo mais antigo ao mais novo."""
+        limite_ns = agora_ns() if limite_ns is None else limite_ns
+        dias = self._dias_prazo
+        prazo = self._prazo
+        vencidos = []
+        for dia in dias[:bisect.bisect_right(dias, limite_ns // _NS_POR_DIA)]:
+            vencidos.extend(cb_id for cb_id in self._por_dia_prazo[dia] if prazo[cb_id] <= limite_ns)
+        vencidos.sort(key=prazo.__getitem__)
+        return self._chargebacks_de(vencidos)
+
+    def contagem_por_status(self):
+        return {status: len(cb_ids) for status, cb_ids in self._por_status.items() if cb_ids}
+
+    def __getitem__(self, cb_id):
+        return self._chargebacks[cb_id]
+
+    def __contains__(self, cb_id):
+        return cb_id in self._chargebacks
+
+    def __len__(self):
+        return len(self._chargebacks)
+
+    def __iter__(self):
+        return iter(self._chargebacks.values())
+
+    def __repr__(self):
+        abertos = sum(len(cb_ids) for cb_ids in self._abertos_por_estabelecimento.values())
+        return f"RegistroChargebacks({len(self)} chargebacks, {abertos} abertos)"
@@ -0,0 +1,36 @@
+# src/models/clock.py
+import datetime
+import time
+import numpy as np
+
+# Âncora tirada uma única vez: epoch (ns) = âncora + relógio monotônico (ns).
+# Assim cada objeto faz uma só leitura barata do relógio e ainda obtém um horário de parede.
+_ANCORA_EPOCH_NS = time.time_ns() - time.monotonic_ns()
+
+
+def agora_ns():
+    """Horário atual em nanossegundos desde a epoch, com uma única leitura do relógio monotônico."""
+    return _ANCORA_EPOCH_NS + time.monotonic_ns()
+
+
+def ns_para_datetime(ns):
+    """Converte ns desde a epoch para datetime local (naive), preservando os microssegundos."""
+    return datetime.datetime.fromtimestamp(ns // 1_000_000_000).replace(microsecond=ns // 1000 % 1_000_000)
+
+
+def datetime_para_ns(momento):
+    """Inverso de ns_para_datetime (datetime naive é interpretado como horário local)."""
+    return int(momento.replace(microsecond=0).timestamp()) * 1_000_000_000 + momento.microsecond * 1000
+
+
+def segundos_locais(timestamps_ns):
+    """
+    Segundos "locais" desde a epoch (UTC + deslocamento do fuso naquele instante) de um array
+    de ns, vetorizado. O deslocamento é consultado uma vez por minuto distinto do array, então
+    um chunk que cruza uma mudança de horário de verão fica certo linha a linha.
+    """
+    segundos = np.asarray(timestamps_ns, dtype=np.int64) // 1_000_000_000
+    minutos, inverso = np.unique(segundos // 60, return_inverse=True)
+    deslocamentos = np.fromiter((time.localtime(minuto * 60).tm_gmtoff for minuto in minutos.tolist()),
+                                dtype=np.int64, count=len(minutos))
+    return segundos + deslocamentos[inverso]
@@ -1,7 +1,23 @@
-import time
 from enum import Enum
 import datetime
+import os
+import random
 import logging
+import numpy as np
+from src.models.clock import agora_ns, ns_para_datetime
+from src.models.id_allocator import ALOCADOR_PADRAO
+from src.models.ledger import SaldoLedger
+from src.models.chargeback import Chargeback
+from src.models.chargeback_registry import RegistroChargebacks
+from src.models.transaction_table import TabelaTransacoes, ListaTransacoes, MapaTransacoes
+from src.services.pacing import resolver_pacing
+from src.services.event_bus import PublicadorEventos, DEBUG
+from src.services.file_generator import generate_liquidation_files_from_table
+from src.services.layouts import LAYOUT_LIQUIDACAO_ADQ, LAYOUT_LIQUIDACAO_EMISSOR
+from src.services.settlement_reader import IndiceConciliacao, conciliar_arquivo
+from src.services.capture_batcher import LoteadorCaptura
+from src.services.settlement_engine import MotorLiquidacao, escrever_cnab_pagamentos
+from src.services.chargeback_lifecycle import MotorCicloChargeback
 
 logger = logging.getLogger(__name__)
 
@@ -17,307 +33,732 @@ class StatusTransacao(Enum):
     REVERSED = "REVERSED" # Estornada/Chargeback
 
 
-class EntidadeBase:
-    """Classe base para entidades com funcionalidade de log."""
-    def __init__(self, nome, log_callback=None):
+class EntidadeBase(PublicadorEventos):
+    """
+    Classe base para entidades com funcionalidade de log. Os logs/animações vão para o
+    EventBus `eventos` (ou, sem bus, para o log_callback antigo) via _evento.
+    Com um JournalSimulacao em `journal`, as transições de estado também são gravadas nele.
+    """
+    journal = None
+
+    def __init__(self, nome, log_callback=None, pacing=None, eventos=None):
         self.nome = nome
         self.log_callback = log_callback
+        self.eventos = eventos
+        self.pacing = resolver_pacing(pacing)
 
-    def _log(self, message, color_tag="black", animation_data=None):
-        """
-        Método interno para enviar logs usando o callback fornecido.
-        Atenção: NÃO adicione tags HTML aqui. O app.py fará isso.
-        """
-        if self.log_callback:
-            # Passa a mensagem, a cor e os dados da animação
-            self.log_callback(f"[{self.nome}]: {message}", color_tag, animation_data)
+    def _conciliar(self, arquivo, layout, transacoes):
+        """Concilia um arquivo de liquidação recebido contra as transações da entidade (se o arquivo existir)."""
+        if not os.path.exists(arquivo):
+            return None
+        relatorio = conciliar_arquivo(arquivo, layout, IndiceConciliacao.de_transacoes(transacoes))
+        self._evento("Conciliação de %s: %s", os.path.basename(arquivo), relatorio.resumo(),
+                     cor="green" if relatorio.ok else "red")
+        return relatorio
+
+_STATUS_POR_CODIGO = tuple(StatusTransacao)
+_CODIGO_POR_STATUS = {status: codigo for codigo, status in enumerate(_STATUS_POR_CODIGO)}
 
 class Transacao:
-    def __init__(self, portador_id, estabelecimento_id, valor, tipo="credito"):
-        self.id = f"TXN{datetime.datetime.now().strftime('%H%M%S%f')[:-3]}" # ID único
-        self.portador_id = portador_id
-        self.estabelecimento_id = estabelecimento_id
-        self.valor = valor
-        self.tipo = tipo
-        self.status = StatusTransacao.PENDENTE
-        self.timestamp = datetime.datetime.now()
-        self.codigo_autorizacao = None
+    """
+    Visão leve de uma linha da TabelaTransacoes: os dados ficam nas colunas da tabela,
+    o objeto guarda só (tabela, linha) e mantém o acesso por atributo de antes. A tabela é
+    obrigatória (a do simulador ou a do estabelecimento): não há tabela global do processo.
+    """
+    __slots__ = ("_tabela", "_linha")
+
+    def __init__(self, portador_id, estabelecimento_id, valor, tipo="credito", tabela=None, alocador=None, numero_cartao_bin=""):
+        if tabela is None:
+            raise ValueError("Transacao precisa de uma TabelaTransacoes (ex.: a do PaymentSimulator).")
+        self._tabela = tabela
+        self._linha = self._tabela.adicionar(
+            (alocador or ALOCADOR_PADRAO).proximo_id_transacao(), # ID único, sem colisão mesmo a milhares por ms
+            portador_id,
+            estabelecimento_id,
+            round(valor * 100),
+            tipo,
+            _CODIGO_POR_STATUS[StatusTransacao.PENDENTE],
+            agora_ns(),
+            numero_cartao_bin,
+        )
         logger.debug(f"Transação {self.id} criada.")
 
+    @classmethod
+    def _da_linha(cls, tabela, linha):
+        transacao = cls.__new__(cls)
+        transacao._tabela = tabela
+        transacao._linha = linha
+        return transacao
+
+    @property
+    def id(self):
+        return self._tabela.ids[self._linha].decode("ascii")
+
+    @property
+    def portador_id(self):
+        return self._tabela.portadores.valor(self._tabela.portador[self._linha])
+
+    @property
+    def estabelecimento_id(self):
+        return self._tabela.estabelecimentos.valor(self._tabela.estabelecimento[self._linha])
+
+    @property
+    def valor(self):
+        return int(self._tabela.valor_centavos[self._linha]) / 100
+
+    @property
+    def valor_centavos(self):
+        return int(self._tabela.valor_centavos[self._linha])
+
+    @property
+    def tipo(self):
+        return self._tabela.tipos.valor(self._tabela.tipo[self._linha])
+
+    @property
+    def status(self):
+        return _STATUS_POR_CODIGO[self._tabela.status[self._linha]]
+
+    @status.setter
+    def status(self, status):
+        self._tabela.status[self._linha] = _CODIGO_POR_STATUS[status]
+
+    @property
+    def timestamp(self):
+        return ns_para_datetime(int(self._tabela.timestamp_ns[self._linha]))
+
+    @property
+    def codigo_autorizacao(self):
+        codigo = self._tabela.codigo_autorizacao[self._linha]
+        return codigo.decode("ascii") if codigo else None
+
+    @codigo_autorizacao.setter
+    def codigo_autorizacao(self, codigo):
+        self._tabela.codigo_autorizacao[self._linha] = codigo.encode("ascii") if codigo else b""
+
+    @property
+    def numero_cartao_bin(self):
+        return self._tabela.bin[self._linha].decode("ascii")
+
+    @property
+    def nsu(self):
+        nsu = self._tabela.nsu[self._linha]
+        return nsu.decode("ascii") if nsu else None
+
+    @nsu.setter
+    def nsu(self, nsu):
+        self._tabela.nsu[self._linha] = nsu.encode("ascii") if nsu else b""
+
+    def __eq__(self, other):
+        return isinstance(other, Transacao) and self._tabela is other._tabela and self._linha == other._linha
+
+    def __hash__(self):
+        return hash((id(self._tabela), self._linha))
+
+    def __repr__(self):
+        return f"Transacao(ID: {self.id}, Valor: R${self.valor:.2f}, Status: {self.status.name})"
+
 class Adquirente(EntidadeBase):
-    def __init__(self, nome, log_callback=None):
-        super().__init__(nome, log_callback)
+    def __init__(self, nome, log_callback=None, pacing=None, alocador=None, eventos=None, journal=None):
+        super().__init__(nome, log_callback, pacing, eventos)
+        self.journal = journal
+        self.alocador = alocador or ALOCADOR_PADRAO # NSUs e códigos de autorização
         self.estabelecimentos = {}
-        self.transacoes_aprovadas = [] # Transações aprovadas e prontas para captura
+        self.transacoes_aprovadas = ListaTransacoes() # Linhas das transações aprovadas e prontas para captura
+        self.loteador_captura = None # Com captura contínua, as aprovadas vão para o LoteadorCaptura
+        self.contas_estabelecimentos = {} # estabelecimento_id -> (banco, agência, conta); sem cadastro, conta_padrao
 
     def cadastrar_estabelecimento(self, estabelecimento):
         self.estabelecimentos[estabelecimento.id] = estabelecimento
-        self._log(f"Estabelecimento {estabelecimento.nome} ({estabelecimento.id}) cadastrado.", "green",
-                  {"description": f"{self.nome} cadastra Estabelecimento", "active_entities": ["acquirer", "store"], "flow_path": None})
-        time.sleep(0.1)
+        self._evento("Estabelecimento %s (%s) cadastrado.", estabelecimento.nome, estabelecimento.id,
+                     cor="green", animacao=("%s cadastra Estabelecimento", ("acquirer", "store"), None))
+        self._pausa(0.1)
 
     def receber_transacao(self, transacao, bandeira, emissor):
-        self._log(
-            f"Recebida transação: TXN {transacao.id} - Valor: R{transacao.valor:.2f}",
-            "blue",
-            {"description": f"{self.nome} recebe transação", "active_entities": ["acquirer", "store"], "flow_path": "store_to_acquirer"}
-        )
-        time.sleep(0.1)
-        self._log(
-            f"Enviando para Bandeira: TXN {transacao.id}",
-            "blue",
-            {"description": f"{self.nome} envia para Bandeira", "active_entities": ["acquirer", "flag"], "flow_path": "acquirer_to_flag"}
-        )
-        time.sleep(0.1)
+        transacao.nsu = self.alocador.proximo_nsu()
+        self._evento("Recebida transação: TXN %s - Valor: R%.2f", transacao.id, transacao.valor,
+                     cor="blue", animacao=("%s recebe transação", ("acquirer", "store"), "store_to_acquirer"))
+        self._pausa(0.1)
+        self._evento("Enviando para Bandeira: TXN %s", transacao.id,
+                     cor="blue", animacao=("%s envia para Bandeira", ("acquirer", "flag"), "acquirer_to_flag"))
+        self._pausa(0.1)
         
         status_autorizacao = bandeira.solicitar_autorizacao(transacao, emissor)
         
-        self._log(
-            f"Recebida resposta da Bandeira: TXN {transacao.id} - Status: {status_autorizacao.name}",
-            "blue",
-            {"description": f"{self.nome} recebe resposta da Bandeira", "active_entities": ["acquirer", "flag"], "flow_path": "flag_to_acquirer"}
-        )
-        time.sleep(0.1)
+        self._evento("Recebida resposta da Bandeira: TXN %s - Status: %s", transacao.id, status_autorizacao.name,
+                     cor="blue", animacao=("%s recebe resposta da Bandeira", ("acquirer", "flag"), "flag_to_acquirer"))
+        self._pausa(0.1)
+        return self.registrar_resposta(transacao, status_autorizacao)
 
+    def registrar_resposta(self, transacao, status_autorizacao):
+        """Aplica a resposta do emissor à transação (sem pausas; usado também pelo pipeline assíncrono)."""
         if status_autorizacao == StatusTransacao.APROVADA_EMISSOR:
             transacao.status = StatusTransacao.APROVADA
-            transacao.codigo_autorizacao = f"AUTH{datetime.datetime.now().strftime('%f')[:-3]}"
-            self.transacoes_aprovadas.append(transacao)
-            self._log(
-                f"TXN {transacao.id} APROVADA e marcada para captura.",
-                "green",
-                {"description": f"{self.nome} aprova e marca para captura", "active_entities": ["acquirer", "store"], "flow_path": "acquirer_to_store_receipt"}
-            )
+            transacao.codigo_autorizacao = self.alocador.proximo_codigo_autorizacao()
+            if self.journal is not None:
+                self.journal.autorizacao(transacao._tabela, transacao._linha)
+            if self.loteador_captura is not None:
+                self.loteador_captura.adicionar(transacao)
+            else:
+                self.transacoes_aprovadas.append(transacao)
+            self._evento("TXN %s APROVADA e marcada para captura.", transacao.id,
+                         cor="green", animacao=("%s aprova e marca para captura", ("acquirer", "store"), "acquirer_to_store_receipt"))
             return True
         else:
             transacao.status = StatusTransacao.NEGADA
-            self._log(
-                f"TXN {transacao.id} NEGADA. Motivo: SALDO_INSUFICIENTE", # Assumindo este motivo para simplificar
-                "red",
-                {"description": f"{self.nome} nega transação", "active_entities": ["acquirer", "store"], "flow_path": "acquirer_to_store_denial"}
-            )
+            if self.journal is not None:
+                self.journal.autorizacao(transacao._tabela, transacao._linha)
+            self._evento("TXN %s NEGADA. Motivo: SALDO_INSUFICIENTE", transacao.id, # Assumindo este motivo para simplificar
+                         cor="red", animacao=("%s nega transação", ("acquirer", "store"), "acquirer_to_store_denial"))
             return False
 
+    def receber_lote(self, tabela, linhas, portador_ids, bandeira, emissor):
+        """
+        Caminho em lote de receber_transacao para linhas já gravadas na tabela (ex.: carga
+        sintética): NSUs e códigos de autorização reservados de uma vez, autorização colunar
+        via Bandeira e resposta aplicada às colunas. Retorna o array de aprovadas.
+        """
+        linhas = np.asarray(linhas, dtype=np.int64)
+        tabela.nsu[linhas] = self.alocador.nsus_lote(len(linhas))
+        aprovadas = bandeira.solicitar_autorizacao_lote(tabela, linhas, portador_ids, emissor)
+        linhas_aprovadas = linhas[aprovadas]
+        tabela.status[linhas] = np.where(aprovadas, _CODIGO_POR_STATUS[StatusTransacao.APROVADA], _CODIGO_POR_STATUS[StatusTransacao.NEGADA])
+        tabela.codigo_autorizacao[linhas_aprovadas] = self.alocador.codigos_autorizacao_lote(len(linhas_aprovadas))
+        if self.journal is not None:
+            for linha in linhas.tolist():
+                self.journal.autorizacao(tabela, linha)
+        if self.loteador_captura is not None:
+            self.loteador_captura.adicionar_linhas(tabela, linhas_aprovadas)
+        else:
+            self.transacoes_aprovadas.adicionar_linhas(tabela, Transacao, linhas_aprovadas)
+        self._evento("Lote recebido: %s transações, %s aprovadas e marcadas para captura.", len(linhas), len(linhas_aprovadas),
+                     cor="green", animacao=("%s aprova lote e marca para captura", ("acquirer", "store"), None))
+        return aprovadas
+
+    def limpar_transacoes_aprovadas(self):
+        self.transacoes_aprovadas = ListaTransacoes()
+
+    def iniciar_captura_continua(self, bandeira, **politica):
+        """
+        Passa a capturar continuamente: as próximas aprovadas vão para um LoteadorCaptura
+        (política de tamanho/idade/lotes em voo em `politica`) que entrega lotes à Bandeira.
+        As aprovadas que já estavam aguardando captura entram no primeiro lote.
+        """
+        if self.loteador_captura is not None:
+            raise RuntimeError("Captura contínua já iniciada.")
+        self.loteador_captura = LoteadorCaptura(bandeira, **politica)
+        if self.transacoes_aprovadas:
+            self.loteador_captura.adicionar_linhas(self.transacoes_aprovadas._tabela, self.transacoes_aprovadas.linhas)
+            self.limpar_transacoes_aprovadas()
+        self._evento("Captura contínua iniciada: lotes de até %s transações ou %ss, até %s lotes em voo.",
+                     self.loteador_captura.tamanho_maximo, self.loteador_captura.idade_maxima_s, self.loteador_captura.lotes_em_voo,
+                     cor="blue", animacao=("%s inicia captura contínua", ("acquirer", "flag"), None))
+        return self.loteador_captura
+
+    def encerrar_captura_continua(self):
+        """Entrega o lote aberto, espera a Bandeira processar a fila e retorna as estatísticas do loteador."""
+        loteador, self.loteador_captura = self.loteador_captura, None
+        if loteador is None:
+            return None
+        loteador.fechar()
+        estatisticas = loteador.estatisticas()
+        self._evento("Captura contínua encerrada: %s transações em %s lotes (%s bloqueios por backpressure).",
+                     estatisticas["transacoes"], estatisticas["lotes"], estatisticas["bloqueios"],
+                     cor="green", animacao=("%s encerra captura contínua", ("acquirer", "flag"), "acquirer_to_flag_capture"))
+        return estatisticas
+
+    def processar_liquidacao(self, arquivo_liquidacao_adq, transacoes_capturadas=None):
+        # A adquirente concilia o arquivo da bandeira com as capturas liquidadas na janela (quando o arquivo existe).
+        self._evento("Processando arquivo de liquidação: %s", arquivo_liquidacao_adq.split('/')[-1],
+                     cor="blue", animacao=("%s processa liquidação", ("acquirer", "flag"), "flag_to_acquirer_settlement"))
+        self._pausa(0.1)
+        if transacoes_capturadas is not None:
+            self.ultima_conciliacao = self._conciliar(arquivo_liquidacao_adq, LAYOUT_LIQUIDACAO_ADQ, transacoes_capturadas)
+        self._evento("Liquidação processada pela Adquirente. Valores a repassar aos estabelecimentos.",
+                     cor="green", animacao=("%s conclui liquidação", ("acquirer",), None))
+        self._pausa(0.1)
+
+    def iniciar_pagamento_estabelecimentos(self, liquidacao=None, output_dir=None):
+        """
+        Paga os estabelecimentos a partir das posições líquidas da liquidação (ResultadoLiquidacao):
+        uma instrução por conta, gravadas no CNAB consolidado quando há output_dir.
+        """
+        self._evento("Iniciando pagamento aos estabelecimentos (CNAB)...",
+                     cor="blue", animacao=("%s inicia pagamento", ("acquirer", "store"), None))
+        self._pausa(0.1)
+        if liquidacao is None:
+            self._evento("Pagamento enviado para %s estabelecimento(s).", len(self.estabelecimentos),
+                         cor="green", animacao=("%s paga Estabelecimento", ("acquirer", "store"), "acquirer_to_store_payment"))
+            self._pausa(0.1)
+            return True
+        instrucoes = liquidacao.instrucoes_pagamento(self.contas_estabelecimentos)
+        if output_dir is not None and instrucoes:
+            data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+            arquivo = escrever_cnab_pagamentos(liquidacao, os.path.join(output_dir, f"ADQUIRENTE_PAGAMENTO_CNAB_{data_arquivo}.txt"),
+                                               self.contas_estabelecimentos)
+            self._evento("Gerado CNAB de pagamento: %s", os.path.basename(arquivo), cor="blue")
+        self._evento("Pagamento enviado para %s conta(s) de estabelecimento: líquido R%.2f (MDR retido R%.2f).",
+                     len(instrucoes), sum(i[6] for i in instrucoes) / 100, liquidacao.mdr_total / 100,
+                     cor="green", animacao=("%s paga Estabelecimento", ("acquirer", "store"), "acquirer_to_store_payment"))
+        self._pausa(0.1)
+        return True
+
+    def receber_notificacao_chargeback(self, cb_id, txn_id):
+        self._evento("Recebida notificação de Chargeback da Bandeira - CB: %s, TXN: %s. Notificando Estabelecimento.", cb_id, txn_id,
+                     cor="blue", animacao=("%s notifica Estabelecimento sobre CB", ("acquirer", "store"), "acquirer_to_store_chargeback"))
+        self._pausa(0.1)
+        return True
+
+    def enviar_reapresentacao(self, cb_id, txn_id, bandeira):
+        self._evento("Enviando Reapresentação (Documentos de Defesa) para Bandeira - CB: %s, TXN: %s", cb_id, txn_id,
+                     cor="blue", animacao=("%s envia defesa para Bandeira", ("acquirer", "flag"), "acquirer_to_flag_representment"))
+        self._pausa(0.1)
+        return True
+
 class Emissor(EntidadeBase):
-    def __init__(self, nome, log_callback=None):
-        super().__init__(nome, log_callback)
+    def __init__(self, nome, log_callback=None, pacing=None, eventos=None, journal=None, ledger=None, saldo_inicial=2000.00):
+        super().__init__(nome, log_callback, pacing, eventos)
+        self.journal = journal
         self.portadores = {}
-        self.saldos = {} # Saldo simplificado para demonstração
-        self.transacoes_aprovadas = {} # Guarda as transações que aprovou para controle de chargeback/faturamento
+        # Saldos (array NumPy indexado por portador); um SQLiteLedger os persiste entre execuções
+        self.saldos = ledger if ledger is not None else SaldoLedger()
+        self.saldo_inicial = saldo_inicial
+        self.transacoes_aprovadas = MapaTransacoes() # Guarda as transações que aprovou para controle de chargeback/faturamento
+        self.chargebacks = {} # Disputas abertas pelos portadores, por TXN
 
     def cadastrar_portador(self, portador):
         self.portadores[portador.id] = portador
-        self.saldos[portador.id] = 2000.00 # Saldo inicial
-        self._log(f"Portador {portador.nome} ({portador.id}) cadastrado.", "blue",
-                  {"description": f"{self.nome} cadastra Portador", "active_entities": ["issuer", "client"], "flow_path": None})
-        time.sleep(0.1)
+        if portador.id not in self.saldos: # Portador já persistido mantém o saldo
+            self.saldos[portador.id] = self.saldo_inicial
+        if self.journal is not None:
+            self.journal.saldo(portador.id, self.saldos[portador.id])
+        self._evento("Portador %s (%s) cadastrado.", portador.nome, portador.id,
+                     cor="blue", animacao=("%s cadastra Portador", ("issuer", "client"), None))
+        self._pausa(0.1)
+
+    def cadastrar_portadores_lote(self, portador_ids):
+        """Cadastra uma população de portadores só pelos ids (sem objeto Portador), todos com o saldo inicial."""
+        posicoes = self.saldos.posicoes(portador_ids)
+        novos = [portador_id for portador_id, posicao in zip(portador_ids, posicoes.tolist()) if posicao < 0]
+        self.saldos.cadastrar_lote(novos, self.saldo_inicial)
+        if self.journal is not None:
+            for portador_id in novos:
+                self.journal.saldo(portador_id, self.saldo_inicial)
+        self._evento("%s portadores cadastrados em lote.", len(novos),
+                     cor="blue", animacao=("%s cadastra portadores", ("issuer", "client"), None))
+        return len(novos)
 
     def solicitar_autorizacao(self, transacao):
-        self._log(
-            f"Recebida solicitação de Autorização: TXN {transacao.id} - Valor: R{transacao.valor:.2f}",
-            "red",
-            {"description": f"{self.nome} recebe autorização", "active_entities": ["issuer", "flag"], "flow_path": "flag_to_issuer"}
-        )
-        time.sleep(0.1)
-        
+        self._evento("Recebida solicitação de Autorização: TXN %s - Valor: R%.2f", transacao.id, transacao.valor,
+                     cor="red", animacao=("%s recebe autorização", ("issuer", "flag"), "flag_to_issuer"))
+        self._pausa(0.1)
+        return self.decidir_autorizacao(transacao)
+
+    def decidir_autorizacao(self, transacao):
+        """Decisão de autorização (sem pausas; usado também pela Bandeira.rotear_autorizacao)."""
         # Lógica de autorização simples: verifica saldo
-        saldo_atual = self.saldos.get(transacao.portador_id, 0)
-        autorizado = saldo_atual >= transacao.valor
+        if self.journal is not None:
+            self.journal.decididas()
+        posicao = self.saldos.posicao(transacao.portador_id)
+        valor_centavos = transacao.valor_centavos
+        saldos = self.saldos.centavos
+        autorizado = posicao >= 0 and saldos[posicao] >= valor_centavos
 
         if autorizado:
-            self.saldos[transacao.portador_id] -= transacao.valor
+            saldos[posicao] -= valor_centavos
             transacao.status = StatusTransacao.APROVADA_EMISSOR
+            self.saldos.registrar_aprovacao(transacao.id, transacao.portador_id, valor_centavos,
+                                            int(transacao._tabela.timestamp_ns[transacao._linha]))
             self.transacoes_aprovadas[transacao.id] = transacao # Armazena a transação aprovada
-            self._log(
-                f"TXN {transacao.id} APROVADA.",
-                "green",
-                {"description": f"{self.nome} aprova transação", "active_entities": ["issuer", "client"], "flow_path": "issuer_approves"}
-            )
+            self._evento("TXN %s APROVADA.", transacao.id,
+                         cor="green", animacao=("%s aprova transação", ("issuer", "client"), "issuer_approves"))
             return StatusTransacao.APROVADA_EMISSOR
         else:
             transacao.status = StatusTransacao.NEGADA_EMISSOR
-            self._log(
-                f"TXN {transacao.id} NEGADA (Saldo Insuficiente).",
-                "red",
-                {"description": f"{self.nome} nega transação (saldo insuficiente)", "active_entities": ["issuer", "client"], "flow_path": "issuer_denies"}
-            )
+            self._evento("TXN %s NEGADA (Saldo Insuficiente).", transacao.id,
+                         cor="red", animacao=("%s nega transação (saldo insuficiente)", ("issuer", "client"), "issuer_denies"))
             return StatusTransacao.NEGADA_EMISSOR
 
-    def processar_liquidacao(self, arquivo_liquidacao_emissor):
-        # Em um sistema real, aqui o emissor processaria o arquivo da bandeira
-        # e ajustaria as contas dos portadores.
-        self._log(f"Processando arquivo de liquidação: {arquivo_liquidacao_emissor.split('/')[-1]}", "blue",
-                  {"description": f"{self.nome} processa liquidação", "active_entities": ["issuer", "flag"], "flow_path": "flag_to_issuer_settlement"})
-        time.sleep(0.1)
+    def autorizar_lote(self, portador_ids, valores):
+        """
+        Autoriza um lote em formato colunar (ids de portadores e valores, na ordem de chegada).
+        Dá exatamente o mesmo resultado que chamar solicitar_autorizacao em sequência:
+        as compras de um mesmo portador são avaliadas em "rodadas" (1ª compra de cada
+        portador, depois a 2ª, ...), cada rodada numa única passada vetorizada sobre o ledger.
+        Portadores não cadastrados são negados. Retorna um array booleano (True = aprovada).
+        """
+        valores = np.rint(np.asarray(valores, dtype=np.float64) * 100).astype(np.int64)
+        return self.autorizar_lote_centavos(portador_ids, valores)
+
+    def autorizar_lote_centavos(self, portador_ids, valores):
+        """autorizar_lote com os valores já em centavos (comparados e debitados sem conversão)."""
+        valores = np.asarray(valores, dtype=np.int64)
+        posicoes = self.saldos.posicoes(portador_ids)
+        aprovadas = np.zeros(len(valores), dtype=bool)
+
+        conhecidas = np.flatnonzero(posicoes >= 0)
+        if len(conhecidas):
+            # Agrupa por portador preservando a ordem de chegada dentro de cada grupo
+            ordem = conhecidas[np.argsort(posicoes[conhecidas], kind="stable")]
+            grupo = posicoes[ordem]
+            indice = np.arange(len(ordem))
+            inicio_grupo = np.maximum.accumulate(np.where(np.r_[True, grupo[1:] != grupo[:-1]], indice, 0))
+            rodada = indice - inicio_grupo
+
+            # Ordena por rodada: dentro de uma rodada cada portador aparece no máximo uma vez
+            por_rodada = ordem[np.argsort(rodada, kind="stable")]
+            limites = np.cumsum(np.bincount(rodada))
+            saldos = self.saldos.centavos
+            inicio = 0
+            for fim in limites:
+                selecao = por_rodada[inicio:fim]
+                p = posicoes[selecao]
+                v = valores[selecao]
+                ok = saldos[p] >= v
+                saldos[p[ok]] -= v[ok]
+                aprovadas[selecao[ok]] = True
+                inicio = fim
+
+        total_aprovadas = int(aprovadas.sum())
+        self._evento("Lote de autorização processado: %s transações, %s aprovadas, %s negadas.",
+                     len(valores), total_aprovadas, len(valores) - total_aprovadas,
+                     cor="green", animacao=("%s autoriza lote", ("issuer", "flag"), None))
+        return aprovadas
+
+    def autorizar_linhas(self, tabela, linhas, portador_ids):
+        """
+        autorizar_lote sobre linhas já gravadas na tabela: marca APROVADA_EMISSOR/NEGADA_EMISSOR,
+        guarda as aprovadas e as registra no ledger. portador_ids é um array alinhado a linhas.
+        """
+        portador_ids = np.asarray(portador_ids, dtype=object)
+        if self.journal is not None:
+            self.journal.decididas(len(linhas))
+        aprovadas = self.autorizar_lote_centavos(portador_ids, tabela.valor_centavos[linhas])
+        tabela.status[linhas] = np.where(aprovadas, _CODIGO_POR_STATUS[StatusTransacao.APROVADA_EMISSOR],
+                                         _CODIGO_POR_STATUS[StatusTransacao.NEGADA_EMISSOR])
+        linhas_aprovadas = linhas[aprovadas]
+        self.transacoes_aprovadas.adicionar_linhas(tabela, Transacao, linhas_aprovadas)
+        self.saldos.registrar_aprovacoes((txn_id.decode("ascii") for txn_id in tabela.ids[linhas_aprovadas].tolist()),
+                                         portador_ids[aprovadas].tolist(), tabela.valor_centavos[linhas_aprovadas].tolist(),
+                                         tabela.timestamp_ns[linhas_aprovadas].tolist())
+        return aprovadas
+
+    def processar_liquidacao(self, arquivo_liquidacao_emissor, transacoes_liquidadas=None):
+        # O emissor concilia o arquivo da bandeira com as transações da janela (quando informadas);
+        # em um sistema real também ajustaria as contas dos portadores.
+        self._evento("Processando arquivo de liquidação: %s", arquivo_liquidacao_emissor.split('/')[-1],
+                     cor="blue", animacao=("%s processa liquidação", ("issuer", "flag"), "flag_to_issuer_settlement"))
+        self._pausa(0.1)
+        if transacoes_liquidadas is not None:
+            self.ultima_conciliacao = self._conciliar(arquivo_liquidacao_emissor, LAYOUT_LIQUIDACAO_EMISSOR, transacoes_liquidadas)
         # Lógica simplificada: Apenas marca como processado
         # Emissores de verdade faturariam seus clientes aqui, compensariam valores, etc.
-        self._log("Liquidação processada pelo Emissor. (Faturamento)", "green",
-                  {"description": f"{self.nome} processa faturamento", "active_entities": ["issuer", "client"], "flow_path": "issuer_to_client_bill"})
-        time.sleep(0.1)
+        self._evento("Liquidação processada pelo Emissor. (Faturamento)",
+                     cor="green", animacao=("%s processa faturamento", ("issuer", "client"), "issuer_to_client_bill"))
+        self._pausa(0.1)
 
     def iniciar_faturamento(self):
-        self._log("Iniciando faturamento para portadores...", "magenta",
-                  {"description": f"{self.nome} inicia faturamento", "active_entities": ["issuer", "client"], "flow_path": None})
-        time.sleep(0.1)
+        self._evento("Iniciando faturamento para portadores...",
+                     cor="magenta", animacao=("%s inicia faturamento", ("issuer", "client"), None))
+        self._pausa(0.1)
         # Lógica de faturamento: gerar extratos, etc.
-        self._log("Faturamento concluído.", "green",
-                  {"description": f"{self.nome} conclui faturamento", "active_entities": ["issuer", "client"], "flow_path": "issuer_bill_generated"})
-        time.sleep(0.1)
+        self._evento("Faturamento concluído.",
+                     cor="green", animacao=("%s conclui faturamento", ("issuer", "client"), "issuer_bill_generated"))
+        self._pausa(0.1)
         return True # Retorna um status de sucesso
 
+    def receber_solicitacao_chargeback(self, portador_id, txn_id, motivo):
+        self.chargebacks[txn_id] = {"portador_id": portador_id, "motivo": motivo, "cb_id": None, "resolucao": None}
+        self._evento("Recebida solicitação de Chargeback do Portador %s - TXN: %s, Motivo: %s", portador_id, txn_id, motivo,
+                     cor="magenta", animacao=("%s recebe disputa do Portador", ("issuer", "client"), "client_to_issuer_chargeback"))
+        self._pausa(0.1)
+
+    def encaminhar_chargeback_para_bandeira(self, txn_id, bandeira):
+        cb_id = f"CB{txn_id}"
+        self.chargebacks.setdefault(txn_id, {"portador_id": None, "motivo": None, "resolucao": None})["cb_id"] = cb_id
+        self._evento("Encaminhando Chargeback para Bandeira %s - CB ID: %s, TXN: %s", bandeira.nome, cb_id, txn_id,
+                     cor="magenta", animacao=("%s encaminha Chargeback", ("issuer", "flag"), "issuer_to_flag_chargeback"))
+        self._pausa(0.1)
+        return cb_id
+
+    def finalizar_chargeback(self, cb_id, resolucao):
+        for dados in self.chargebacks.values():
+            if dados["cb_id"] == cb_id:
+                dados["resolucao"] = resolucao
+        self._evento("Recebida decisão da Bandeira - CB: %s, Resolução: %s", cb_id, resolucao,
+                     cor="magenta", animacao=("%s recebe decisão do Chargeback", ("issuer", "flag"), "flag_to_issuer_cb_resolution"))
+        self._pausa(0.1)
+
+    def notificar_portador_decisao_chargeback(self, cb_id, resolucao):
+        self._evento("Notificando Portador da decisão - CB: %s, Resolução: %s", cb_id, resolucao,
+                     cor="magenta", animacao=("%s notifica Portador", ("issuer", "client"), "issuer_to_client_cb_decision"))
+        self._pausa(0.1)
+
 class Bandeira(EntidadeBase):
-    def __init__(self, nome, log_callback=None):
-        super().__init__(nome, log_callback)
+    def __init__(self, nome, log_callback=None, pacing=None, seed=None, eventos=None, journal=None, tarifas=None):
+        super().__init__(nome, log_callback, pacing, eventos)
+        self.journal = journal
+        self.rng = random.Random(seed) # Decisões simuladas (reapresentação); com seed o resultado é reprodutível
+        self.motor_liquidacao = MotorLiquidacao(tarifas) # Posições líquidas (MDR/intercâmbio da TabelaTarifas)
+        self.ultima_liquidacao = None
         self.transacoes_pendentes = {}
-        self.transacoes_capturadas = []
-        self.chargebacks_pendentes = {} # Para gerenciar disputas
+        self.transacoes_capturadas = ListaTransacoes()
+        self.capturadas_por_portador = {} # portador_id -> ListaTransacoes, para achar a transação disputada sem varredura
+        self.chargebacks = RegistroChargebacks() # Disputas, indexadas por transação, estabelecimento, portador, status e prazo
+        self.motor_chargebacks = None # MotorCicloChargeback criado no primeiro avancar_ciclo_chargebacks
 
     def solicitar_autorizacao(self, transacao, emissor):
-        self._log(
-            f"Roteando ISO 8583 (Autorização): TXN {transacao.id}",
-            "yellow",
-            {"description": f"{self.nome} roteia autorização para Emissor", "active_entities": ["flag", "issuer"], "flow_path": "flag_to_issuer"}
-        )
-        time.sleep(0.1)
+        self._evento("Roteando ISO 8583 (Autorização): TXN %s", transacao.id,
+                     cor="yellow", animacao=("%s roteia autorização para Emissor", ("flag", "issuer"), "flag_to_issuer"))
+        self._pausa(0.1)
         
         status_emissor = emissor.solicitar_autorizacao(transacao)
         
-        self._log(
-            f"Roteando ISO 8583 (Resposta Autorização): TXN {transacao.id} Status: {status_emissor.name}",
-            "yellow",
-            {"description": f"{self.nome} roteia resposta para Adquirente", "active_entities": ["flag", "acquirer"], "flow_path": "flag_to_acquirer"}
-        )
-        time.sleep(0.1)
+        self._evento("Roteando ISO 8583 (Resposta Autorização): TXN %s Status: %s", transacao.id, status_emissor.name,
+                     cor="yellow", animacao=("%s roteia resposta para Adquirente", ("flag", "acquirer"), "flag_to_acquirer"))
+        self._pausa(0.1)
+        return status_emissor
+
+    def rotear_autorizacao(self, transacao, emissor):
+        """
+        solicitar_autorizacao sem pausas: os mesmos eventos de roteamento e a decisão do emissor.
+        Usado pelo pipeline assíncrono, que simula a latência de cada salto com await.
+        """
+        self._evento("Roteando ISO 8583 (Autorização): TXN %s", transacao.id,
+                     cor="yellow", animacao=("%s roteia autorização para Emissor", ("flag", "issuer"), "flag_to_issuer"))
+        status_emissor = emissor.decidir_autorizacao(transacao)
+        self._evento("Roteando ISO 8583 (Resposta Autorização): TXN %s Status: %s", transacao.id, status_emissor.name,
+                     cor="yellow", animacao=("%s roteia resposta para Adquirente", ("flag", "acquirer"), "flag_to_acquirer"))
         return status_emissor
 
+    def solicitar_autorizacao_lote(self, tabela, linhas, portador_ids, emissor):
+        self._evento("Roteando lote ISO 8583 (Autorização): %s transações", len(linhas),
+                     cor="yellow", animacao=("%s roteia lote para Emissor", ("flag", "issuer"), "flag_to_issuer"))
+        return emissor.autorizar_linhas(tabela, linhas, portador_ids)
+
     def processar_captura(self, lote_captura):
-        self._log(f"Recebido lote de captura da Adquirente. Processando {len(lote_captura)} transações.", "yellow",
-                  {"description": f"{self.nome} recebe lote de captura", "active_entities": ["flag", "acquirer"], "flow_path": "acquirer_to_flag_capture"})
-        time.sleep(0.1)
+        self._evento("Recebido lote de captura da Adquirente. Processando %s transações.", len(lote_captura),
+                     cor="yellow", animacao=("%s recebe lote de captura", ("flag", "acquirer"), "acquirer_to_flag_capture"))
+        self._pausa(0.1)
         for transacao in lote_captura:
             if transacao.status == StatusTransacao.APROVADA:
                 transacao.status = StatusTransacao.CAPTURED
                 self.transacoes_capturadas.append(transacao)
-                self._log(f"TXN {transacao.id} marcada como CAPTURADA.", "yellow")
-        self._log("Lote de captura processado.", "green",
-                  {"description": f"{self.nome} processa captura", "active_entities": ["flag"], "flow_path": None})
-        time.sleep(0.1)
+                portador_id = transacao.portador_id
+                capturadas = self.capturadas_por_portador.get(portador_id)
+                if capturadas is None:
+                    capturadas = self.capturadas_por_portador[portador_id] = ListaTransacoes()
+                capturadas.append(transacao)
+                if self.journal is not None:
+                    self.journal.status(transacao._tabela, transacao._linha, _CODIGO_POR_STATUS[StatusTransacao.CAPTURED])
+                self._evento("TXN %s marcada como CAPTURADA.", transacao.id, cor="yellow", nivel=DEBUG)
+        self._evento("Lote de captura processado.",
+                     cor="green", animacao=("%s processa captura", ("flag",), None))
+        self._pausa(0.1)
         return True
 
-    def iniciar_liquidacao(self, adquirente, emissor):
-        self._log("Iniciando processo de liquidação da Bandeira...", "yellow",
-                  {"description": f"{self.nome} inicia liquidação", "active_entities": ["flag"], "flow_path": None})
-        time.sleep(0.1)
-
-        # Simula a geração de arquivos de liquidação para Adquirente e Emissor
+    def processar_captura_linhas(self, tabela, linhas, registrar_journal=True):
+        """
+        Caminho colunar de processar_captura (usado pela captura contínua): as linhas ainda
+        APROVADAS viram CAPTURED de uma vez e entram nos índices. Pode rodar na thread do
+        LoteadorCaptura; nesse caso o journal fica para journalar_captura na thread da adquirente.
+        Retorna as linhas capturadas.
+        """
+        self._evento("Recebido lote de captura da Adquirente. Processando %s transações.", len(linhas),
+                     cor="yellow", animacao=("%s recebe lote de captura", ("flag", "acquirer"), "acquirer_to_flag_capture"))
+        self._pausa(0.1)
+        linhas = np.asarray(linhas, dtype=np.int64)
+        with tabela.trava: # A adquirente pode estar realocando as colunas ao mesmo tempo
+            linhas = linhas[tabela.status[linhas] == _CODIGO_POR_STATUS[StatusTransacao.APROVADA]]
+            tabela.status[linhas] = _CODIGO_POR_STATUS[StatusTransacao.CAPTURED]
+        if len(linhas):
+            self.transacoes_capturadas.adicionar_linhas(tabela, Transacao, linhas)
+            # Índice por portador: um grupo por código de portador, na ordem de chegada
+            ordem = np.argsort(tabela.portador[linhas], kind="stable")
+            codigos = tabela.portador[linhas[ordem]]
+            fronteiras = np.flatnonzero(np.diff(codigos)) + 1
+            for codigo, grupo in zip(codigos[np.r_[0, fronteiras]].tolist(), np.split(linhas[ordem], fronteiras)):
+                portador_id = tabela.portadores.valor(codigo)
+                capturadas = self.capturadas_por_portador.get(portador_id)
+                if capturadas is None:
+                    capturadas = self.capturadas_por_portador[portador_id] = ListaTransacoes()
+                capturadas.adicionar_linhas(tabela, Transacao, grupo)
+            if registrar_journal:
+                self.journalar_captura(tabela, linhas)
+        self._evento("Lote de captura processado: %s transações capturadas.", len(linhas),
+                     cor="green", animacao=("%s processa captura", ("flag",), None))
+        self._pausa(0.1)
+        return linhas
+
+    def journalar_captura(self, tabela, linhas):
+        if self.journal is not None and len(linhas):
+            self.journal.status_lote(tabela, linhas, _CODIGO_POR_STATUS[StatusTransacao.CAPTURED])
+
+    def iniciar_liquidacao(self, adquirente, emissor, output_dir=None):
+        self._evento("Iniciando processo de liquidação da Bandeira...",
+                     cor="yellow", animacao=("%s inicia liquidação", ("flag",), None))
+        self._pausa(0.1)
+
+        # Gera os arquivos de liquidação para Adquirente e Emissor. Sem output_dir,
+        # só os nomes são simulados (comportamento da demonstração original).
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         adq_file = f"BANDEIRA_LIQUIDACAO_ADQ_{timestamp}.txt"
         emissor_file = f"BANDEIRA_LIQUIDACAO_EMISSOR_{timestamp}.txt"
+        tabela = self.transacoes_capturadas._tabela
+        janela = None # Transações liquidadas nesta janela: é contra elas que adquirente e emissor conciliam
+        if output_dir is not None and tabela is not None:
+            linhas = self.transacoes_capturadas.linhas
+            linhas = linhas[tabela.status[linhas] == _CODIGO_POR_STATUS[StatusTransacao.CAPTURED]]
+            janela = ListaTransacoes(tabela, self.transacoes_capturadas._visao)
+            janela.adicionar_linhas(tabela, self.transacoes_capturadas._visao, linhas)
+            self.ultima_liquidacao = self.motor_liquidacao.liquidar(tabela, linhas, adquirente.nome, emissor.nome, self.nome)
+            self._evento("Posições líquidas: %s", self.ultima_liquidacao.resumo(), cor="yellow")
+            for participante, papel, posicao in self.ultima_liquidacao.posicoes()[:2 + len(self.ultima_liquidacao.emissores)]:
+                self._evento("  %s %s: %s R%.2f", papel.capitalize(), participante, "recebe" if posicao >= 0 else "paga",
+                             abs(posicao) / 100, cor="yellow")
+            adq_file, emissor_file = (
+                arquivo or os.path.join(output_dir, nome)
+                for arquivo, nome in zip(generate_liquidation_files_from_table(tabela, linhas, output_dir, timestamp), (adq_file, emissor_file))
+            )
+            tabela.status[linhas] = _CODIGO_POR_STATUS[StatusTransacao.LIQUIDATED]
+            if self.journal is not None:
+                self.journal.status_lote(tabela, linhas, _CODIGO_POR_STATUS[StatusTransacao.LIQUIDATED])
 
-        self._log(f"Gerado (p/ Adquirente) Arquivo: {adq_file}", "yellow",
-                  {"description": f"{self.nome} gera arquivo p/ Adquirente", "active_entities": ["flag", "acquirer"], "flow_path": "flag_to_acquirer_settlement_file"})
-        time.sleep(0.1)
-        self._log(f"Gerado (p/ Emissor) Arquivo: {emissor_file}", "yellow",
-                  {"description": f"{self.nome} gera arquivo p/ Emissor", "active_entities": ["flag", "issuer"], "flow_path": "flag_to_issuer_settlement_file"})
-        time.sleep(0.1)
+        self._evento("Gerado (p/ Adquirente) Arquivo: %s", adq_file,
+                     cor="yellow", animacao=("%s gera arquivo p/ Adquirente", ("flag", "acquirer"), "flag_to_acquirer_settlement_file"))
+        self._pausa(0.1)
+        self._evento("Gerado (p/ Emissor) Arquivo: %s", emissor_file,
+                     cor="yellow", animacao=("%s gera arquivo p/ Emissor", ("flag", "issuer"), "flag_to_issuer_settlement_file"))
+        self._pausa(0.1)
 
         # Simula o envio dos arquivos
-        self._log(f"Enviando para Adquirente: Arquivo de Liquidação: {adq_file}", "yellow",
-                  {"description": f"{self.nome} envia arquivo p/ Adquirente", "active_entities": ["flag", "acquirer"], "flow_path": "flag_to_acquirer_sftp"})
-        time.sleep(0.1)
-        self._log(f"Enviando para Emissor: Arquivo de Liquidação: {emissor_file}", "yellow",
-                  {"description": f"{self.nome} envia arquivo p/ Emissor", "active_entities": ["flag", "issuer"], "flow_path": "flag_to_issuer_sftp"})
-        time.sleep(0.1)
+        self._evento("Enviando para Adquirente: Arquivo de Liquidação: %s", adq_file,
+                     cor="yellow", animacao=("%s envia arquivo p/ Adquirente", ("flag", "acquirer"), "flag_to_acquirer_sftp"))
+        self._pausa(0.1)
+        self._evento("Enviando para Emissor: Arquivo de Liquidação: %s", emissor_file,
+                     cor="yellow", animacao=("%s envia arquivo p/ Emissor", ("flag", "issuer"), "flag_to_issuer_sftp"))
+        self._pausa(0.1)
 
         # Em um sistema real, esses arquivos seriam transferidos via SFTP/API
         # e as entidades iriam processá-los em seus sistemas.
         # Aqui, chamamos os métodos correspondentes diretamente.
-        adquirente.processar_liquidacao(adq_file)
-        emissor.processar_liquidacao(emissor_file)
-
-        self._log("Processo de liquidação da Bandeira concluído.", "green",
-                  {"description": f"{self.nome} conclui liquidação", "active_entities": ["flag"], "flow_path": None})
-        time.sleep(0.1)
-
-
-    def registrar_chargeback(self, cb_id, txn_id):
-        self._log(f"Recebido solicitação de Chargeback do Emissor: CB ID {cb_id}", "red",
-                  {"description": f"{self.nome} recebe Chargeback do Emissor", "active_entities": ["flag", "issuer"], "flow_path": "issuer_to_flag_chargeback"})
-        self.chargebacks_pendentes[cb_id] = {"txn_id": txn_id, "status": "PENDENTE_DEFESA"}
-        time.sleep(0.1)
+        adquirente.processar_liquidacao(adq_file, janela)
+        emissor.processar_liquidacao(emissor_file, janela)
+
+        self._evento("Processo de liquidação da Bandeira concluído.",
+                     cor="green", animacao=("%s conclui liquidação", ("flag",), None))
+        self._pausa(0.1)
+
+
+    def capturadas_do_portador(self, portador_id):
+        return self.capturadas_por_portador.get(portador_id, ListaTransacoes())
+
+    def registrar_chargeback(self, cb_id, txn_id, motivo=None):
+        self._evento("Recebido solicitação de Chargeback do Emissor: CB ID %s", cb_id,
+                     cor="red", animacao=("%s recebe Chargeback do Emissor", ("flag", "issuer"), "issuer_to_flag_chargeback"))
+        # Estabelecimento, portador e valor vêm da transação capturada (busca por id indexada na tabela)
+        tabela = self.transacoes_capturadas._tabela
+        linha = tabela.localizar(txn_id) if tabela is not None else -1
+        if linha >= 0:
+            transacao = Transacao._da_linha(tabela, linha)
+            self.chargebacks.registrar(cb_id, txn_id, transacao.estabelecimento_id, transacao.portador_id, transacao.valor, motivo)
+        else:
+            self.chargebacks.registrar(cb_id, txn_id, motivo=motivo)
+        if self.journal is not None:
+            self.journal.chargeback(cb_id, txn_id, Chargeback.STATUS_INICIADO)
+        self._pausa(0.1)
         # Notifica a adquirente
-        self._log(f"Notificação de Chargeback - ID CB: {cb_id}, TXN: {txn_id}", "red",
-                  {"description": f"{self.nome} notifica Adquirente sobre CB", "active_entities": ["flag", "acquirer"], "flow_path": "flag_to_acquirer_chargeback"})
-        time.sleep(0.1)
+        self._evento("Notificação de Chargeback - ID CB: %s, TXN: %s", cb_id, txn_id,
+                     cor="red", animacao=("%s notifica Adquirente sobre CB", ("flag", "acquirer"), "flag_to_acquirer_chargeback"))
+        self._pausa(0.1)
 
 
     def receber_reapresentacao(self, cb_id, txn_id, docs_status):
-        self._log(f"Recebida Reapresentação (Documentos de Defesa) da Adquirente para CB: {cb_id}", "yellow",
-                  {"description": f"{self.nome} recebe defesa da Adquirente", "active_entities": ["flag", "acquirer"], "flow_path": "acquirer_to_flag_representment"})
-        self.chargebacks_pendentes[cb_id]["status"] = "REAPRESENTADO"
-        time.sleep(0.1)
-        self._log(f"Reapresentação Avaliada - CB: {cb_id}, Resultado: Aguardando Decisão", "yellow",
-                  {"description": f"{self.nome} avalia reapresentação", "active_entities": ["flag", "issuer"], "flow_path": "flag_to_issuer_evaluation"})
-        time.sleep(0.1)
+        self._evento("Recebida Reapresentação (Documentos de Defesa) da Adquirente para CB: %s", cb_id,
+                     cor="yellow", animacao=("%s recebe defesa da Adquirente", ("flag", "acquirer"), "acquirer_to_flag_representment"))
+        self.chargebacks.atualizar_status(cb_id, Chargeback.STATUS_REAPRESENTADO)
+        if self.journal is not None:
+            self.journal.chargeback(cb_id, txn_id, Chargeback.STATUS_REAPRESENTADO)
+        self._pausa(0.1)
+        self._evento("Reapresentação Avaliada - CB: %s, Resultado: Aguardando Decisão", cb_id,
+                     cor="yellow", animacao=("%s avalia reapresentação", ("flag", "issuer"), "flag_to_issuer_evaluation"))
+        self._pausa(0.1)
         # Em uma simulação mais complexa, haveria lógica para avaliar os docs.
         # Por simplicidade, vamos simular que a defesa será bem-sucedida 50% das vezes.
-        import random
-        if random.random() < 0.5: # 50% de chance de ser favorável ao estabelecimento
+        if self.rng.random() < 0.5: # 50% de chance de ser favorável ao estabelecimento
             return "Favorable ao Estabelecimento"
         else:
             return "Favorable ao Portador"
     
     def finalizar_chargeback(self, cb_id, resolucao, emissor):
-        self._log(f"Decisão de Chargeback - CB: {cb_id}, Resolução: {resolucao}", "yellow",
-                  {"description": f"{self.nome} finaliza Chargeback", "active_entities": ["flag", "issuer"], "flow_path": "flag_to_issuer_cb_resolution"})
-        self.chargebacks_pendentes[cb_id]["status"] = "RESOLVIDO"
+        self._evento("Decisão de Chargeback - CB: %s, Resolução: %s", cb_id, resolucao,
+                     cor="yellow", animacao=("%s finaliza Chargeback", ("flag", "issuer"), "flag_to_issuer_cb_resolution"))
+        status = Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR if "Portador" in resolucao else Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO
+        chargeback = self.chargebacks.atualizar_status(cb_id, status)
+        if self.journal is not None:
+            self.journal.chargeback(cb_id, chargeback.transacao_original_id, status)
         emissor.finalizar_chargeback(cb_id, resolucao) # Notifica o emissor da decisão
-        time.sleep(0.1)
+        self._pausa(0.1)
+
+    def avancar_ciclo_chargebacks(self, dias=1):
+        """
+        Avança em lote (MotorCicloChargeback) o ciclo de vida das disputas abertas do registro:
+        as que ainda não estão no motor entram no status atual, e cada transição volta para o
+        registro e o journal. Retorna quantas transições houve.
+        """
+        if self.motor_chargebacks is None:
+            self.motor_chargebacks = MotorCicloChargeback(seed=self.rng.randrange(2**63), registro=self.chargebacks,
+                                                          journal=self.journal)
+        novas = self.motor_chargebacks.abrir_do_registro(self.transacoes_capturadas._tabela)
+        movidas = self.motor_chargebacks.avancar(dias)
+        self._evento("Ciclo de chargebacks: %s disputas novas, %s transições em %s dia(s). Por status: %s",
+                     len(novas), movidas, dias, self.chargebacks.contagem_por_status(), cor="yellow")
+        return movidas
 
 
 class Estabelecimento(EntidadeBase):
-    def __init__(self, nome, id, log_callback=None):
-        super().__init__(nome, log_callback)
+    def __init__(self, nome, id, log_callback=None, pacing=None, tabela=None, alocador=None, eventos=None):
+        super().__init__(nome, log_callback, pacing, eventos)
         self.id = id
-        self.transacoes = [] # Transações iniciadas por este estabelecimento
+        # Onde as transações deste estabelecimento são gravadas; sem tabela, uma própria (vive com o estabelecimento)
+        self.tabela = tabela if tabela is not None else TabelaTransacoes()
+        self.alocador = alocador or ALOCADOR_PADRAO
+        self.transacoes = ListaTransacoes(self.tabela, Transacao) # Transações iniciadas por este estabelecimento
 
     def iniciar_transacao(self, portador, valor, adquirente, bandeira, emissor):
-        transacao = Transacao(portador.id, self.id, valor)
+        transacao = Transacao(portador.id, self.id, valor, tabela=self.tabela, alocador=self.alocador,
+                              numero_cartao_bin=portador.numero_cartao[:6])
         self.transacoes.append(transacao)
 
-        self._log(
-            f"Passagem de Cartão: Cartão {portador.numero_cartao} - R{valor:.2f}",
-            "black",
-            {"description": f"{self.nome} processa cartão do Cliente", "active_entities": ["store", "client"], "flow_path": "client_to_store"}
-        )
-        time.sleep(0.1)
+        self._evento("Passagem de Cartão: Cartão %s - R%.2f", portador.numero_cartao, valor,
+                     animacao=("%s processa cartão do Cliente", ("store", "client"), "client_to_store"))
+        self._pausa(0.1)
         
         autorizada = adquirente.receber_transacao(transacao, bandeira, emissor)
         return autorizada
 
     def receber_notificacao_chargeback(self, cb_id, txn_id):
-        self._log(f"Recebeu notificação de chargeback para TXN {txn_id}. Preparando defesa...", "orange",
-                  {"description": f"{self.nome} recebe notificação de Chargeback", "active_entities": ["store", "acquirer"], "flow_path": "acquirer_to_store_chargeback"})
-        time.sleep(0.1)
+        self._evento("Recebeu notificação de chargeback para TXN %s. Preparando defesa...", txn_id,
+                     cor="orange", animacao=("%s recebe notificação de Chargeback", ("store", "acquirer"), "acquirer_to_store_chargeback"))
+        self._pausa(0.1)
         return True # Indica que vai preparar a defesa
 
     def preparar_defesa_chargeback(self, cb_id):
-        self._log(f"Documentos de Defesa - CB: {cb_id}", "orange",
-                  {"description": f"{self.nome} prepara e envia defesa", "active_entities": ["store", "acquirer"], "flow_path": "store_to_acquirer_defense"})
-        time.sleep(0.1)
+        self._evento("Documentos de Defesa - CB: %s", cb_id,
+                     cor="orange", animacao=("%s prepara e envia defesa", ("store", "acquirer"), "store_to_acquirer_defense"))
+        self._pausa(0.1)
         # Em uma simulação real, aqui haveria a lógica para reunir provas
         return True # Simula que a defesa foi preparada
 
 class Portador(EntidadeBase):
-    def __init__(self, nome, id, log_callback=None):
-        super().__init__(nome, log_callback)
+    def __init__(self, nome, id, log_callback=None, pacing=None, eventos=None):
+        super().__init__(nome, log_callback, pacing, eventos)
         self.id = id
         self.numero_cartao = f"456789" if id == "PORT001" else f"987654"
         self.transacoes_historico = [] # Historico de transações para chargeback
 
     # O portador inicia o chargeback, mas a ação é registrada no Emissor (seu banco)
     def iniciar_chargeback(self, emissor, txn_id, motivo):
-        self._log(f"Chargeback: Iniciando Chargeback - Motivo: {motivo}", "magenta",
-                  {"description": f"{self.nome} inicia disputa", "active_entities": ["client", "issuer"], "flow_path": "client_to_issuer_chargeback"})
-        time.sleep(0.1)
+        self._evento("Chargeback: Iniciando Chargeback - Motivo: %s", motivo,
+                     cor="magenta", animacao=("%s inicia disputa", ("client", "issuer"), "client_to_issuer_chargeback"))
+        self._pausa(0.1)
         emissor.receber_solicitacao_chargeback(self.id, txn_id, motivo)
@@ -0,0 +1,164 @@
+# src/models/id_allocator.py
+import os
+import threading
+import multiprocessing
+import weakref
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Alocadores vivos no processo; depois de um fork o filho não pode continuar
+# a sequência do pai (geraria os mesmos ids), então todos são invalidados.
+_ALOCADORES = weakref.WeakSet()
+
+
+def _invalidar_apos_fork():
+    for alocador in list(_ALOCADORES):
+        alocador._herdado = True
+        alocador._local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_invalidar_apos_fork)
+
+
+_DIGITOS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+
+
+def _formatar_lote(prefixo, inicio, quantidade, largura, base):
+    """prefixo + inicio..inicio+quantidade-1 com largura dígitos (base 10 ou 16), como array S."""
+    prefixo = prefixo.encode("ascii")
+    numeros = np.arange(inicio, inicio + quantidade, dtype=np.int64) % base ** largura # NSU cicla (ver AlocadorIds)
+    caracteres = np.empty((quantidade, len(prefixo) + largura), dtype=np.uint8)
+    caracteres[:, :len(prefixo)] = np.frombuffer(prefixo, dtype=np.uint8)
+    potencias = base ** np.arange(largura - 1, -1, -1, dtype=np.int64)
+    caracteres[:, len(prefixo):] = _DIGITOS[numeros[:, None] // potencias % base]
+    return caracteres.view(f"S{caracteres.shape[1]}").ravel()
+
+
+class AlocadorIds:
+    """
+    Gera IDs de transação, NSUs e códigos de autorização sem colisão.
+
+    Cada valor leva o prefixo do nó (2 caracteres) e do shard (2 dígitos), então processos
+    com shards diferentes nunca colidem. Dentro do processo, cada thread reserva blocos da
+    sequência sob um lock e depois distribui os valores do seu bloco sem travar.
+
+    Formatos:
+        ID de transação:       TXN + nó + shard + 12 dígitos   (19 caracteres)
+        NSU:                   nó + shard + 8 dígitos           (12 caracteres)
+        Código de autorização: AUTH + nó + shard + 8 hex        (16 caracteres)
+
+    O NSU, como o das redes, cicla: depois de 99999999 volta a 00000000 em vez de esgotar.
+    Ele é único por prefixo dentro de uma janela de 10**8 transações (mais que um dia de
+    um shard); a identidade da transação é o ID, que não cicla.
+    """
+    TAMANHO_BLOCO = 4096
+    _LIMITES = {"txn": 10 ** 12, "nsu": 10 ** 8, "auth": 16 ** 8}
+    _CICLICAS = frozenset({"nsu"})
+
+    def __init__(self, no="01", shard=0, tamanho_bloco=TAMANHO_BLOCO):
+        self.tamanho_bloco = tamanho_bloco
+        self._lock = threading.Lock()
+        self._definir_prefixo(no, shard)
+        self._exige_configuracao = False # Só o ALOCADOR_PADRAO (ver configurar_alocador_padrao)
+        _ALOCADORES.add(self)
+
+    def _definir_prefixo(self, no, shard):
+        if len(no) != 2 or not no.isalnum():
+            raise ValueError(f"Nó deve ter 2 caracteres alfanuméricos: {no!r}")
+        if not 0 <= shard <= 99:
+            raise ValueError(f"Shard deve estar entre 0 e 99: {shard}")
+        self.no = no.upper()
+        self.shard = shard
+        self.prefixo = f"{self.no}{shard:02d}"
+        self._proximos = {sequencia: 0 for sequencia in self._LIMITES}
+        self._local = threading.local()
+        self._herdado = False
+
+    def para_shard(self, shard):
+        """Novo alocador do mesmo nó para outro shard (ex.: um por processo do pool)."""
+        return AlocadorIds(self.no, shard, self.tamanho_bloco)
+
+    def reservar(self, sequencia, quantidade):
+        """Reserva quantidade valores consecutivos da sequência; retorna o primeiro."""
+        if self._herdado:
+            raise RuntimeError("AlocadorIds herdado via fork: crie um alocador com outro shard no processo filho.")
+        if self._exige_configuracao and multiprocessing.parent_process() is not None:
+            raise RuntimeError("ALOCADOR_PADRAO usado em um processo filho sem configurar_alocador_padrao: "
+                               "teria o mesmo prefixo do processo pai.")
+        with self._lock:
+            inicio = self._proximos[sequencia]
+            fim = inicio + quantidade
+            if fim > self._LIMITES[sequencia] and sequencia not in self._CICLICAS:
+                raise OverflowError(f"Sequência '{sequencia}' esgotada para o prefixo {self.prefixo}.")
+            self._proximos[sequencia] = fim
+        return inicio
+
+    def avancar(self, sequencia, minimo):
+        """
+        Garante que a sequência continue a partir de `minimo` (ex.: depois do maior id já
+        persistido por outra execução). Descarta os blocos já reservados pelas threads.
+        """
+        with self._lock:
+            if self._proximos[sequencia] < minimo:
+                self._proximos[sequencia] = minimo
+                self._local = threading.local()
+
+    def _proximo(self, sequencia):
+        bloco = getattr(self._local, sequencia, None)
+        if bloco is None or bloco[0] == bloco[1]:
+            inicio = self.reservar(sequencia, self.tamanho_bloco)
+            bloco = [inicio, inicio + self.tamanho_bloco]
+            setattr(self._local, sequencia, bloco)
+        valor = bloco[0]
+        bloco[0] = valor + 1
+        return valor
+
+    def proximo_id_transacao(self):
+        return f"TXN{self.prefixo}{self._proximo('txn'):012d}"
+
+    def proximo_nsu(self):
+        return f"{self.prefixo}{self._proximo('nsu') % self._LIMITES['nsu']:08d}"
+
+    def proximo_codigo_autorizacao(self):
+        return f"AUTH{self.prefixo}{self._proximo('auth'):08X}"
+
+    # Os métodos de lote devolvem arrays NumPy de bytes (formato das colunas da TabelaTransacoes),
+    # formatados dígito a dígito de forma vetorizada, sem uma f-string por valor.
+    def ids_transacao_lote(self, quantidade):
+        """IDs de transação para um lote inteiro, com uma única reserva."""
+        return _formatar_lote(f"TXN{self.prefixo}", self.reservar("txn", quantidade), quantidade, 12, 10)
+
+    def nsus_lote(self, quantidade):
+        return _formatar_lote(self.prefixo, self.reservar("nsu", quantidade), quantidade, 8, 10)
+
+    def codigos_autorizacao_lote(self, quantidade):
+        return _formatar_lote(f"AUTH{self.prefixo}", self.reservar("auth", quantidade), quantidade, 8, 16)
+
+    def __repr__(self):
+        return f"AlocadorIds(no={self.no!r}, shard={self.shard})"
+
+
+# Alocador do processo; nó e shard podem ser definidos pelas variáveis de ambiente ADQ_NO_ID
+# e ADQ_SHARD_ID. Em um processo filho (multiprocessing) ele precisa de um shard próprio:
+# sem ADQ_SHARD_ID nem configurar_alocador_padrao, gerar ids levanta RuntimeError.
+ALOCADOR_PADRAO = AlocadorIds(os.environ.get("ADQ_NO_ID", "01"), int(os.environ.get("ADQ_SHARD_ID", "0")))
+ALOCADOR_PADRAO._exige_configuracao = "ADQ_SHARD_ID" not in os.environ
+
+
+def configurar_alocador_padrao(no, shard):
+    """
+    Define nó e shard do ALOCADOR_PADRAO neste processo (ex.: no início de cada shard de um
+    worker), para as entidades criadas sem alocador explícito não repetirem os ids de outro
+    processo. Com o mesmo prefixo as sequências continuam; com outro, começam do zero, como
+    em um AlocadorIds novo. Retorna o alocador.
+    """
+    alocador = ALOCADOR_PADRAO
+    with alocador._lock:
+        if alocador._herdado or alocador.prefixo != f"{no.upper()}{shard:02d}":
+            alocador._definir_prefixo(no, shard)
+        alocador._exige_configuracao = False
+    logger.info(f"ALOCADOR_PADRAO configurado: {alocador!r}")
+    return alocador
@@ -0,0 +1,220 @@
+# src/models/ledger.py
+import logging
+import sqlite3
+from itertools import repeat
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SaldoLedger:
+    """
+    Saldos dos portadores guardados em um array NumPy contíguo, com um índice
+    portador_id -> posição. Se comporta como o dict de saldos original
+    (get, [], []=, in, len), e expõe o array para a autorização em lote.
+    Internamente os saldos são centavos inteiros (int64), como os valores da tabela
+    de transações; a interface de dict recebe e devolve reais.
+    """
+    def __init__(self, capacidade_inicial=1024):
+        self._posicoes = {} # portador_id -> posição no array
+        self._ids = []
+        self._saldos = np.zeros(max(capacidade_inicial, 1), dtype=np.int64)
+
+    def _crescer(self, minimo):
+        capacidade = len(self._saldos)
+        while capacidade < minimo:
+            capacidade *= 2
+        novo = np.zeros(capacidade, dtype=np.int64)
+        novo[:len(self._ids)] = self._saldos[:len(self._ids)]
+        self._saldos = novo
+
+    def _adicionar(self, portador_id, centavos):
+        posicao = len(self._ids)
+        if posicao >= len(self._saldos):
+            self._crescer(posicao + 1)
+        self._posicoes[portador_id] = posicao
+        self._ids.append(portador_id)
+        self._saldos[posicao] = centavos
+        return posicao
+
+    @property
+    def centavos(self):
+        """View (sem cópia) dos saldos cadastrados, em centavos; escrever nela altera o ledger."""
+        return self._saldos[:len(self._ids)]
+
+    def definir_centavos(self, portador_id, centavos):
+        """Mesmo que ledger[portador_id] = saldo, com o saldo já em centavos."""
+        posicao = self._posicoes.get(portador_id)
+        if posicao is None:
+            self._adicionar(portador_id, centavos)
+        else:
+            self._saldos[posicao] = centavos
+
+    def posicao(self, portador_id):
+        return self._posicoes.get(portador_id, -1)
+
+    def posicoes(self, portador_ids):
+        """Converte uma sequência de ids em posições do array (-1 para portador desconhecido)."""
+        return np.fromiter(map(self._posicoes.get, portador_ids, repeat(-1)), dtype=np.int64, count=len(portador_ids))
+
+    def get(self, portador_id, default=None):
+        posicao = self._posicoes.get(portador_id)
+        if posicao is None:
+            return default
+        return int(self._saldos[posicao]) / 100
+
+    def __getitem__(self, portador_id):
+        return int(self._saldos[self._posicoes[portador_id]]) / 100
+
+    def __setitem__(self, portador_id, saldo):
+        self.definir_centavos(portador_id, round(saldo * 100))
+
+    def __contains__(self, portador_id):
+        return portador_id in self._posicoes
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def items(self):
+        return zip(self._ids, (centavos / 100 for centavos in self.centavos.tolist()))
+
+    def cadastrar_lote(self, portador_ids, saldo):
+        """Cadastra de uma vez os portadores ainda desconhecidos, todos com o mesmo saldo (em reais); retorna quantos entraram."""
+        novos = [p for p in dict.fromkeys(portador_ids) if p not in self._posicoes]
+        inicio = len(self._ids)
+        if inicio + len(novos) > len(self._saldos):
+            self._crescer(inicio + len(novos))
+        self._posicoes.update(zip(novos, range(inicio, inicio + len(novos))))
+        self._ids.extend(novos)
+        self._saldos[inicio:inicio + len(novos)] = round(saldo * 100)
+        return len(novos)
+
+    # Backend: o ledger em memória não persiste nada; ver SQLiteLedger
+    def registrar_aprovacao(self, txn_id, portador_id, valor_centavos, timestamp_ns):
+        pass
+
+    def registrar_aprovacoes(self, txn_ids, portador_ids, valores_centavos, timestamps_ns):
+        pass
+
+    def continuar_sequencia(self, alocador):
+        pass
+
+    def flush(self):
+        pass
+
+    def fechar(self):
+        pass
+
+    def __repr__(self):
+        return f"SaldoLedger({len(self)} portadores)"
+
+
+class SQLiteLedger(SaldoLedger):
+    """
+    SaldoLedger persistido em SQLite (WAL). O array em memória continua sendo a fonte
+    da autorização e funciona como cache write-behind: nada vai para o disco no caminho
+    quente. Em flush() os saldos alterados desde o último flush (detectados comparando o
+    array com a cópia persistida, o que pega também as escritas em lote direto no array)
+    e as aprovações acumuladas são gravados com executemany numa única transação.
+    Os saldos já gravados são carregados na abertura, então persistem entre execuções;
+    no banco ficam em centavos inteiros, como no array.
+    """
+    _CRIAR = (
+        "CREATE TABLE IF NOT EXISTS saldos (portador_id TEXT PRIMARY KEY, saldo_centavos INTEGER NOT NULL) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS transacoes_aprovadas (id TEXT PRIMARY KEY, portador_id TEXT NOT NULL, "
+        "valor_centavos INTEGER NOT NULL, timestamp_ns INTEGER NOT NULL) WITHOUT ROWID",
+    )
+    _GRAVAR_SALDO = ("INSERT INTO saldos (portador_id, saldo_centavos) VALUES (?, ?) "
+                     "ON CONFLICT(portador_id) DO UPDATE SET saldo_centavos = excluded.saldo_centavos")
+    # Sem OR REPLACE: um id repetido é erro (sobrescreveria a aprovação de outra execução)
+    _GRAVAR_APROVACAO = "INSERT INTO transacoes_aprovadas (id, portador_id, valor_centavos, timestamp_ns) VALUES (?, ?, ?, ?)"
+
+    def __init__(self, caminho, capacidade_inicial=1024, flush_a_cada=100_000):
+        super().__init__(capacidade_inicial)
+        self.caminho = caminho
+        self.flush_a_cada = flush_a_cada # Aprovações acumuladas que disparam um flush automático
+        # A simulação do app roda em outra thread; o acesso continua serializado pelo simulador
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        with self._conexao:
+            self._migrar_saldos_reais()
+            for comando in self._CRIAR:
+                self._conexao.execute(comando)
+        self._aprovacoes = []
+        self._carregar()
+
+    def _migrar_saldos_reais(self):
+        """Bancos antigos guardavam o saldo em REAL (reais); converte para centavos inteiros."""
+        colunas = [coluna[1] for coluna in self._conexao.execute("PRAGMA table_info(saldos)")]
+        if "saldo" not in colunas:
+            return
+        self._conexao.execute("ALTER TABLE saldos RENAME TO saldos_reais")
+        self._conexao.execute(self._CRIAR[0])
+        self._conexao.execute("INSERT INTO saldos SELECT portador_id, CAST(ROUND(saldo * 100) AS INTEGER) FROM saldos_reais")
+        self._conexao.execute("DROP TABLE saldos_reais")
+        logger.info(f"SQLiteLedger: saldos de {self.caminho} convertidos para centavos.")
+
+    def _carregar(self):
+        ids, saldos = [], []
+        for portador_id, centavos in self._conexao.execute("SELECT portador_id, saldo_centavos FROM saldos"):
+            ids.append(portador_id)
+            saldos.append(centavos)
+        if ids:
+            self._crescer(len(ids))
+            self._ids = ids
+            self._posicoes = {portador_id: posicao for posicao, portador_id in enumerate(ids)}
+            self._saldos[:len(ids)] = saldos
+        self._persistido = self.centavos.copy()
+        logger.info(f"SQLiteLedger: {len(ids)} saldos carregados de {self.caminho}.")
+
+    def registrar_aprovacao(self, txn_id, portador_id, valor_centavos, timestamp_ns):
+        self._aprovacoes.append((txn_id, portador_id, valor_centavos, timestamp_ns))
+        if len(self._aprovacoes) >= self.flush_a_cada:
+            self.flush()
+
+    def registrar_aprovacoes(self, txn_ids, portador_ids, valores_centavos, timestamps_ns):
+        """Mesmo que registrar_aprovacao para um lote (colunas na mesma ordem)."""
+        self._aprovacoes.extend(zip(txn_ids, portador_ids, valores_centavos, timestamps_ns))
+        if len(self._aprovacoes) >= self.flush_a_cada:
+            self.flush()
+
+    def flush(self):
+        """Grava os saldos alterados e as aprovações pendentes numa única transação."""
+        atual = self.centavos
+        anteriores = len(self._persistido)
+        posicoes = np.flatnonzero(atual[:anteriores] != self._persistido).tolist()
+        posicoes.extend(range(anteriores, len(atual)))
+        if not posicoes and not self._aprovacoes:
+            return
+        ids = self._ids
+        valores = atual[posicoes].tolist()
+        with self._conexao:
+            self._conexao.executemany(self._GRAVAR_SALDO, zip([ids[p] for p in posicoes], valores))
+            self._conexao.executemany(self._GRAVAR_APROVACAO, self._aprovacoes)
+        logger.debug("SQLiteLedger: %s saldos e %s aprovações gravados.", len(posicoes), len(self._aprovacoes))
+        self._aprovacoes = []
+        self._persistido = atual.copy()
+
+    def continuar_sequencia(self, alocador):
+        """Avança os ids de transação do alocador para depois do maior já persistido com o seu prefixo."""
+        prefixo = f"TXN{alocador.prefixo}"
+        (maior,) = self._conexao.execute("SELECT MAX(id) FROM transacoes_aprovadas WHERE id >= ? AND id < ?",
+                                         (prefixo, prefixo + "\x7f")).fetchone()
+        if maior is not None:
+            alocador.avancar("txn", int(maior[len(prefixo):]) + 1)
+            logger.info(f"SQLiteLedger: ids de transação continuam depois de {maior}.")
+
+    def aprovadas(self):
+        """Quantidade de transações aprovadas persistidas (sem contar as pendentes de flush)."""
+        return self._conexao.execute("SELECT COUNT(*) FROM transacoes_aprovadas").fetchone()[0]
+
+    def fechar(self):
+        self.flush()
+        self._conexao.close()
+
+    def __repr__(self):
+        return f"SQLiteLedger({self.caminho!r}, {len(self)} portadores, {len(self._aprovacoes)} aprovações pendentes)"
@@ -1,5 +1,6 @@
 # src/models/transaction.py
 import datetime
+from src.models.clock import agora_ns, ns_para_datetime, datetime_para_ns
 
 class Transacao:
     def __init__(self, id_transacao, valor, tipo_cartao, numero_cartao_bin, data_hora, status="PENDENTE_AUTORIZACAO", nsu=None, codigo_autorizacao=None, id_estabelecimento=None, id_portador=None):
@@ -17,3 +18,41 @@ class Transacao:
     def __repr__(self):
         return (f"Transacao(ID: {self.id}, Valor: R${self.valor:.2f}, Status: {self.status}, "
                 f"BIN: {self.numero_cartao_bin}, Est: {self.id_estabelecimento})")
+
+
+class TransacaoCompacta:
+    """
+    Variante enxuta de Transacao: __slots__ (sem __dict__ por objeto) e data_hora guardada
+    como ns desde a epoch, com uma única leitura de relógio quando não informada.
+    Mesmos atributos, mesmo repr e compatível com os geradores de arquivo.
+    """
+    __slots__ = ("id", "valor", "tipo_cartao", "numero_cartao_bin", "_data_hora_ns", "status", "nsu",
+                 "codigo_autorizacao", "id_estabelecimento", "id_portador")
+
+    def __init__(self, id_transacao, valor, tipo_cartao, numero_cartao_bin, data_hora=None, status="PENDENTE_AUTORIZACAO", nsu=None, codigo_autorizacao=None, id_estabelecimento=None, id_portador=None):
+        self.id = id_transacao
+        self.valor = valor
+        self.tipo_cartao = tipo_cartao
+        self.numero_cartao_bin = numero_cartao_bin
+        self._data_hora_ns = agora_ns() if data_hora is None else datetime_para_ns(data_hora)
+        self.status = status
+        self.nsu = nsu
+        self.codigo_autorizacao = codigo_autorizacao
+        self.id_estabelecimento = id_estabelecimento
+        self.id_portador = id_portador
+
+    @property
+    def data_hora(self):
+        return ns_para_datetime(self._data_hora_ns)
+
+    @data_hora.setter
+    def data_hora(self, data_hora):
+        self._data_hora_ns = datetime_para_ns(data_hora)
+
+    @property
+    def data_hora_ns(self):
+        return self._data_hora_ns
+
+    def __repr__(self):
+        return (f"Transacao(ID: {self.id}, Valor: R${self.valor:.2f}, Status: {self.status}, "
+                f"BIN: {self.numero_cartao_bin}, Est: {self.id_estabelecimento})")
@@ -0,0 +1,316 @@
+# src/models/transaction_table.py
+from array import array
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Internador:
+    """Tabela de strings repetidas (ids de portador, estabelecimento, tipo) -> código inteiro."""
+    def __init__(self):
+        self._codigos = {}
+        self._valores = []
+
+    def codigo(self, valor):
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = len(self._valores)
+            self._codigos[valor] = codigo
+            self._valores.append(valor)
+        return codigo
+
+    def codigos(self, valores):
+        codigos = list(map(self._codigos.get, valores)) # Busca em C; só os valores novos passam por codigo()
+        if None in codigos:
+            codigo = self.codigo
+            codigos = [c if c is not None else codigo(v) for c, v in zip(codigos, valores)]
+        return np.array(codigos, dtype=np.int32)
+
+    def valor(self, codigo):
+        return self._valores[codigo]
+
+    def __len__(self):
+        return len(self._valores)
+
+
+class TabelaTransacoes:
+    """
+    Armazenamento colunar das transações: cada coluna é um array NumPy de largura fixa
+    (centavos em int64, status como código, ids repetidos internados), em vez de um
+    objeto Python por transação. As entidades guardam apenas o número da linha.
+    """
+    LARGURA_ID = 24
+    LARGURA_CODIGO_AUTORIZACAO = 16
+    LARGURA_NSU = 12
+    LARGURA_BIN = 6
+
+    def __init__(self, capacidade_inicial=1024):
+        self._tamanho = 0
+        self._capacidade = max(capacidade_inicial, 1)
+        self.portadores = Internador()
+        self.estabelecimentos = Internador()
+        self.tipos = Internador()
+        self.ids = np.zeros(self._capacidade, dtype=f"S{self.LARGURA_ID}")
+        self.portador = np.zeros(self._capacidade, dtype=np.int32)
+        self.estabelecimento = np.zeros(self._capacidade, dtype=np.int32)
+        self.valor_centavos = np.zeros(self._capacidade, dtype=np.int64)
+        self.tipo = np.zeros(self._capacidade, dtype=np.uint8)
+        self.status = np.zeros(self._capacidade, dtype=np.uint8)
+        self.timestamp_ns = np.zeros(self._capacidade, dtype=np.int64)
+        self.codigo_autorizacao = np.zeros(self._capacidade, dtype=f"S{self.LARGURA_CODIGO_AUTORIZACAO}")
+        self.nsu = np.zeros(self._capacidade, dtype=f"S{self.LARGURA_NSU}")
+        self.bin = np.zeros(self._capacidade, dtype=f"S{self.LARGURA_BIN}")
+        # Índice id -> linha construído sob demanda (só paga quem faz busca por id)
+        self._indice_ids = {}
+        self._indexado_ate = 0
+        # Escritas de outra thread (captura contínua) não podem cair numa coluna sendo realocada
+        self.trava = threading.Lock()
+
+    _COLUNAS = ("ids", "portador", "estabelecimento", "valor_centavos", "tipo", "status",
+                "timestamp_ns", "codigo_autorizacao", "nsu", "bin")
+
+    def _reservar(self, quantidade):
+        necessario = self._tamanho + quantidade
+        if necessario <= self._capacidade:
+            return
+        capacidade = max(self._capacidade, 1)
+        while capacidade < necessario:
+            capacidade *= 2
+        with self.trava:
+            for nome in self._COLUNAS:
+                antiga = getattr(self, nome)
+                nova = np.zeros(capacidade, dtype=antiga.dtype)
+                nova[:self._tamanho] = antiga[:self._tamanho]
+                setattr(self, nome, nova)
+        self._capacidade = capacidade
+
+    def _validar_id(self, txn_id):
+        if len(txn_id) > self.LARGURA_ID:
+            raise ValueError(f"ID de transação maior que {self.LARGURA_ID} caracteres: {txn_id}")
+        return txn_id.encode("ascii")
+
+    def adicionar(self, txn_id, portador_id, estabelecimento_id, valor_centavos, tipo, status, timestamp_ns, numero_cartao_bin=""):
+        """Acrescenta uma transação e retorna o número da linha."""
+        self._reservar(1)
+        linha = self._tamanho
+        self.ids[linha] = self._validar_id(txn_id)
+        self.portador[linha] = self.portadores.codigo(portador_id)
+        self.estabelecimento[linha] = self.estabelecimentos.codigo(estabelecimento_id)
+        self.valor_centavos[linha] = valor_centavos
+        self.tipo[linha] = self.tipos.codigo(tipo)
+        self.status[linha] = status
+        self.timestamp_ns[linha] = timestamp_ns
+        self.bin[linha] = numero_cartao_bin.encode("ascii")
+        self._tamanho += 1
+        return linha
+
+    def adicionar_lote(self, txn_ids, portador_ids, estabelecimento_ids, valores_centavos, tipos, status, timestamps_ns, bins=b""):
+        """Acrescenta um lote colunar de transações; retorna o range de linhas criadas."""
+        quantidade = len(valores_centavos)
+        self._reservar(quantidade)
+        inicio, fim = self._tamanho, self._tamanho + quantidade
+        ids = np.asarray(txn_ids, dtype=np.bytes_)
+        if ids.dtype.itemsize > self.LARGURA_ID:
+            raise ValueError(f"IDs de transação maiores que {self.LARGURA_ID} caracteres no lote.")
+        self.ids[inicio:fim] = ids
+        self.portador[inicio:fim] = self.portadores.codigos(portador_ids)
+        self.estabelecimento[inicio:fim] = self.estabelecimentos.codigos(estabelecimento_ids)
+        self.valor_centavos[inicio:fim] = valores_centavos
+        self.tipo[inicio:fim] = self.tipos.codigos(tipos) if not isinstance(tipos, str) else self.tipos.codigo(tipos)
+        self.status[inicio:fim] = status
+        self.timestamp_ns[inicio:fim] = timestamps_ns
+        self.bin[inicio:fim] = bins
+        self._tamanho = fim
+        return range(inicio, fim)
+
+    def localizar(self, txn_id):
+        """Linha da transação com esse id, ou -1."""
+        if self._indexado_ate < self._tamanho:
+            ids = self.ids[self._indexado_ate:self._tamanho].tolist()
+            self._indice_ids.update(zip(ids, range(self._indexado_ate, self._tamanho)))
+            self._indexado_ate = self._tamanho
+        return self._indice_ids.get(txn_id.encode("ascii"), -1)
+
+    def coluna(self, nome):
+        """View (sem cópia) da coluna até a última linha preenchida."""
+        return getattr(self, nome)[:self._tamanho]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, nome).nbytes for nome in self._COLUNAS)
+
+    def salvar(self, diretorio):
+        """Congela a tabela em um diretório: uma coluna .npy por arquivo e os valores internados em JSON."""
+        os.makedirs(diretorio, exist_ok=True)
+        for nome in self._COLUNAS:
+            np.save(os.path.join(diretorio, f"{nome}.npy"), self.coluna(nome))
+        with open(os.path.join(diretorio, "internados.json"), "w", encoding="utf-8") as f:
+            json.dump({nome: getattr(self, nome)._valores for nome in ("portadores", "estabelecimentos", "tipos")}, f)
+        return diretorio
+
+    @classmethod
+    def carregar(cls, diretorio, somente_leitura=True):
+        """
+        Abre uma tabela salva com salvar(). Com somente_leitura, as colunas são mapeadas em
+        memória (mmap, sem cópia): vários processos compartilham as mesmas páginas.
+        """
+        tabela = cls(capacidade_inicial=1)
+        for nome in cls._COLUNAS:
+            setattr(tabela, nome, np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode="r" if somente_leitura else None))
+        with open(os.path.join(diretorio, "internados.json"), encoding="utf-8") as f:
+            for nome, valores in json.load(f).items():
+                internador = getattr(tabela, nome)
+                for valor in valores:
+                    internador.codigo(valor)
+        tabela._tamanho = tabela._capacidade = len(tabela.ids)
+        return tabela
+
+    def __len__(self):
+        return self._tamanho
+
+    def __repr__(self):
+        return f"TabelaTransacoes({self._tamanho} linhas, {self.nbytes / 1e6:.1f} MB)"
+
+
+class ListaTransacoes:
+    """
+    Substitui a list de objetos Transacao nas entidades: guarda só os números de linha
+    (array de int64) e devolve visões ao iterar. A tabela e a classe de visão são
+    descobertas na primeira transação adicionada.
+    """
+    def __init__(self, tabela=None, visao=None):
+        self._tabela = tabela
+        self._visao = visao
+        self._linhas = array("q")
+
+    def append(self, transacao):
+        if self._tabela is None:
+            self._tabela, self._visao = transacao._tabela, type(transacao)
+        elif transacao._tabela is not self._tabela:
+            raise ValueError("Transação pertence a outra TabelaTransacoes.")
+        self._linhas.append(transacao._linha)
+
+    def extend(self, transacoes):
+        for transacao in transacoes:
+            self.append(transacao)
+
+    def adicionar_linhas(self, tabela, visao, linhas):
+        """Acrescenta linhas da tabela de uma vez (caminho em lote, sem criar uma visão por transação)."""
+        if self._tabela is None:
+            self._tabela, self._visao = tabela, visao
+        elif tabela is not self._tabela:
+            raise ValueError("Transação pertence a outra TabelaTransacoes.")
+        self._linhas.frombytes(np.asarray(linhas, dtype=np.int64).tobytes())
+
+    def clear(self):
+        self._linhas = array("q")
+
+    @property
+    def linhas(self):
+        """Números de linha como array NumPy (cópia: uma view travaria o array para novos appends)."""
+        return np.frombuffer(self._linhas, dtype=np.int64).copy() if self._linhas else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._linhas)
+
+    def __iter__(self):
+        tabela, visao = self._tabela, self._visao
+        for linha in self._linhas:
+            yield visao._da_linha(tabela, linha)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self._visao._da_linha(self._tabela, linha) for linha in self._linhas[posicao]]
+        return self._visao._da_linha(self._tabela, self._linhas[posicao])
+
+    def __repr__(self):
+        return f"ListaTransacoes({len(self)} transações)"
+
+
+class MapaTransacoes:
+    """
+    Substitui o dict id -> Transacao: guarda as linhas em um array e um bitmap de
+    pertinência; a busca por id usa o índice da própria tabela.
+    """
+    def __init__(self, tabela=None, visao=None):
+        self._tabela = tabela
+        self._visao = visao
+        self._linhas = array("q")
+        self._membros = bytearray()
+
+    def __setitem__(self, txn_id, transacao):
+        if self._tabela is None:
+            self._tabela, self._visao = transacao._tabela, type(transacao)
+        elif transacao._tabela is not self._tabela:
+            raise ValueError("Transação pertence a outra TabelaTransacoes.")
+        linha = transacao._linha
+        if linha >= len(self._membros):
+            self._membros.extend(bytes(max(linha + 1, 2 * len(self._membros)) - len(self._membros)))
+        if not self._membros[linha]:
+            self._membros[linha] = 1
+            self._linhas.append(linha)
+
+    def adicionar_linhas(self, tabela, visao, linhas):
+        """Inclui várias linhas da tabela de uma vez (as já presentes são ignoradas)."""
+        if self._tabela is None:
+            self._tabela, self._visao = tabela, visao
+        elif tabela is not self._tabela:
+            raise ValueError("Transação pertence a outra TabelaTransacoes.")
+        linhas = np.unique(np.asarray(linhas, dtype=np.int64))
+        if not len(linhas):
+            return
+        if linhas[-1] >= len(self._membros):
+            self._membros.extend(bytes(max(int(linhas[-1]) + 1, 2 * len(self._membros)) - len(self._membros)))
+        membros = np.frombuffer(self._membros, dtype=np.uint8)
+        novas = linhas[membros[linhas] == 0]
+        membros[novas] = 1
+        del membros # Libera o buffer para o bytearray voltar a crescer
+        self._linhas.frombytes(novas.tobytes())
+
+    def _linha(self, txn_id):
+        if self._tabela is None:
+            return -1
+        linha = self._tabela.localizar(txn_id)
+        if 0 <= linha < len(self._membros) and self._membros[linha]:
+            return linha
+        return -1
+
+    def __getitem__(self, txn_id):
+        linha = self._linha(txn_id)
+        if linha < 0:
+            raise KeyError(txn_id)
+        return self._visao._da_linha(self._tabela, linha)
+
+    def get(self, txn_id, default=None):
+        linha = self._linha(txn_id)
+        return default if linha < 0 else self._visao._da_linha(self._tabela, linha)
+
+    def __contains__(self, txn_id):
+        return self._linha(txn_id) >= 0
+
+    @property
+    def linhas(self):
+        return np.frombuffer(self._linhas, dtype=np.int64).copy() if self._linhas else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._linhas)
+
+    def values(self):
+        tabela, visao = self._tabela, self._visao
+        return (visao._da_linha(tabela, linha) for linha in self._linhas)
+
+    def keys(self):
+        return (transacao.id for transacao in self.values())
+
+    def items(self):
+        return ((transacao.id, transacao) for transacao in self.values())
+
+    def __iter__(self):
+        return self.keys()
+
+    def __repr__(self):
+        return f"MapaTransacoes({len(self)} transações)"
@@ -0,0 +1,113 @@
+# src/services/aggregation.py
+import logging
+import numpy as np
+
+from src.models.clock import segundos_locais
+from src.models.entities import StatusTransacao, _STATUS_POR_CODIGO
+
+logger = logging.getLogger(__name__)
+
+# Chaves de agrupamento, na ordem da tupla de grupo
+CHAVES = ("mes", "estabelecimento", "tipo", "status")
+
+# Status que contam como transação efetivada nos regulatórios (aprovada em diante, sem estorno)
+STATUS_EFETIVADOS = frozenset(s.name for s in (StatusTransacao.APROVADA, StatusTransacao.CAPTURED,
+                                               StatusTransacao.LIQUIDATED, StatusTransacao.SETTLED))
+
+TAMANHO_CHUNK_PADRAO = 1 << 16
+
+# A chave int64 empacotada reserva 24 bits para o código do estabelecimento (tipo e status são uint8)
+LIMITE_ESTABELECIMENTOS_CHAVE = 1 << 24
+_CHAVE_REGISTRO = np.dtype([("mes", np.int64), ("estabelecimento", np.int32), ("tipo", np.uint8), ("status", np.uint8)])
+
+
+def _meses_locais(timestamps_ns):
+    """Mês local (AAAAMM, int) de cada timestamp em ns, vetorizado."""
+    meses = segundos_locais(timestamps_ns).astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+    return (meses // 12 + 1970) * 100 + meses % 12 + 1
+
+
+class AgregadorTransacoes:
+    """
+    Agregação em passada única: para cada grupo (mês, estabelecimento, tipo de cartão,
+    status) mantém só dois contadores, quantidade e soma em centavos. As transações chegam
+    em chunks (colunas da TabelaTransacoes ou objetos), cada chunk é reduzido de forma
+    vetorizada e descartado, então a memória é a de um chunk mais o número de grupos.
+    """
+    def __init__(self):
+        self.grupos = {} # (mes, estabelecimento, tipo, status) -> [quantidade, soma_centavos]
+        self.transacoes = 0
+
+    def _acumular(self, chaves, quantidades, somas):
+        grupos = self.grupos
+        for chave, quantidade, soma in zip(chaves, quantidades, somas):
+            contadores = grupos.get(chave)
+            if contadores is None:
+                grupos[chave] = [quantidade, soma]
+            else:
+                contadores[0] += quantidade
+                contadores[1] += soma
+
+    def consumir_tabela(self, tabela, linhas=None, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+        """Agrega as linhas (todas, por padrão) da TabelaTransacoes, um chunk de colunas por vez."""
+        total = len(tabela) if linhas is None else len(linhas)
+        for inicio in range(0, total, tamanho_chunk):
+            chunk = slice(inicio, min(inicio + tamanho_chunk, total)) if linhas is None else linhas[inicio:inicio + tamanho_chunk]
+            meses = _meses_locais(tabela.timestamp_ns[chunk])
+            if len(tabela.estabelecimentos) < LIMITE_ESTABELECIMENTOS_CHAVE:
+                # Uma chave int64 por linha: mês | estabelecimento | tipo | status
+                chave = (((meses - 190001) << 40) | (tabela.estabelecimento[chunk].astype(np.int64) << 16)
+                         | (tabela.tipo[chunk].astype(np.int64) << 8) | tabela.status[chunk])
+                unicas, inverso = np.unique(chave, return_inverse=True)
+                colunas = ((unicas >> 40) + 190001, (unicas >> 16) & 0xFFFFFF, (unicas >> 8) & 0xFF, unicas & 0xFF)
+            else:
+                # Códigos de estabelecimento não cabem na chave empacotada: np.unique sobre registros (mais lento)
+                chave = np.empty(len(meses), dtype=_CHAVE_REGISTRO)
+                chave["mes"], chave["estabelecimento"] = meses, tabela.estabelecimento[chunk]
+                chave["tipo"], chave["status"] = tabela.tipo[chunk], tabela.status[chunk]
+                unicas, inverso = np.unique(chave, return_inverse=True)
+                colunas = (unicas["mes"], unicas["estabelecimento"], unicas["tipo"], unicas["status"])
+            quantidades = np.bincount(inverso, minlength=len(unicas))
+            somas = np.zeros(len(unicas), dtype=np.int64)
+            np.add.at(somas, inverso, tabela.valor_centavos[chunk])
+            self._acumular(
+                [(mes, tabela.estabelecimentos.valor(estabelecimento), tabela.tipos.valor(tipo), _STATUS_POR_CODIGO[status].name)
+                 for mes, estabelecimento, tipo, status in zip(*(coluna.tolist() for coluna in colunas))],
+                quantidades.tolist(), somas.tolist())
+            self.transacoes += len(inverso)
+        return self
+
+    def consumir(self, transacoes):
+        """Agrega qualquer iterável de objetos Transacao (gerador inclusive), uma transação por vez."""
+        grupos = self.grupos
+        for t in transacoes:
+            chave = (int(t.timestamp.strftime("%Y%m")), t.estabelecimento_id, t.tipo, t.status.name)
+            contadores = grupos.get(chave)
+            if contadores is None:
+                grupos[chave] = [1, t.valor_centavos]
+            else:
+                contadores[0] += 1
+                contadores[1] += t.valor_centavos
+            self.transacoes += 1
+        return self
+
+    def totais(self, por=CHAVES, filtro=None):
+        """
+        Consolida os grupos nas chaves de `por` (subconjunto de CHAVES). filtro recebe um
+        dict {chave: valor} do grupo e decide se ele entra. Retorna {tupla: (quantidade, centavos)} ordenado.
+        """
+        posicoes = [CHAVES.index(chave) for chave in por]
+        totais = {}
+        for grupo, (quantidade, soma) in self.grupos.items():
+            if filtro is not None and not filtro(dict(zip(CHAVES, grupo))):
+                continue
+            chave = tuple(grupo[p] for p in posicoes)
+            atual = totais.get(chave, (0, 0))
+            totais[chave] = (atual[0] + quantidade, atual[1] + soma)
+        return dict(sorted(totais.items()))
+
+    def __len__(self):
+        return len(self.grupos)
+
+    def __repr__(self):
+        return f"AgregadorTransacoes({self.transacoes} transações, {len(self.grupos)} grupos)"
@@ -0,0 +1,186 @@
+# src/services/async_pipeline.py
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import numpy as np
+
+from src.models.entities import Transacao, StatusTransacao
+
+logger = logging.getLogger(__name__)
+
+
+class LatenciaFixa:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def amostra(self, rng):
+        return self.ms / 1000
+
+    def __repr__(self):
+        return f"LatenciaFixa({self.ms}ms)"
+
+
+class LatenciaUniforme:
+    def __init__(self, minimo_ms, maximo_ms):
+        self.minimo_ms = minimo_ms
+        self.maximo_ms = maximo_ms
+
+    def amostra(self, rng):
+        return rng.uniform(self.minimo_ms, self.maximo_ms) / 1000
+
+    def __repr__(self):
+        return f"LatenciaUniforme({self.minimo_ms}-{self.maximo_ms}ms)"
+
+
+class LatenciaLognormal:
+    """Latência de rede típica: mediana em ms e cauda longa controlada por sigma."""
+    def __init__(self, mediana_ms, sigma=0.5):
+        self.mediana_ms = mediana_ms
+        self.sigma = sigma
+        self._mu = math.log(mediana_ms) if mediana_ms > 0 else float("-inf")
+
+    def amostra(self, rng):
+        if self.mediana_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(self._mu, self.sigma) / 1000
+
+    def __repr__(self):
+        return f"LatenciaLognormal(mediana={self.mediana_ms}ms, sigma={self.sigma})"
+
+
+# Saltos de rede da autorização, com os mesmos nomes de flow_path das animações
+SALTOS = (
+    "client_to_store",    # Leitura do cartão no terminal
+    "store_to_acquirer",
+    "acquirer_to_flag",
+    "flag_to_issuer",
+    "issuer_processing",  # Processamento interno do emissor (antifraude, saldo)
+    "issuer_to_flag",
+    "flag_to_acquirer",
+    "acquirer_to_store",
+)
+
+LATENCIAS_PADRAO = {
+    "client_to_store": LatenciaFixa(0),
+    "store_to_acquirer": LatenciaLognormal(20, 0.4),
+    "acquirer_to_flag": LatenciaLognormal(8, 0.3),
+    "flag_to_issuer": LatenciaLognormal(10, 0.3),
+    "issuer_processing": LatenciaLognormal(15, 0.6),
+    "issuer_to_flag": LatenciaLognormal(10, 0.3),
+    "flag_to_acquirer": LatenciaLognormal(8, 0.3),
+    "acquirer_to_store": LatenciaLognormal(20, 0.4),
+}
+
+
+class AsyncAuthorizationPipeline:
+    """
+    Variante assíncrona da cadeia Estabelecimento → Adquirente → Bandeira → Emissor:
+    cada salto de rede é um await com latência sorteada da sua distribuição, então muitas
+    autorizações ficam em voo ao mesmo tempo em um único event loop. A lógica de negócio
+    (NSU, saldo, código de autorização, lote de captura) é a mesma das entidades, pela API
+    sem pausas delas (Bandeira.rotear_autorizacao e Adquirente.registrar_resposta), com os
+    mesmos eventos e métricas.
+    """
+    def __init__(self, adquirente, bandeira, emissor, latencias=None, seed=None):
+        self.adquirente = adquirente
+        self.bandeira = bandeira
+        self.emissor = emissor
+        self.latencias = dict(LATENCIAS_PADRAO)
+        if latencias:
+            desconhecidos = set(latencias) - set(SALTOS)
+            if desconhecidos:
+                raise ValueError(f"Saltos desconhecidos: {', '.join(sorted(desconhecidos))}. Válidos: {', '.join(SALTOS)}")
+            self.latencias.update(latencias)
+        self.rng = random.Random(seed)
+
+    async def _salto(self, nome):
+        atraso = self.latencias[nome].amostra(self.rng)
+        await asyncio.sleep(atraso) # sleep(0) ainda cede o loop para as outras autorizações
+
+    async def autorizar(self, estabelecimento, portador, valor):
+        """Autoriza uma compra percorrendo todos os saltos; retorna a Transacao."""
+        await self._salto("client_to_store")
+        transacao = Transacao(portador.id, estabelecimento.id, valor, tabela=estabelecimento.tabela,
+                              alocador=estabelecimento.alocador, numero_cartao_bin=portador.numero_cartao[:6])
+        estabelecimento.transacoes.append(transacao)
+
+        await self._salto("store_to_acquirer")
+        transacao.nsu = self.adquirente.alocador.proximo_nsu()
+        await self._salto("acquirer_to_flag")
+        await self._salto("flag_to_issuer")
+        await self._salto("issuer_processing")
+        status_emissor = self.bandeira.rotear_autorizacao(transacao, self.emissor)
+        await self._salto("issuer_to_flag")
+        await self._salto("flag_to_acquirer")
+        self.adquirente.registrar_resposta(transacao, status_emissor)
+        await self._salto("acquirer_to_store")
+        return transacao
+
+    async def executar_carga(self, estabelecimento, portadores, total_transacoes, valor=1.00, concorrencia=100):
+        """
+        Mantém `concorrencia` autorizações em voo até completar total_transacoes e mede a
+        latência ponta a ponta de cada uma. Retorna estatísticas com p50/p95/p99 em ms.
+        """
+        latencias = np.zeros(total_transacoes, dtype=np.float64)
+        aprovadas = 0
+        proxima = 0
+
+        async def trabalhador():
+            nonlocal aprovadas, proxima
+            while proxima < total_transacoes:
+                i = proxima
+                proxima += 1
+                inicio_txn = time.perf_counter()
+                transacao = await self.autorizar(estabelecimento, portadores[i % len(portadores)], valor)
+                latencias[i] = time.perf_counter() - inicio_txn
+                if transacao.status == StatusTransacao.APROVADA:
+                    aprovadas += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(min(concorrencia, total_transacoes))))
+        duracao = time.perf_counter() - inicio
+
+        p50, p95, p99 = (np.percentile(latencias, [50, 95, 99]) * 1000).tolist() if total_transacoes else (0.0, 0.0, 0.0)
+        estatisticas = {
+            "transacoes": total_transacoes,
+            "concorrencia": concorrencia,
+            "aprovadas": aprovadas,
+            "negadas": total_transacoes - aprovadas,
+            "duracao_s": duracao,
+            "tps": total_transacoes / duracao if duracao > 0 else float("inf"),
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+        }
+        logger.info(f"AsyncAuthorizationPipeline: {total_transacoes} autorizações, concorrência {concorrencia}: "
+                    f"{estatisticas['tps']:.0f} TPS, p50 {p50:.1f}ms, p95 {p95:.1f}ms, p99 {p99:.1f}ms.")
+        return estatisticas
+
+
+if __name__ == "__main__":
+    # python -m src.services.async_pipeline --transacoes 20000 --concorrencia 500 --escala-latencia 1.0
+    from src.services.simulation import PaymentSimulator
+
+    parser = argparse.ArgumentParser(description="Carga de autorizações assíncrona com latência de rede simulada.")
+    parser.add_argument("--transacoes", type=int, default=10000)
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[100])
+    parser.add_argument("--valor", type=float, default=1.00)
+    parser.add_argument("--escala-latencia", type=float, default=1.0, help="Multiplica a mediana de todos os saltos.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    latencias = {
+        salto: LatenciaLognormal(distribuicao.mediana_ms * args.escala_latencia, distribuicao.sigma)
+        for salto, distribuicao in LATENCIAS_PADRAO.items() if isinstance(distribuicao, LatenciaLognormal)
+    }
+    print(f"{'concorrência':>12} {'TPS':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for concorrencia in args.concorrencia:
+        simulator = PaymentSimulator(pacing="unpaced")
+        pipeline = AsyncAuthorizationPipeline(simulator.adquirente, simulator.bandeira, simulator.emissor, latencias, args.seed)
+        resultado = asyncio.run(pipeline.executar_carga(simulator.estab_1, (simulator.portador_1, simulator.portador_2),
+                                                        args.transacoes, args.valor, concorrencia))
+        print(f"{concorrencia:>12} {resultado['tps']:>10.0f} {resultado['p50_ms']:>8.1f} {resultado['p95_ms']:>8.1f} {resultado['p99_ms']:>8.1f}")
@@ -0,0 +1,203 @@
+# src/services/capture_batcher.py
+import time
+import queue
+import logging
+import threading
+from array import array
+from collections import deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MAXIMO_LOTE = 4096 # Transações por lote de captura
+IDADE_MAXIMA_LOTE_S = 1.0 # Idade da transação mais antiga que fecha o lote mesmo incompleto
+LOTES_EM_VOO = 4 # Lotes fechados aguardando a Bandeira antes de a adquirente bloquear
+
+_FIM = object()
+
+
+class LoteadorCaptura:
+    """
+    Captura contínua da adquirente: acumula as linhas aprovadas em um lote aberto e o
+    fecha quando atinge tamanho_maximo transações ou quando a mais antiga completa
+    idade_maxima_s. Os lotes fechados vão para uma fila limitada (lotes_em_voo)
+    consumida por uma thread que chama Bandeira.processar_captura_linhas; com a fila
+    cheia quem adiciona fica bloqueado até a Bandeira liberar espaço (backpressure),
+    então a memória entre janelas de liquidação fica limitada.
+
+    Os registros de captura no journal são gravados na thread de quem adiciona (o
+    journal não é thread-safe); chame drenar() antes de ler as capturadas da Bandeira.
+    """
+    def __init__(self, bandeira, tamanho_maximo=TAMANHO_MAXIMO_LOTE, idade_maxima_s=IDADE_MAXIMA_LOTE_S,
+                 lotes_em_voo=LOTES_EM_VOO, relogio=time.monotonic):
+        if tamanho_maximo < 1 or lotes_em_voo < 1:
+            raise ValueError("tamanho_maximo e lotes_em_voo precisam ser positivos.")
+        self.bandeira = bandeira
+        self.tamanho_maximo = tamanho_maximo
+        self.idade_maxima_s = idade_maxima_s
+        self.lotes_em_voo = lotes_em_voo
+        self.relogio = relogio
+        self._tabela = None
+        self._aberto = array("q")
+        self._aberto_desde = None
+        self._trava = threading.Lock() # Lote aberto: disputado por quem adiciona e pela thread (fechamento por idade)
+        self._ocioso = threading.Condition(self._trava)
+        self._fora_da_fila = 0 # Lotes fechados por idade na thread, processados sem passar pela fila
+        self._fila = queue.Queue(maxsize=lotes_em_voo)
+        self._processados = deque() # (tabela, linhas capturadas) a journalar na thread de quem adiciona
+        self._erro = None
+        # Estatísticas
+        self.lotes_por_motivo = {"tamanho": 0, "idade": 0, "drenagem": 0}
+        self.transacoes = 0
+        self.capturadas = 0
+        self.bloqueios = 0
+        self.tempo_bloqueado_s = 0.0
+        self._thread = threading.Thread(target=self._consumir, name="captura-continua", daemon=True)
+        self._thread.start()
+
+    # --- Lado da adquirente ---
+
+    def adicionar(self, transacao):
+        self.adicionar_linhas(transacao._tabela, (transacao._linha,))
+
+    def adicionar_linhas(self, tabela, linhas):
+        """Acrescenta linhas aprovadas ao lote aberto; fecha e enfileira os lotes que atingirem o limite."""
+        self._verificar_erro()
+        self._journalar_processados()
+        if not len(linhas):
+            return
+        fechados = []
+        with self._trava:
+            if self._tabela is None:
+                self._tabela = tabela
+            elif tabela is not self._tabela:
+                raise ValueError("Transação pertence a outra TabelaTransacoes.")
+            if not self._aberto:
+                self._aberto_desde = self.relogio()
+            if isinstance(linhas, tuple):
+                self._aberto.extend(linhas)
+            else:
+                self._aberto.frombytes(np.asarray(linhas, dtype=np.int64).tobytes())
+            self.transacoes += len(linhas)
+            while len(self._aberto) >= self.tamanho_maximo:
+                fechados.append(self._fechar(self.tamanho_maximo, "tamanho"))
+            if self._aberto and self.relogio() - self._aberto_desde >= self.idade_maxima_s:
+                fechados.append(self._fechar(len(self._aberto), "idade"))
+        for lote in fechados:
+            self._enfileirar(lote)
+
+    def drenar(self):
+        """Fecha o lote aberto e espera a Bandeira processar tudo o que está na fila."""
+        with self._trava:
+            lote = self._fechar(len(self._aberto), "drenagem") if self._aberto else None
+        if lote is not None:
+            self._enfileirar(lote)
+        with self._ocioso:
+            while self._fora_da_fila:
+                self._ocioso.wait()
+        self._fila.join()
+        self._journalar_processados()
+        self._verificar_erro()
+
+    def fechar(self):
+        """Drena e encerra a thread consumidora."""
+        try:
+            self.drenar()
+        finally:
+            self._fila.put(_FIM)
+            self._thread.join()
+            self._journalar_processados()
+        self._verificar_erro()
+
+    def _fechar(self, quantidade, motivo):
+        """Retira as `quantidade` primeiras linhas do lote aberto (chamado com a trava)."""
+        linhas = np.frombuffer(self._aberto, dtype=np.int64)[:quantidade].copy()
+        del self._aberto[:quantidade]
+        self._aberto_desde = self.relogio() if self._aberto else None
+        self.lotes_por_motivo[motivo] += 1
+        return linhas
+
+    def _enfileirar(self, linhas):
+        try:
+            self._fila.put_nowait(linhas)
+        except queue.Full:
+            # Bandeira atrasada: a adquirente espera uma vaga na fila
+            inicio = time.perf_counter()
+            self._fila.put(linhas)
+            self.bloqueios += 1
+            self.tempo_bloqueado_s += time.perf_counter() - inicio
+
+    def _journalar_processados(self):
+        while self._processados:
+            self.bandeira.journalar_captura(*self._processados.popleft())
+
+    def _verificar_erro(self):
+        if self._erro is not None:
+            raise RuntimeError("Falha na captura contínua da Bandeira.") from self._erro
+
+    # --- Lado da bandeira (thread consumidora) ---
+
+    def _consumir(self):
+        while True:
+            try:
+                lote = self._fila.get(timeout=self._espera_ate_vencer())
+            except queue.Empty:
+                lote = None
+            if lote is None:
+                self._processar_vencido()
+                continue
+            if lote is _FIM:
+                self._fila.task_done()
+                break
+            try:
+                self._processar(lote)
+            finally:
+                self._fila.task_done()
+        if self.bandeira.eventos is not None:
+            self.bandeira.eventos.flush()
+
+    def _processar_vencido(self):
+        """Nada chegou na fila: fecha aqui mesmo o lote aberto que venceu por idade (drenar() espera por ele)."""
+        with self._trava:
+            if not self._aberto or self.relogio() - self._aberto_desde < self.idade_maxima_s:
+                return
+            lote = self._fechar(len(self._aberto), "idade")
+            self._fora_da_fila += 1
+        try:
+            self._processar(lote)
+        finally:
+            with self._ocioso:
+                self._fora_da_fila -= 1
+                self._ocioso.notify_all()
+
+    def _espera_ate_vencer(self):
+        desde = self._aberto_desde
+        if desde is None:
+            return self.idade_maxima_s
+        return max(self.idade_maxima_s - (self.relogio() - desde), 0.001)
+
+    def _processar(self, linhas):
+        try:
+            capturadas = self.bandeira.processar_captura_linhas(self._tabela, linhas, registrar_journal=False)
+        except Exception as e:
+            logger.error(f"LoteadorCaptura: erro ao capturar lote de {len(linhas)} transações: {e}", exc_info=True)
+            self._erro = e
+            return
+        self.capturadas += len(capturadas)
+        self._processados.append((self._tabela, capturadas))
+        if self._fila.empty() and self.bandeira.eventos is not None:
+            self.bandeira.eventos.flush() # Publica os eventos desta thread sem esperar o próximo lote
+
+    def estatisticas(self):
+        return {
+            "transacoes": self.transacoes,
+            "capturadas": self.capturadas,
+            "lotes": sum(self.lotes_por_motivo.values()),
+            "lotes_por_motivo": dict(self.lotes_por_motivo),
+            "bloqueios": self.bloqueios,
+            "tempo_bloqueado_s": self.tempo_bloqueado_s,
+        }
+
+    def __repr__(self):
+        return (f"LoteadorCaptura({self.transacoes} transações, {sum(self.lotes_por_motivo.values())} lotes, "
+                f"{self.bloqueios} bloqueios)")
@@ -0,0 +1,259 @@
+# src/services/chargeback_lifecycle.py
+import time
+import logging
+import argparse
+import numpy as np
+
+from src.models.chargeback import (Chargeback, STATUS_CHARGEBACK, CODIGO_STATUS_CHARGEBACK, MATRIZ_TRANSICOES,
+                                   TransicaoInvalida)
+from src.models.chargeback_registry import STATUS_FINAIS
+
+logger = logging.getLogger(__name__)
+
+_C = CODIGO_STATUS_CHARGEBACK
+INICIADO = _C[Chargeback.STATUS_INICIADO]
+DOC_SOLICITADA = _C[Chargeback.STATUS_DOCUMENTACAO_SOLICITADA]
+DOC_ENVIADA = _C[Chargeback.STATUS_DOCUMENTACAO_ENVIADA]
+REAPRESENTADO = _C[Chargeback.STATUS_REAPRESENTADO]
+ARBITRAGEM = _C[Chargeback.STATUS_ARBITRAGEM]
+RESOLVIDO_PORTADOR = _C[Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR]
+RESOLVIDO_ESTABELECIMENTO = _C[Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO]
+CANCELADO = _C[Chargeback.STATUS_CANCELADO]
+
+FINAIS = np.array([RESOLVIDO_PORTADOR, RESOLVIDO_ESTABELECIMENTO, CANCELADO], dtype=np.uint8)
+
+# Regras do ciclo de vida: status -> (ticks no status antes de avançar, ((destino, probabilidade), ...)).
+# Um tick é um dia da simulação. A pendência sem resposta (ex.: documentação não enviada
+# no prazo) é o ramo de timeout da regra.
+REGRAS_PADRAO = {
+    Chargeback.STATUS_INICIADO: (2, (
+        (Chargeback.STATUS_DOCUMENTACAO_SOLICITADA, 0.70),
+        (Chargeback.STATUS_REAPRESENTADO, 0.05),
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, 0.20), # Estabelecimento aceita
+        (Chargeback.STATUS_CANCELADO, 0.05), # Portador desiste
+    )),
+    Chargeback.STATUS_DOCUMENTACAO_SOLICITADA: (10, (
+        (Chargeback.STATUS_DOCUMENTACAO_ENVIADA, 0.85),
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, 0.15), # Timeout: defesa não enviada
+    )),
+    Chargeback.STATUS_DOCUMENTACAO_ENVIADA: (3, (
+        (Chargeback.STATUS_REAPRESENTADO, 1.0),
+    )),
+    Chargeback.STATUS_REAPRESENTADO: (15, (
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO, 0.45),
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, 0.35),
+        (Chargeback.STATUS_ARBITRAGEM, 0.20),
+    )),
+    Chargeback.STATUS_ARBITRAGEM: (30, (
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_ESTABELECIMENTO, 0.5),
+        (Chargeback.STATUS_RESOLVIDO_FAVOR_PORTADOR, 0.5),
+    )),
+}
+
+
+def compilar_regras(regras):
+    """
+    Converte as regras em arrays por código de status (duração, destinos e probabilidades
+    acumuladas), validando cada destino contra a tabela de transições do Chargeback.
+    """
+    total = len(STATUS_CHARGEBACK)
+    duracoes = np.zeros(total, dtype=np.int64)
+    destinos = np.full((total, total), -1, dtype=np.int16)
+    acumuladas = np.ones((total, total), dtype=np.float64)
+    for status, (duracao, saidas) in regras.items():
+        origem = _C[status]
+        soma = sum(p for _, p in saidas)
+        if not np.isclose(soma, 1.0):
+            raise ValueError(f"Probabilidades de {status} somam {soma}, não 1.")
+        for i, (destino, _) in enumerate(saidas):
+            if not MATRIZ_TRANSICOES[origem, _C[destino]]:
+                raise TransicaoInvalida(f"Regra com transição inválida: {status} -> {destino}")
+            destinos[origem, i] = _C[destino]
+        acumuladas[origem, :len(saidas)] = np.cumsum([p for _, p in saidas])
+        acumuladas[origem, len(saidas) - 1] = 1.0 # Sem sobra de arredondamento além da última saída
+        duracoes[origem] = duracao
+    return duracoes, destinos, acumuladas
+
+
+class MotorCicloChargeback:
+    """
+    Ciclo de vida de chargebacks em lote: o estado de cada disputa é uma linha em colunas
+    NumPy (status, próximo tick, valor, transação/estabelecimento) e cada tick avança de uma
+    vez a coorte de todas as disputas vencidas em cada status, sorteando os destinos pela
+    tabela de regras. Toda transição é validada contra a tabela de transições do Chargeback.
+
+    Com um RegistroChargebacks em `registro`, abrir_do_registro traz para o motor as disputas
+    abertas do registro e cada transição delas é gravada de volta nele (e no journal, se
+    houver). Enquanto o motor acompanha uma disputa, só ele deve mudar o status dela.
+    """
+    def __init__(self, regras=None, seed=None, capacidade_inicial=1024, registro=None, journal=None):
+        self.regras = REGRAS_PADRAO if regras is None else regras
+        self._duracoes, self._destinos, self._acumuladas = compilar_regras(self.regras)
+        self.rng = np.random.default_rng(seed)
+        self.tick = 0
+        self._tamanho = 0
+        self._capacidade = max(capacidade_inicial, 1)
+        self.status = np.zeros(self._capacidade, dtype=np.uint8)
+        self.proximo_tick = np.zeros(self._capacidade, dtype=np.int64)
+        self.aberto_em = np.zeros(self._capacidade, dtype=np.int64)
+        self.resolvido_em = np.full(self._capacidade, -1, dtype=np.int64)
+        self.transacao = np.zeros(self._capacidade, dtype=np.int64) # Linha da transação original (ou índice externo)
+        self.estabelecimento = np.zeros(self._capacidade, dtype=np.int32)
+        self.valor_centavos = np.zeros(self._capacidade, dtype=np.int64)
+        # Contagem de transições [de, para], acumulada em todos os ticks
+        self.transicoes = np.zeros((len(STATUS_CHARGEBACK), len(STATUS_CHARGEBACK)), dtype=np.int64)
+        self.registro = registro
+        self.journal = journal
+        self._cb_por_linha = {} # Linha do motor -> cb_id, só das disputas vindas do registro
+        self._linha_por_cb = {}
+
+    _COLUNAS = ("status", "proximo_tick", "aberto_em", "resolvido_em", "transacao", "estabelecimento", "valor_centavos")
+
+    def _reservar(self, quantidade):
+        necessario = self._tamanho + quantidade
+        if necessario <= self._capacidade:
+            return
+        capacidade = self._capacidade
+        while capacidade < necessario:
+            capacidade *= 2
+        for nome in self._COLUNAS:
+            antiga = getattr(self, nome)
+            nova = np.full(capacidade, -1 if nome == "resolvido_em" else 0, dtype=antiga.dtype)
+            nova[:self._tamanho] = antiga[:self._tamanho]
+            setattr(self, nome, nova)
+        self._capacidade = capacidade
+
+    def abrir_lote(self, transacoes, valores_centavos, estabelecimentos=0, status=INICIADO):
+        """Abre uma coorte de disputas (por padrão em INICIADO) no tick atual; retorna o range de linhas."""
+        quantidade = len(valores_centavos)
+        self._reservar(quantidade)
+        inicio, fim = self._tamanho, self._tamanho + quantidade
+        self.status[inicio:fim] = status
+        self.proximo_tick[inicio:fim] = self.tick + self._duracoes[status]
+        self.aberto_em[inicio:fim] = self.tick
+        self.transacao[inicio:fim] = transacoes
+        self.estabelecimento[inicio:fim] = estabelecimentos
+        self.valor_centavos[inicio:fim] = valores_centavos
+        self._tamanho = fim
+        return range(inicio, fim)
+
+    def abrir_do_registro(self, tabela=None):
+        """
+        Abre, no status em que estão, os chargebacks abertos do registro que o motor ainda não
+        acompanha (em ordem de cb_id). Com a tabela das transações, guarda a linha da transação
+        original e o estabelecimento. Retorna o range de linhas abertas.
+        """
+        novos = sorted((chargeback for status in STATUS_CHARGEBACK if status not in STATUS_FINAIS
+                        for chargeback in self.registro.por_status(status) if chargeback.id not in self._linha_por_cb),
+                       key=lambda chargeback: chargeback.id)
+        transacoes = np.full(len(novos), -1, dtype=np.int64)
+        estabelecimentos = np.zeros(len(novos), dtype=np.int32)
+        if tabela is not None and novos:
+            transacoes[:] = [tabela.localizar(chargeback.transacao_original_id) for chargeback in novos]
+            encontradas = transacoes >= 0
+            estabelecimentos[encontradas] = tabela.estabelecimento[transacoes[encontradas]]
+        linhas = self.abrir_lote(transacoes, [round(chargeback.valor * 100) for chargeback in novos], estabelecimentos,
+                                 np.array([_C[chargeback.status] for chargeback in novos], dtype=np.uint8))
+        for linha, chargeback in zip(linhas, novos):
+            self._cb_por_linha[linha] = chargeback.id
+            self._linha_por_cb[chargeback.id] = linha
+        return linhas
+
+    def aplicar_transicoes(self, linhas, destinos):
+        """Muda o status de várias disputas de uma vez; qualquer transição fora da tabela gera TransicaoInvalida."""
+        linhas = np.asarray(linhas, dtype=np.int64)
+        destinos = np.asarray(destinos, dtype=np.uint8)
+        origens = self.status[linhas]
+        invalidas = ~MATRIZ_TRANSICOES[origens, destinos]
+        if invalidas.any():
+            i = int(np.flatnonzero(invalidas)[0])
+            raise TransicaoInvalida(f"{int(invalidas.sum())} transições inválidas no lote, ex.: "
+                                    f"{STATUS_CHARGEBACK[origens[i]]} -> {STATUS_CHARGEBACK[destinos[i]]} (linha {linhas[i]})")
+        np.add.at(self.transicoes, (origens, destinos), 1)
+        self.status[linhas] = destinos
+        self.proximo_tick[linhas] = self.tick + self._duracoes[destinos]
+        finais = np.isin(destinos, FINAIS)
+        self.resolvido_em[linhas[finais]] = self.tick
+        if self._cb_por_linha:
+            self._gravar_no_registro(linhas, destinos)
+
+    def _gravar_no_registro(self, linhas, destinos):
+        for linha, destino in zip(linhas.tolist(), destinos.tolist()):
+            cb_id = self._cb_por_linha.get(linha)
+            if cb_id is not None:
+                status = STATUS_CHARGEBACK[destino]
+                chargeback = self.registro.atualizar_status(cb_id, status)
+                if self.journal is not None:
+                    self.journal.chargeback(cb_id, chargeback.transacao_original_id, status)
+
+    def avancar(self, ticks=1):
+        """Avança o relógio e, a cada tick, move todas as disputas abertas cujo prazo no status venceu."""
+        movidas = 0
+        for _ in range(ticks):
+            self.tick += 1
+            n = self._tamanho
+            vencidas = np.flatnonzero((self.proximo_tick[:n] <= self.tick) & (self.resolvido_em[:n] < 0))
+            if len(vencidas):
+                origens = self.status[vencidas]
+                sorteio = self.rng.random(len(vencidas))
+                # Destino = primeira saída cuja probabilidade acumulada passa o sorteio
+                saida = (sorteio[:, None] >= self._acumuladas[origens]).sum(axis=1)
+                self.aplicar_transicoes(vencidas, self._destinos[origens, saida])
+                movidas += len(vencidas)
+        return movidas
+
+    def contagem_por_status(self):
+        contagem = np.bincount(self.status[:self._tamanho], minlength=len(STATUS_CHARGEBACK))
+        return {status: int(contagem[codigo]) for codigo, status in enumerate(STATUS_CHARGEBACK) if contagem[codigo]}
+
+    def abertos(self):
+        return int((self.resolvido_em[:self._tamanho] < 0).sum())
+
+    def __len__(self):
+        return self._tamanho
+
+    def __repr__(self):
+        return f"MotorCicloChargeback(tick {self.tick}, {self._tamanho} disputas, {self.abertos()} abertas)"
+
+
+def simular_disputas(total_transacoes, taxa_disputa=0.0075, dias_volume=30, dias_totais=120,
+                     total_estabelecimentos=100, seed=42, motor=None):
+    """
+    Distribui total_transacoes por dias_volume dias, abre por dia uma coorte binomial de
+    disputas (taxa_disputa do volume do dia) e roda o ciclo até dias_totais. Retorna o motor.
+    """
+    motor = motor or MotorCicloChargeback(seed=seed)
+    rng = np.random.default_rng([seed, 1])
+    por_dia = np.full(dias_volume, total_transacoes // dias_volume, dtype=np.int64)
+    por_dia[:total_transacoes % dias_volume] += 1
+    primeira_transacao = 0
+    for dia in range(dias_totais):
+        if dia < dias_volume:
+            disputas = rng.binomial(por_dia[dia], taxa_disputa)
+            transacoes = np.sort(rng.choice(por_dia[dia], disputas, replace=False)) + primeira_transacao
+            valores = np.maximum(np.round(rng.lognormal(np.log(15000), 0.9, disputas)), 100).astype(np.int64)
+            motor.abrir_lote(transacoes, valores, rng.integers(0, total_estabelecimentos, disputas))
+            primeira_transacao += por_dia[dia]
+        motor.avancar()
+    return motor
+
+
+if __name__ == "__main__":
+    # python -m src.services.chargeback_lifecycle --transacoes 10000000 --taxa 0.0075 --dias 120
+    parser = argparse.ArgumentParser(description="Ciclo de vida de chargebacks em lote (coortes por dia).")
+    parser.add_argument("--transacoes", type=int, default=1_000_000)
+    parser.add_argument("--taxa", type=float, default=0.0075, help="Fração do volume que vira disputa.")
+    parser.add_argument("--dias-volume", type=int, default=30)
+    parser.add_argument("--dias", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    inicio = time.perf_counter()
+    motor = simular_disputas(args.transacoes, args.taxa, args.dias_volume, args.dias, seed=args.seed)
+    duracao = time.perf_counter() - inicio
+    print(f"{motor} em {duracao:.3f}s")
+    for status, quantidade in motor.contagem_por_status().items():
+        print(f"  {status:<24} {quantidade:>10}")
+    perdidos = motor.status[:len(motor)] == RESOLVIDO_PORTADOR
+    print(f"Valor estornado aos portadores: R$ {motor.valor_centavos[:len(motor)][perdidos].sum() / 100:,.2f}")
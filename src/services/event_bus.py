@@ -0,0 +1,208 @@
+# src/services/event_bus.py
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Níveis iguais aos do logging: passos por transação em DEBUG, o resto em INFO
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+
+# Campos do evento. Um evento é uma tupla pequena e a mensagem só é formatada por quem
+# consome: (nível, origem, template '%', args, cor, animação).
+# A animação é uma tupla constante (descrição, entidades ativas, flow_path); '%s' na
+# descrição é trocado pela origem.
+NIVEL, ORIGEM, TEMPLATE, ARGS, COR, ANIMACAO = range(6)
+
+
+def formatar_mensagem(evento):
+    """Texto do evento como era enviado ao log_callback: '[origem]: mensagem'."""
+    texto = evento[TEMPLATE] % evento[ARGS] if evento[ARGS] else evento[TEMPLATE]
+    return f"[{evento[ORIGEM]}]: {texto}" if evento[ORIGEM] else texto
+
+
+def expandir_animacao(animacao, origem=None):
+    """Converte a tupla de animação no dict que o app.py desenha (ou None)."""
+    if animacao is None:
+        return None
+    descricao, entidades_ativas, flow_path = animacao
+    if origem and "%s" in descricao:
+        descricao = descricao % origem
+    return {"description": descricao, "active_entities": list(entidades_ativas), "flow_path": flow_path}
+
+
+class EventBus:
+    """
+    Barramento de eventos de log/animação. Os produtores acumulam eventos em um lote por
+    thread e publicam o lote inteiro de uma vez em um ring buffer de capacidade fixa; os
+    consumidores (UI, arquivo) drenam o buffer em bloco. Eventos abaixo de `nivel` são
+    descartados na origem, antes de qualquer formatação.
+
+    Se o buffer encher sem sinks registrados (ex.: UI lenta), os eventos mais antigos são
+    sobrescritos e contados em `descartados`; com sinks, o produtor despacha antes de sobrescrever.
+    """
+    def __init__(self, capacidade=65536, nivel=INFO, tamanho_lote=256, idade_maxima_lote=0.05):
+        self.capacidade = capacidade
+        self.nivel = nivel
+        self.tamanho_lote = tamanho_lote
+        self.idade_maxima_lote = idade_maxima_lote # Segundos até um lote parcial ser publicado
+        self.descartados = 0
+        self.sinks = []
+        self._buffer = [None] * capacidade
+        self._escritos = 0 # Total de eventos já gravados no buffer
+        self._lidos = 0 # Total de eventos já drenados (ou sobrescritos)
+        self._lock = threading.Lock()
+        self._lock_despacho = threading.Lock()
+        self._local = threading.local()
+
+    def habilitado(self, nivel):
+        return nivel >= self.nivel
+
+    def _lote(self):
+        local = self._local
+        lote = getattr(local, "lote", None)
+        if lote is None:
+            lote = local.lote = []
+        if not lote:
+            local.inicio = time.monotonic()
+        return lote
+
+    def publicar(self, evento):
+        """Acrescenta o evento ao lote da thread; o lote vai para o buffer quando enche ou envelhece."""
+        lote = self._lote()
+        lote.append(evento)
+        if len(lote) >= self.tamanho_lote or time.monotonic() - self._local.inicio >= self.idade_maxima_lote:
+            self.flush()
+
+    def publicar_lote(self, eventos):
+        self._lote().extend(eventos)
+        self.flush()
+
+    def flush(self):
+        """Publica no buffer o lote pendente da thread atual."""
+        lote = getattr(self._local, "lote", None)
+        if not lote:
+            return
+        self._local.lote = []
+        if self.sinks and self._livres() < len(lote):
+            self.despachar()
+        self._gravar(lote)
+
+    def _livres(self):
+        return self.capacidade - (self._escritos - self._lidos)
+
+    def _gravar(self, lote):
+        capacidade = self.capacidade
+        if len(lote) > capacidade:
+            self.descartados += len(lote) - capacidade
+            lote = lote[-capacidade:]
+        with self._lock:
+            excedente = len(lote) - (capacidade - (self._escritos - self._lidos))
+            if excedente > 0:
+                self._lidos += excedente
+                self.descartados += excedente
+            inicio = self._escritos % capacidade
+            primeira_parte = min(len(lote), capacidade - inicio)
+            self._buffer[inicio:inicio + primeira_parte] = lote[:primeira_parte]
+            if primeira_parte < len(lote):
+                self._buffer[:len(lote) - primeira_parte] = lote[primeira_parte:]
+            self._escritos += len(lote)
+
+    def drenar(self, maximo=None):
+        """Retira do buffer (em ordem de publicação) até `maximo` eventos de uma vez."""
+        with self._lock:
+            pendentes = self._escritos - self._lidos
+            quantidade = pendentes if maximo is None else min(pendentes, maximo)
+            if quantidade <= 0:
+                return []
+            inicio = self._lidos % self.capacidade
+            fim = inicio + quantidade
+            if fim <= self.capacidade:
+                eventos = self._buffer[inicio:fim]
+            else:
+                eventos = self._buffer[inicio:] + self._buffer[:fim - self.capacidade]
+            self._lidos += quantidade
+        return eventos
+
+    def __len__(self):
+        return self._escritos - self._lidos
+
+    def adicionar_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def despachar(self):
+        """Drena o buffer e entrega o bloco a todos os sinks registrados. Retorna quantos eventos saíram."""
+        with self._lock_despacho:
+            eventos = self.drenar()
+            if eventos:
+                for sink in self.sinks:
+                    sink.consumir(eventos)
+            return len(eventos)
+
+    def fechar(self):
+        """Publica o lote pendente da thread atual, despacha tudo e fecha os sinks."""
+        self.flush()
+        self.despachar()
+        for sink in self.sinks:
+            fechar = getattr(sink, "fechar", None)
+            if fechar:
+                fechar()
+
+    def __repr__(self):
+        return f"EventBus({len(self)}/{self.capacidade} eventos, nível {logging.getLevelName(self.nivel)}, {self.descartados} descartados)"
+
+
+class SinkArquivo:
+    """Grava os eventos como texto, uma linha por evento, com um único write por bloco."""
+    def __init__(self, caminho, modo="a"):
+        self.caminho = caminho
+        self._arquivo = open(caminho, modo, encoding="utf-8")
+
+    def consumir(self, eventos):
+        self._arquivo.write("".join([formatar_mensagem(evento) + "\n" for evento in eventos]))
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class SinkCallback:
+    """Entrega cada evento a um log_callback antigo (mensagem, cor, animation_data)."""
+    def __init__(self, callback):
+        self.callback = callback
+
+    def consumir(self, eventos):
+        callback = self.callback
+        for evento in eventos:
+            callback(formatar_mensagem(evento), evento[COR], expandir_animacao(evento[ANIMACAO], evento[ORIGEM]))
+
+
+class PublicadorEventos:
+    """
+    Mixin de quem emite logs/animações. Com um EventBus em `eventos`, publica tuplas
+    (filtradas por nível antes de qualquer formatação); sem bus, cai no log_callback
+    antigo, formatando na hora; sem nenhum dos dois, não faz nada.
+    """
+    nome = None # Origem das mensagens ('[nome]: ...'); None = sem prefixo
+    eventos = None
+    log_callback = None
+    pacing = None
+
+    def _pausa(self, segundos):
+        """Pausa entre passos; se o pacing dorme, publica antes o lote pendente para a UI acompanhar."""
+        if self.eventos is not None and getattr(self.pacing, "dorme", True):
+            self.eventos.flush()
+        self.pacing.pausa(segundos)
+
+    def _evento(self, template, *args, cor="black", animacao=None, nivel=INFO):
+        self._publicar(self.nome, template, args, cor, animacao, nivel)
+
+    def _publicar(self, origem, template, args, cor, animacao, nivel):
+        eventos = self.eventos
+        if eventos is not None:
+            if nivel >= eventos.nivel:
+                eventos.publicar((nivel, origem, template, args, cor, animacao))
+        elif self.log_callback is not None:
+            evento = (nivel, origem, template, args, cor, animacao)
+            self.log_callback(formatar_mensagem(evento), cor, expandir_animacao(animacao, origem))
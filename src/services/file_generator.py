@@ -4,146 +4,229 @@ import os
 import json
 import csv
 import random
+from itertools import chain, islice, repeat
+import numpy as np
+from src.models.clock import segundos_locais
+from src.services.layouts import LAYOUT_CAPTURA, LAYOUT_LIQUIDACAO_ADQ, LAYOUT_LIQUIDACAO_EMISSOR, LAYOUT_CNAB_PAGAMENTO, LAYOUT_CNAB_PAGAMENTO_CONSOLIDADO
+from src.services.xml_writer import EscritorXML, TAMANHO_BUFFER_PADRAO
 
 # Assumindo que Transacao está em src/models/transaction.py
-# Não precisamos dela aqui, pois as funções receberão listas de transações já prontas.
-
-def generate_capture_file(transactions, output_dir):
-    data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = os.path.join(output_dir, f"ADQUIRENTE_CAPTURAS_BANDEIRA_{data_arquivo}.txt")
-
-    capturas_data_linhas = []
+# Não precisamos dela aqui, pois as funções recebem transações já prontas. Qualquer
+# iterável serve (lista ou gerador): as linhas são produzidas e gravadas em fluxo.
+
+# Quantos registros são codificados por vez: a memória fica limitada a um buffer
+# pré-alocado de um chunk, independente do tamanho do arquivo.
+TAMANHO_CHUNK_PADRAO = 8192
+
+def _write_chunked(filename, layout, registros, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """
+    Consome um iterador de registros (tuplas na ordem do layout) e grava em blocos de
+    tamanho_chunk registros, reaproveitando o mesmo bytearray. O arquivo só é criado se
+    houver ao menos um registro; retorna o nome do arquivo ou None.
+    """
+    registros = iter(registros)
+    chunk = list(islice(registros, tamanho_chunk))
+    if not chunk:
+        return None
+    buffer = bytearray(tamanho_chunk * layout.tamanho)
+    view = memoryview(buffer)
+    with open(filename, 'wb') as f:
+        while chunk:
+            f.write(view[:layout.encode_into(buffer, 0, chunk)])
+            chunk = list(islice(registros, tamanho_chunk))
+    return filename
+
+def iter_capture_records(transactions):
     for transacao in transactions:
         if transacao.status == "APROVADA_ADQUIRENTE": # Apenas transações que passaram pela autorização
-            # Adapte o layout para ser posicional (ex: TipoReg(2) | ID_Transacao(10) | ...)
-            tipo_reg = "01"
-            id_transacao_str = transacao.id.ljust(10)
-            valor_str = str(int(transacao.valor * 100)).zfill(10)
-            nsu_str = (transacao.nsu or "00000000").ljust(8)
-            cod_auth_str = (transacao.codigo_autorizacao or "0000").ljust(4)
-            bin_str = transacao.numero_cartao_bin.ljust(6)
-            linha = f"{tipo_reg}{id_transacao_str}{valor_str}{nsu_str}{cod_auth_str}{bin_str}\n"
-            capturas_data_linhas.append(linha)
             transacao.status = "APROVADA_CAPTURA" # Atualiza status para simulação
+            # Layout posicional "captura_01" (ver src/services/layouts.py)
+            yield (transacao.id, int(transacao.valor * 100), transacao.nsu or "00000000",
+                   transacao.codigo_autorizacao or "0000", transacao.numero_cartao_bin)
 
-    if capturas_data_linhas:
-        with open(filename, 'w') as f:
-            f.writelines(capturas_data_linhas)
-        return filename
-    return None
-
-def generate_liquidation_file_adq(transactions, output_dir):
+def generate_capture_file(transactions, output_dir, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
     data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_ADQ_{data_arquivo}.txt")
+    filename = os.path.join(output_dir, f"ADQUIRENTE_CAPTURAS_BANDEIRA_{data_arquivo}.txt")
+    return _write_chunked(filename, LAYOUT_CAPTURA, iter_capture_records(transactions), tamanho_chunk)
 
-    registros_liquidacao = []
+def iter_liquidation_adq_records(transactions):
     for transacao in transactions:
         if transacao.status == "APROVADA_CAPTURA": # Apenas transações já capturadas
-            valor_str = str(int(transacao.valor * 100)).zfill(10)
-            codigo_auth_str = (transacao.codigo_autorizacao or "0000").ljust(4)
-            nsu_str = (transacao.nsu or "00000000").ljust(8)
-            status_liq_str = "LIQOK".ljust(10)
-            registro = f"{transacao.id.ljust(10)}{valor_str}{codigo_auth_str}{nsu_str}{status_liq_str}\n"
-            registros_liquidacao.append(registro)
             transacao.status = "LIQUIDADA_ADQUIRENTE" # Atualiza status para simulação
+            yield (transacao.id, int(transacao.valor * 100), transacao.codigo_autorizacao or "0000",
+                   transacao.nsu or "00000000", "LIQOK")
 
-    if registros_liquidacao:
-        with open(filename, 'w') as f:
-            f.writelines(registros_liquidacao)
-        return filename
-    return None
-
-def generate_liquidation_file_emissor(transactions, output_dir):
+def generate_liquidation_file_adq(transactions, output_dir, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
     data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_EMISSOR_{data_arquivo}.txt")
+    filename = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_ADQ_{data_arquivo}.txt")
+    return _write_chunked(filename, LAYOUT_LIQUIDACAO_ADQ, iter_liquidation_adq_records(transactions), tamanho_chunk)
 
-    registros_liquidacao = []
+def iter_liquidation_emissor_records(transactions):
     for transacao in transactions:
         if transacao.status == "APROVADA_EMISSOR": # Apenas transações aprovadas pelo emissor
-            valor_str = str(int(transacao.valor * 100)).zfill(10)
-            bin_str = transacao.numero_cartao_bin.ljust(6)
-            codigo_auth_str = (transacao.codigo_autorizacao or "0000").ljust(4)
-            data_hora_str = transacao.data_hora.strftime("%Y%m%d%H%M%S")
-            status_fatura_str = "FATURAR".ljust(10)
-            registro = f"{transacao.id.ljust(10)}{valor_str}{bin_str}{codigo_auth_str}{data_hora_str}{status_fatura_str}\n"
-            registros_liquidacao.append(registro)
             transacao.status = "LIQUIDADA_EMISSOR" # Atualiza status para simulação
+            yield (transacao.id, int(transacao.valor * 100), transacao.numero_cartao_bin,
+                   transacao.codigo_autorizacao or "0000", transacao.data_hora.strftime("%Y%m%d%H%M%S"), "FATURAR")
 
-    if registros_liquidacao:
-        with open(filename, 'w') as f:
-            f.writelines(registros_liquidacao)
-        return filename
-    return None
-
-def generate_payment_cnab_file(transactions, output_dir):
+def generate_liquidation_file_emissor(transactions, output_dir, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
     data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = os.path.join(output_dir, f"ADQUIRENTE_PAGAMENTO_CNAB_{data_arquivo}.txt")
+    filename = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_EMISSOR_{data_arquivo}.txt")
+    return _write_chunked(filename, LAYOUT_LIQUIDACAO_EMISSOR, iter_liquidation_emissor_records(transactions), tamanho_chunk)
 
-    pagamentos_data_linhas = []
+def iter_payment_cnab_records(transactions):
+    banco_estab = 1 # Ex: Banco do Brasil
+    agencia_estab = 1234
+    conta_estab = 1
     for t in transactions:
         if t.status == "LIQUIDADA_ADQUIRENTE":
             valor_liquido = t.valor * 0.98 
-            tipo_reg = "P" # Pagamento
-            banco_estab = "001" # Ex: Banco do Brasil
-            agencia_estab = "1234"
-            conta_estab = "00000001"
-            valor_liquido_str = str(int(valor_liquido * 100)).zfill(10)
-            id_transacao_str = t.id.ljust(10)
-            linha = f"{tipo_reg}{banco_estab}{agencia_estab}{conta_estab}{valor_liquido_str}{id_transacao_str}\n"
-            pagamentos_data_linhas.append(linha)
-
-    if pagamentos_data_linhas:
-        with open(filename, 'w') as f:
-            f.writelines(pagamentos_data_linhas)
-        return filename
-    return None
-
-def generate_faturamento_3040_file(transactions, output_dir):
-    data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = os.path.join(output_dir, f"EMISSOR_FATURAMENTO_3040_SIMULADO_{data_arquivo}.xml")
+            yield (banco_estab, agencia_estab, conta_estab, int(valor_liquido * 100), t.id)
 
-    faturamento_xml_content = ['<FaturamentoReport>\n']
+def generate_payment_cnab_file(transactions, output_dir, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = os.path.join(output_dir, f"ADQUIRENTE_PAGAMENTO_CNAB_{data_arquivo}.txt")
+    return _write_chunked(filename, LAYOUT_CNAB_PAGAMENTO, iter_payment_cnab_records(transactions), tamanho_chunk)
+
+def _colunas_texto(tabela, coluna, linhas, padrao):
+    valores = getattr(tabela, coluna)[linhas]
+    return np.where(valores == b"", padrao, valores).astype("U").tolist()
+
+def _data_hora_local(timestamps_ns):
+    """'%Y%m%d%H%M%S' (horário local) de um array de ns, vetorizado."""
+    if not len(timestamps_ns):
+        return []
+    segundos = segundos_locais(timestamps_ns).astype("datetime64[s]")
+    texto = np.datetime_as_string(segundos, unit="s") # AAAA-MM-DDTHH:MM:SS
+    for separador in ("-", ":", "T"):
+        texto = np.char.replace(texto, separador, "")
+    return texto.tolist()
+
+def iter_table_liquidation_adq_records(tabela, linhas, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """Registros "liquidacao_adq" direto das colunas da TabelaTransacoes, um chunk por vez."""
+    for inicio in range(0, len(linhas), tamanho_chunk):
+        chunk = linhas[inicio:inicio + tamanho_chunk]
+        yield from zip(
+            tabela.ids[chunk].astype("U").tolist(),
+            tabela.valor_centavos[chunk].tolist(),
+            _colunas_texto(tabela, "codigo_autorizacao", chunk, b"0000"),
+            _colunas_texto(tabela, "nsu", chunk, b"00000000"),
+            repeat("LIQOK"),
+        )
+
+def iter_table_liquidation_emissor_records(tabela, linhas, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """Registros "liquidacao_emissor" direto das colunas da TabelaTransacoes, um chunk por vez."""
+    for inicio in range(0, len(linhas), tamanho_chunk):
+        chunk = linhas[inicio:inicio + tamanho_chunk]
+        yield from zip(
+            tabela.ids[chunk].astype("U").tolist(),
+            tabela.valor_centavos[chunk].tolist(),
+            tabela.bin[chunk].astype("U").tolist(),
+            _colunas_texto(tabela, "codigo_autorizacao", chunk, b"0000"),
+            _data_hora_local(tabela.timestamp_ns[chunk]),
+            repeat("FATURAR"),
+        )
+
+def generate_liquidation_files_from_table(tabela, linhas, output_dir, data_arquivo=None, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """
+    Gera os arquivos de liquidação da Bandeira (para Adquirente e Emissor) a partir das
+    linhas capturadas da TabelaTransacoes. Retorna (arquivo_adq, arquivo_emissor); cada
+    um é None se não houver registros.
+    """
+    data_arquivo = data_arquivo or datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    adq_file = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_ADQ_{data_arquivo}.txt")
+    emissor_file = os.path.join(output_dir, f"BANDEIRA_LIQUIDACAO_EMISSOR_{data_arquivo}.txt")
+    return (
+        _write_chunked(adq_file, LAYOUT_LIQUIDACAO_ADQ, iter_table_liquidation_adq_records(tabela, linhas, tamanho_chunk), tamanho_chunk),
+        _write_chunked(emissor_file, LAYOUT_LIQUIDACAO_EMISSOR, iter_table_liquidation_emissor_records(tabela, linhas, tamanho_chunk), tamanho_chunk),
+    )
+
+# Tags do faturamento 3040: atributos e campos de cada <Transacao>, na ordem dos registros
+_FATURAMENTO_3040_ATRIBUTOS = ("id",)
+_FATURAMENTO_3040_CAMPOS = ("PortadorID", "NumeroCartaoBIN", "ValorCompra", "DataHoraCompra",
+                            "CodigoAutorizacao", "NSUAdquirente", "StatusFaturamento")
+
+def iter_faturamento_3040_records(transactions):
     for t in transactions:
         if t.status == "LIQUIDADA_EMISSOR":
-            faturamento_xml_content.append(f'  <Transacao id="{t.id}">\n')
-            faturamento_xml_content.append(f'    <PortadorID>{t.id_portador}</PortadorID>\n')
-            faturamento_xml_content.append(f'    <NumeroCartaoBIN>{t.numero_cartao_bin}</NumeroCartaoBIN>\n')
-            faturamento_xml_content.append(f'    <ValorCompra>{t.valor:.2f}</ValorCompra>\n')
-            faturamento_xml_content.append(f'    <DataHoraCompra>{t.data_hora.isoformat()}</DataHoraCompra>\n')
-            faturamento_xml_content.append(f'    <CodigoAutorizacao>{t.codigo_autorizacao}</CodigoAutorizacao>\n')
-            faturamento_xml_content.append(f'    <NSUAdquirente>{t.nsu}</NSUAdquirente>\n')
-            faturamento_xml_content.append(f'    <StatusFaturamento>FATURADO</StatusFaturamento>\n')
-            faturamento_xml_content.append(f'  </Transacao>\n')
-    faturamento_xml_content.append('</FaturamentoReport>\n')
-
-    if len(faturamento_xml_content) > 2:
-        with open(filename, 'w') as f:
-            f.writelines(faturamento_xml_content)
-        return filename
-    return None
+            yield (t.id, t.id_portador, t.numero_cartao_bin, f"{t.valor:.2f}", t.data_hora.isoformat(),
+                   t.codigo_autorizacao, t.nsu, "FATURADO")
+
+def write_faturamento_3040_file(registros, filename, compactar=False, tamanho_buffer=TAMANHO_BUFFER_PADRAO):
+    """
+    Grava o XML de faturamento consumindo um iterador de registros em fluxo (memória
+    constante). O arquivo só é criado se houver ao menos um registro; retorna o nome ou None.
+    """
+    registros = iter(registros)
+    primeiro = next(registros, None)
+    if primeiro is None:
+        return None
+    with EscritorXML(filename, compactar, tamanho_buffer) as xml:
+        xml.iniciar("FaturamentoReport")
+        xml.escrever_registros("Transacao", _FATURAMENTO_3040_ATRIBUTOS, _FATURAMENTO_3040_CAMPOS,
+                               chain((primeiro,), registros))
+    return filename
+
+def generate_faturamento_3040_file(transactions, output_dir, compactar=False):
+    data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = os.path.join(output_dir, f"EMISSOR_FATURAMENTO_3040_SIMULADO_{data_arquivo}.xml" + (".gz" if compactar else ""))
+    return write_faturamento_3040_file(iter_faturamento_3040_records(transactions), filename, compactar)
+
+def iter_table_payment_cnab_records(tabela, linhas, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """Registros "cnab_p" (valor líquido de 2% de MDR, em centavos) direto das colunas da tabela."""
+    banco_estab, agencia_estab, conta_estab = 1, 1234, 1
+    for inicio in range(0, len(linhas), tamanho_chunk):
+        chunk = linhas[inicio:inicio + tamanho_chunk]
+        yield from zip(repeat(banco_estab), repeat(agencia_estab), repeat(conta_estab),
+                       (tabela.valor_centavos[chunk] * 98 // 100).tolist(), tabela.ids[chunk].astype("U").tolist())
+
+def write_payment_cnab_file_from_table(tabela, linhas, filename, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    return _write_chunked(filename, LAYOUT_CNAB_PAGAMENTO, iter_table_payment_cnab_records(tabela, linhas, tamanho_chunk), tamanho_chunk)
+
+def write_consolidated_payment_cnab_file(instrucoes, filename, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """Registros "cnab_c": uma instrução de pagamento por conta (tuplas de ResultadoLiquidacao.instrucoes_pagamento)."""
+    return _write_chunked(filename, LAYOUT_CNAB_PAGAMENTO_CONSOLIDADO, instrucoes, tamanho_chunk)
+
+def iter_table_faturamento_3040_records(tabela, linhas, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """Registros do faturamento 3040 direto das colunas da tabela, um chunk de colunas por vez."""
+    for inicio in range(0, len(linhas), tamanho_chunk):
+        chunk = linhas[inicio:inicio + tamanho_chunk]
+        yield from zip(
+            tabela.ids[chunk].astype("U").tolist(), map(tabela.portadores.valor, tabela.portador[chunk].tolist()),
+            tabela.bin[chunk].astype("U").tolist(),
+            (f"{centavos // 100}.{centavos % 100:02d}" for centavos in tabela.valor_centavos[chunk].tolist()),
+            _data_hora_iso(tabela.timestamp_ns[chunk]), tabela.codigo_autorizacao[chunk].astype("U").tolist(),
+            tabela.nsu[chunk].astype("U").tolist(), repeat("FATURADO"))
+
+def write_faturamento_3040_file_from_table(tabela, linhas, filename, tamanho_chunk=TAMANHO_CHUNK_PADRAO, compactar=False):
+    """Mesmo XML de generate_faturamento_3040_file, escrito em fluxo a partir das colunas da tabela."""
+    return write_faturamento_3040_file(iter_table_faturamento_3040_records(tabela, linhas, tamanho_chunk), filename, compactar)
+
+def _data_hora_iso(timestamps_ns):
+    """Horário local ISO (AAAA-MM-DDTHH:MM:SS.ffffff) de um array de ns, vetorizado."""
+    if not len(timestamps_ns):
+        return []
+    microssegundos = segundos_locais(timestamps_ns) * 1_000_000 + timestamps_ns // 1000 % 1_000_000
+    return np.datetime_as_string(microssegundos.astype("datetime64[us]"), unit="us").tolist()
 
 def generate_regulatory_file(entity_name, transactions, entity_type, cadoc_type, output_dir):
     data_arquivo = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     filename = os.path.join(output_dir, f"{entity_name}_{cadoc_type}_{data_arquivo}.csv")
 
-    registros = []
-    for t in transactions:
-        registros.append({
-            "id_transacao": t.id,
-            "data_hora": t.data_hora.isoformat(),
-            "valor": t.valor,
-            "status_final": t.status,
-            "tipo_cartao": t.tipo_cartao,
-            "nsu_adquirente": t.nsu if hasattr(t, 'nsu') else '',
-            "codigo_autorizacao": t.codigo_autorizacao if hasattr(t, 'codigo_autorizacao') else '',
-            "entidade_responsavel": entity_type,
-            "data_referencia_bcb": datetime.date.today().strftime("%Y-%m")
-        })
-
-    if registros:
-        with open(filename, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=registros[0].keys())
-            writer.writeheader()
-            writer.writerows(registros)
-        return filename
-    return None
+    # Linhas escritas em fluxo conforme o iterável é consumido; o arquivo só é criado
+    # se houver ao menos uma transação
+    data_referencia = datetime.date.today().strftime("%Y-%m")
+    linhas = ((t.id, t.data_hora.isoformat(), t.valor, t.status, t.tipo_cartao,
+               t.nsu if hasattr(t, 'nsu') else '',
+               t.codigo_autorizacao if hasattr(t, 'codigo_autorizacao') else '',
+               entity_type, data_referencia)
+              for t in transactions)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return None
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(("id_transacao", "data_hora", "valor", "status_final", "tipo_cartao", "nsu_adquirente",
+                         "codigo_autorizacao", "entidade_responsavel", "data_referencia_bcb"))
+        writer.writerow(primeira)
+        writer.writerows(linhas)
+    return filename
@@ -0,0 +1,363 @@
+# src/services/journal.py
+import os
+import glob
+import time
+import struct
+import logging
+import argparse
+import numpy as np
+
+from src.models.clock import agora_ns
+from src.models.chargeback import CODIGO_STATUS_CHARGEBACK
+from src.models.entities import _CODIGO_POR_STATUS, StatusTransacao
+from src.models.ledger import SaldoLedger
+from src.models.transaction_table import TabelaTransacoes
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ADQJ"
+VERSAO = 1
+
+# Registros: 1 byte de tipo + campos de largura fixa (little-endian). Ids de portador,
+# estabelecimento e tipo de transação viram códigos int32 do próprio journal (REG_NOME).
+CABECALHO = struct.Struct("<4sHqq") # magic, versão, seed, início (ns)
+REG_NOME = struct.Struct("<BBiH") # + bytes do nome
+REG_SALDO = struct.Struct("<Biq") # portador, saldo em centavos (cadastro/ajuste)
+REG_AUTORIZACAO = struct.Struct("<B24siiiqB12s16s6sq") # id, portador, estab, tipo, centavos, status, nsu, auth, bin, ns
+REG_STATUS = struct.Struct("<B24sB") # id, novo status (captura, liquidação, estorno)
+REG_CHARGEBACK = struct.Struct("<B24s24sBq") # cb_id, id da transação, status do chargeback, ns
+
+NOME, SALDO, AUTORIZACAO, STATUS, CHARGEBACK = range(1, 6)
+PORTADOR, ESTABELECIMENTO, TIPO = range(3)
+
+_CODIGO_PENDENTE = _CODIGO_POR_STATUS[StatusTransacao.PENDENTE]
+_CODIGO_APROVADA = _CODIGO_POR_STATUS[StatusTransacao.APROVADA]
+
+_STATUS_LOTE = np.dtype([("tipo", "u1"), ("id", "S24"), ("status", "u1")])
+
+
+def _caminho_snapshot(caminho, registros):
+    return f"{caminho}.{registros:012d}.snap.npz"
+
+
+class JournalSimulacao:
+    """
+    Journal binário append-only das transições de estado da simulação (cadastro de saldo,
+    autorização, mudanças de status da transação e do chargeback), com a seed da execução
+    no cabeçalho. Os registros são acumulados em um buffer e escritos em blocos.
+
+    Com `vincular(tabela, saldos)` e `snapshot_a_cada`, grava checkpoints periódicos
+    (.snap.npz ao lado do journal) para o replay começar do meio da execução. Abrir o
+    journal apaga os snapshots de execuções anteriores no mesmo caminho.
+    """
+    TAMANHO_BUFFER = 1 << 20
+
+    def __init__(self, caminho, seed, snapshot_a_cada=None):
+        self.caminho = caminho
+        self.seed = seed
+        self.snapshot_a_cada = snapshot_a_cada
+        self.registros = 0
+        self.em_voo = 0 # Autorizações já decididas pelo emissor (saldo debitado) e ainda sem registro
+        self.chargebacks = {} # cb_id -> (id da transação, código do status), para os snapshots
+        self._codigos = ({}, {}, {})
+        self._fonte = None
+        self._proximo_snapshot = snapshot_a_cada
+        self.inicio_ns = agora_ns()
+        self._arquivo = open(caminho, "wb")
+        for _, arquivo in listar_snapshots(caminho):
+            os.remove(arquivo) # O journal foi truncado: snapshots antigos apontariam para outra execução
+        self._buffer = bytearray(CABECALHO.pack(MAGIC, VERSAO, seed, self.inicio_ns))
+
+    def vincular(self, tabela, saldos):
+        """Estado vivo (tabela de transações e ledger de saldos) usado nos snapshots."""
+        self._fonte = (tabela, saldos)
+
+    def _codigo(self, tipo, nome):
+        codigos = self._codigos[tipo]
+        codigo = codigos.get(nome)
+        if codigo is None:
+            codigo = codigos[nome] = len(codigos)
+            bruto = nome.encode("utf-8")
+            self._buffer += REG_NOME.pack(NOME, tipo, codigo, len(bruto))
+            self._buffer += bruto
+            self.registros += 1
+        return codigo
+
+    def _registrado(self, quantidade=1):
+        self.registros += quantidade
+        if len(self._buffer) >= self.TAMANHO_BUFFER:
+            self.flush()
+        if self._proximo_snapshot is not None and self._fonte is not None and self.registros >= self._proximo_snapshot:
+            # Com autorizações em voo (lote no meio, pipeline assíncrono) o snapshot fica para o próximo registro
+            if not self.em_voo:
+                self.checkpoint()
+
+    def decididas(self, quantidade=1):
+        """O emissor decidiu `quantidade` autorizações; cada uma sai de voo no seu registro de autorização."""
+        self.em_voo += quantidade
+
+    def saldo(self, portador_id, valor):
+        self._buffer += REG_SALDO.pack(SALDO, self._codigo(PORTADOR, portador_id), round(valor * 100))
+        self._registrado()
+
+    def autorizacao(self, tabela, linha):
+        """Resultado final da autorização (aprovada ou negada) de uma linha da tabela."""
+        self.em_voo = max(self.em_voo - 1, 0)
+        self._buffer += REG_AUTORIZACAO.pack(
+            AUTORIZACAO,
+            tabela.ids[linha],
+            self._codigo(PORTADOR, tabela.portadores.valor(tabela.portador[linha])),
+            self._codigo(ESTABELECIMENTO, tabela.estabelecimentos.valor(tabela.estabelecimento[linha])),
+            self._codigo(TIPO, tabela.tipos.valor(tabela.tipo[linha])),
+            int(tabela.valor_centavos[linha]),
+            tabela.status[linha],
+            tabela.nsu[linha],
+            tabela.codigo_autorizacao[linha],
+            tabela.bin[linha],
+            int(tabela.timestamp_ns[linha]),
+        )
+        self._registrado()
+
+    def status(self, tabela, linha, codigo):
+        self._buffer += REG_STATUS.pack(STATUS, tabela.ids[linha], codigo)
+        self._registrado()
+
+    def status_lote(self, tabela, linhas, codigo):
+        """Mesma mudança de status para várias linhas (ex.: liquidação), em um único bloco."""
+        registros = np.zeros(len(linhas), dtype=_STATUS_LOTE)
+        registros["tipo"] = STATUS
+        registros["id"] = tabela.ids[linhas]
+        registros["status"] = codigo
+        self._buffer += registros.tobytes()
+        self._registrado(len(linhas))
+
+    def chargeback(self, cb_id, txn_id, status):
+        codigo = CODIGO_STATUS_CHARGEBACK[status]
+        self.chargebacks[cb_id] = (txn_id, codigo)
+        self._buffer += REG_CHARGEBACK.pack(CHARGEBACK, cb_id.encode("ascii"), txn_id.encode("ascii"), codigo, agora_ns())
+        self._registrado()
+
+    def flush(self):
+        if self._buffer:
+            self._arquivo.write(self._buffer)
+            self._buffer = bytearray()
+
+    def checkpoint(self):
+        """Grava um snapshot do estado vinculado na posição atual do journal."""
+        tabela, saldos = self._fonte
+        linhas = np.flatnonzero(tabela.coluna("status") != _CODIGO_PENDENTE) # Pendentes ainda não foram journaladas
+        mapas = [
+            np.array([self._codigo(tipo, nome) for nome in internador._valores], dtype=np.int32)
+            for tipo, internador in ((PORTADOR, tabela.portadores), (ESTABELECIMENTO, tabela.estabelecimentos), (TIPO, tabela.tipos))
+        ]
+        self.flush()
+        self._arquivo.flush()
+        ids_saldo = list(saldos)
+        cbs = sorted(self.chargebacks.items())
+        np.savez(
+            _caminho_snapshot(self.caminho, self.registros),
+            registros=self.registros,
+            posicao=self._arquivo.tell(),
+            seed=self.seed,
+            inicio_ns=self.inicio_ns,
+            nomes_portador=_nomes(self._codigos[PORTADOR]),
+            nomes_estabelecimento=_nomes(self._codigos[ESTABELECIMENTO]),
+            nomes_tipo=_nomes(self._codigos[TIPO]),
+            ids=tabela.ids[linhas],
+            portador=mapas[0][tabela.portador[linhas]] if len(mapas[0]) else np.zeros(0, np.int32),
+            estabelecimento=mapas[1][tabela.estabelecimento[linhas]] if len(mapas[1]) else np.zeros(0, np.int32),
+            tipo=mapas[2][tabela.tipo[linhas]] if len(mapas[2]) else np.zeros(0, np.int32),
+            valor_centavos=tabela.valor_centavos[linhas],
+            status=tabela.status[linhas],
+            timestamp_ns=tabela.timestamp_ns[linhas],
+            codigo_autorizacao=tabela.codigo_autorizacao[linhas],
+            nsu=tabela.nsu[linhas],
+            bin=tabela.bin[linhas],
+            saldo_ids=np.array([i.encode("utf-8") for i in ids_saldo], dtype=np.bytes_),
+            saldo_centavos=saldos.centavos.copy(),
+            cb_ids=np.array([cb_id.encode("ascii") for cb_id, _ in cbs], dtype="S24"),
+            cb_txn_ids=np.array([txn_id.encode("ascii") for _, (txn_id, _) in cbs], dtype="S24"),
+            cb_status=np.array([codigo for _, (_, codigo) in cbs], dtype=np.uint8),
+        )
+        if self.snapshot_a_cada:
+            self._proximo_snapshot = self.registros + self.snapshot_a_cada
+        logger.info(f"Journal: snapshot em {self.registros} registros.")
+
+    def fechar(self):
+        self.flush()
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def __repr__(self):
+        return f"JournalSimulacao({self.caminho!r}, seed={self.seed}, {self.registros} registros)"
+
+
+def _nomes(codigos):
+    return np.array([nome.encode("utf-8") for nome in codigos], dtype=np.bytes_) if codigos else np.zeros(0, dtype="S1")
+
+
+class EstadoReplay:
+    """Estado reconstruído a partir do journal: transações, saldos e status dos chargebacks."""
+    def __init__(self, seed):
+        self.seed = seed
+        self.tabela = TabelaTransacoes()
+        self.saldos = SaldoLedger()
+        self.chargebacks = {} # cb_id -> (id da transação, código do status)
+        self.registros = 0
+        self.snapshot = None # Caminho do snapshot usado como ponto de partida, se algum
+
+    def __repr__(self):
+        return (f"EstadoReplay(seed={self.seed}, {self.registros} registros, {len(self.tabela)} transações, "
+                f"{len(self.saldos)} portadores, {len(self.chargebacks)} chargebacks)")
+
+
+def listar_snapshots(caminho):
+    """Snapshots do journal, como (registros, caminho), em ordem."""
+    snapshots = []
+    for arquivo in glob.glob(glob.escape(caminho) + ".*.snap.npz"):
+        registros = arquivo[len(caminho) + 1:-len(".snap.npz")]
+        if registros.isdigit():
+            snapshots.append((int(registros), arquivo))
+    return sorted(snapshots)
+
+
+def reproduzir(caminho, ate_registro=None, usar_snapshot=True):
+    """
+    Reconstrói o estado da simulação lendo o journal (sem reexecutar as entidades).
+    ate_registro limita quantos registros aplicar; com usar_snapshot, começa do último
+    snapshot anterior a esse ponto e lê só o restante do arquivo.
+    """
+    with open(caminho, "rb") as f:
+        magic, versao, seed, inicio_ns = CABECALHO.unpack(f.read(CABECALHO.size))
+        if magic != MAGIC or versao != VERSAO:
+            raise ValueError(f"{caminho}: não é um journal de simulação (v{VERSAO}).")
+        limite = float("inf") if ate_registro is None else ate_registro
+
+        estado = EstadoReplay(seed)
+        nomes = ([], [], [])
+        inicio = CABECALHO.size
+        linha_por_id = {}
+        pos_saldo = {} # código do portador -> posição no ledger
+
+        snapshots = [s for s in listar_snapshots(caminho) if s[0] <= limite] if usar_snapshot else []
+        for registros, arquivo in reversed(snapshots):
+            if _snapshot_da_execucao(arquivo, seed, inicio_ns):
+                estado.registros, estado.snapshot = registros, arquivo
+                inicio = _carregar_snapshot(estado, arquivo, nomes, linha_por_id)
+                break
+            logger.warning(f"Journal: ignorando {arquivo}, de outra execução.")
+        f.seek(inicio)
+        dados = f.read()
+
+    # Autorizações acumuladas em colunas e gravadas na tabela de uma vez no final
+    pendentes = {campo: [] for campo in ("ids", "portador", "estabelecimento", "tipo", "valor", "status", "nsu", "auth", "bin", "ns")}
+    status_finais = {}
+    saldos = estado.saldos
+    proxima_linha = len(estado.tabela)
+    posicao = 0 # Relativa a `inicio`
+    tamanho = len(dados)
+    registros = estado.registros
+
+    while posicao < tamanho and registros < limite:
+        tipo = dados[posicao]
+        if tipo == AUTORIZACAO:
+            (_, txn_id, portador, estab, tipo_txn, centavos, status, nsu, auth, bin_, ns) = REG_AUTORIZACAO.unpack_from(dados, posicao)
+            posicao += REG_AUTORIZACAO.size
+            txn_id = txn_id.rstrip(b"\0")
+            linha_por_id[txn_id] = proxima_linha
+            proxima_linha += 1
+            for campo, valor in zip(pendentes.values(), (txn_id, portador, estab, tipo_txn, centavos, status, nsu, auth, bin_, ns)):
+                campo.append(valor)
+            if status == _CODIGO_APROVADA:
+                p = pos_saldo.get(portador)
+                if p is None:
+                    p = pos_saldo[portador] = saldos.posicao(nomes[PORTADOR][portador])
+                saldos.centavos[p] -= centavos
+        elif tipo == STATUS:
+            _, txn_id, codigo = REG_STATUS.unpack_from(dados, posicao)
+            posicao += REG_STATUS.size
+            status_finais[linha_por_id[txn_id.rstrip(b"\0")]] = codigo
+        elif tipo == CHARGEBACK:
+            _, cb_id, txn_id, codigo, _ = REG_CHARGEBACK.unpack_from(dados, posicao)
+            posicao += REG_CHARGEBACK.size
+            estado.chargebacks[cb_id.rstrip(b"\0").decode("ascii")] = (txn_id.rstrip(b"\0").decode("ascii"), codigo)
+        elif tipo == SALDO:
+            _, portador, centavos = REG_SALDO.unpack_from(dados, posicao)
+            posicao += REG_SALDO.size
+            saldos.definir_centavos(nomes[PORTADOR][portador], centavos)
+            pos_saldo[portador] = saldos.posicao(nomes[PORTADOR][portador])
+        elif tipo == NOME:
+            _, tipo_nome, codigo, tamanho_nome = REG_NOME.unpack_from(dados, posicao)
+            posicao += REG_NOME.size
+            nomes[tipo_nome].append(dados[posicao:posicao + tamanho_nome].decode("utf-8"))
+            posicao += tamanho_nome
+        else:
+            raise ValueError(f"{caminho}: registro desconhecido (tipo {tipo}) no byte {inicio + posicao}.")
+        registros += 1
+
+    estado.registros = registros
+    if pendentes["ids"]:
+        linhas = estado.tabela.adicionar_lote(
+            pendentes["ids"],
+            [nomes[PORTADOR][c] for c in pendentes["portador"]],
+            [nomes[ESTABELECIMENTO][c] for c in pendentes["estabelecimento"]],
+            pendentes["valor"],
+            [nomes[TIPO][c] for c in pendentes["tipo"]],
+            pendentes["status"],
+            pendentes["ns"],
+            pendentes["bin"],
+        )
+        estado.tabela.nsu[linhas.start:linhas.stop] = pendentes["nsu"]
+        estado.tabela.codigo_autorizacao[linhas.start:linhas.stop] = pendentes["auth"]
+    if status_finais:
+        estado.tabela.status[np.fromiter(status_finais.keys(), np.int64, len(status_finais))] = \
+            np.fromiter(status_finais.values(), np.uint8, len(status_finais))
+    return estado
+
+
+def _snapshot_da_execucao(arquivo, seed, inicio_ns):
+    """O snapshot foi gravado pela execução do cabeçalho do journal (mesma seed e início)?"""
+    with np.load(arquivo) as snap:
+        return "inicio_ns" in snap.files and int(snap["seed"]) == seed and int(snap["inicio_ns"]) == inicio_ns
+
+
+def _carregar_snapshot(estado, arquivo, nomes, linha_por_id):
+    """Aplica um snapshot ao estado vazio; retorna a posição do journal onde o replay continua."""
+    with np.load(arquivo) as snap:
+        for tipo, chave in ((PORTADOR, "nomes_portador"), (ESTABELECIMENTO, "nomes_estabelecimento"), (TIPO, "nomes_tipo")):
+            nomes[tipo].extend(nome.decode("utf-8") for nome in snap[chave].tolist())
+        ids = snap["ids"]
+        if len(ids):
+            portador, estabelecimento, tipo = (np.array(nomes[t], dtype=object)[snap[c]] for t, c in
+                                               ((PORTADOR, "portador"), (ESTABELECIMENTO, "estabelecimento"), (TIPO, "tipo")))
+            linhas = estado.tabela.adicionar_lote(ids, portador.tolist(), estabelecimento.tolist(), snap["valor_centavos"],
+                                                  tipo.tolist(), snap["status"], snap["timestamp_ns"], snap["bin"])
+            estado.tabela.nsu[linhas.start:linhas.stop] = snap["nsu"]
+            estado.tabela.codigo_autorizacao[linhas.start:linhas.stop] = snap["codigo_autorizacao"]
+            linha_por_id.update(zip(ids.tolist(), linhas))
+        for portador_id, centavos in zip(snap["saldo_ids"].tolist(), snap["saldo_centavos"].tolist()):
+            estado.saldos.definir_centavos(portador_id.decode("utf-8"), centavos)
+        for cb_id, txn_id, codigo in zip(snap["cb_ids"].tolist(), snap["cb_txn_ids"].tolist(), snap["cb_status"].tolist()):
+            estado.chargebacks[cb_id.decode("ascii")] = (txn_id.decode("ascii"), codigo)
+        return int(snap["posicao"])
+
+
+if __name__ == "__main__":
+    # python -m src.services.simulation --transacoes 100000 --journal data/output/sim.journal --snapshot-a-cada 50000
+    # python -m src.services.journal data/output/sim.journal
+    parser = argparse.ArgumentParser(description="Replay do journal binário da simulação.")
+    parser.add_argument("journal")
+    parser.add_argument("--ate-registro", type=int, default=None)
+    parser.add_argument("--sem-snapshot", action="store_true", help="Reproduz o journal inteiro, ignorando os snapshots.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    inicio = time.perf_counter()
+    estado = reproduzir(args.journal, args.ate_registro, not args.sem_snapshot)
+    duracao = time.perf_counter() - inicio
+    print(f"{estado} em {duracao:.3f}s" + (f" (a partir de {estado.snapshot})" if estado.snapshot else ""))
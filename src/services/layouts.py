@@ -0,0 +1,195 @@
+# src/services/layouts.py
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Um byte por caractere: mantém a largura fixa mesmo com acentos
+ENCODING = "latin-1"
+
+
+class Campo:
+    """
+    Campo de um registro posicional.
+    tipo "A": alfanumérico, alinhado à esquerda e completado com espaços (ljust).
+    tipo "N": numérico inteiro, alinhado à direita e completado com zeros (zfill).
+    constante: valor fixo gravado em todo registro (não é informado na codificação).
+    """
+    def __init__(self, nome, largura, tipo="A", constante=None):
+        if tipo not in ("A", "N"):
+            raise ValueError(f"Tipo de campo inválido: {tipo}")
+        if constante is not None and len(constante) != largura:
+            raise ValueError(f"Constante '{constante}' não tem {largura} posições.")
+        self.nome = nome
+        self.largura = largura
+        self.tipo = tipo
+        self.constante = constante
+
+    def __repr__(self):
+        return f"Campo({self.nome!r}, {self.largura}, {self.tipo!r})"
+
+
+class LayoutRegistro:
+    """
+    Layout de registro de largura fixa, terminado em '\\n'. Compilado uma única vez:
+    o encoder vira uma string de formatação '%' (um único format por registro) e o
+    decoder um dtype estruturado do NumPy, que lê um buffer inteiro sem cópia.
+    """
+    SUBLOTE = 1024 # Registros codificados por vez em encode_into
+    def __init__(self, nome, campos):
+        self.nome = nome
+        self.campos = tuple(campos)
+        self.campos_variaveis = tuple(c.nome for c in self.campos if c.constante is None)
+        self.tamanho = sum(c.largura for c in self.campos) + 1 # + '\n'
+
+        partes = []
+        for campo in self.campos:
+            if campo.constante is not None:
+                partes.append(campo.constante.replace("%", "%%"))
+            elif campo.tipo == "A":
+                partes.append(f"%-{campo.largura}s")
+            else:
+                partes.append(f"%0{campo.largura}d")
+        self._formato = "".join(partes) + "\n"
+
+        self.dtype = np.dtype([(c.nome, f"S{c.largura}") for c in self.campos] + [("_fim", "S1")])
+        offsets, posicao = [], 0
+        for campo in self.campos:
+            offsets.append((campo, posicao, posicao + campo.largura))
+            posicao += campo.largura
+        self._offsets = tuple(offsets)
+
+    def encode(self, valores):
+        """Codifica um registro (tupla com os campos variáveis, na ordem do layout)."""
+        linha = self._formato % tuple(valores)
+        if len(linha) != self.tamanho:
+            self._erro_largura(valores)
+        return linha.encode(ENCODING)
+
+    def encode_into(self, buffer, offset, registros):
+        """
+        Codifica um lote de registros em buffer (bytearray/memoryview já alocado) a partir
+        de offset, em blocos de SUBLOTE registros: só um bloco codificado existe fora do
+        buffer por vez. Retorna quantos bytes foram escritos.
+        """
+        formato, tamanho = self._formato, self.tamanho
+        view = memoryview(buffer)
+        posicao = offset
+        for inicio in range(0, len(registros), self.SUBLOTE):
+            bloco = registros[inicio:inicio + self.SUBLOTE]
+            dados = "".join([formato % registro for registro in bloco]).encode(ENCODING)
+            # Padding nunca encurta um campo: se o total bate, todos os registros têm a largura certa
+            if len(dados) != len(bloco) * tamanho:
+                for registro in bloco:
+                    if len(formato % registro) != tamanho:
+                        self._erro_largura(registro)
+            view[posicao:posicao + len(dados)] = dados
+            posicao += len(dados)
+        return posicao - offset
+
+    def encode_lote(self, registros):
+        """Codifica um lote inteiro em um bytearray pré-alocado com o tamanho exato."""
+        registros = registros if isinstance(registros, list) else list(registros)
+        buffer = bytearray(len(registros) * self.tamanho)
+        self.encode_into(buffer, 0, registros)
+        return buffer
+
+    def _erro_largura(self, valores):
+        for nome, valor in zip(self.campos_variaveis, valores):
+            campo = next(c for c in self.campos if c.nome == nome)
+            texto = str(valor) if campo.tipo == "A" else f"%0{campo.largura}d" % valor
+            if len(texto) > campo.largura:
+                raise ValueError(f"Layout {self.nome}: campo '{nome}' excede {campo.largura} posições: {valor!r}")
+        raise ValueError(f"Layout {self.nome}: registro com tamanho diferente de {self.tamanho}: {valores!r}")
+
+    def decode(self, linha):
+        """Decodifica um registro (bytes ou str) em dict; campos N viram int, A sem espaços à direita."""
+        if isinstance(linha, str):
+            linha = linha.encode(ENCODING)
+        registro = {}
+        for campo, inicio, fim in self._offsets:
+            bruto = linha[inicio:fim]
+            registro[campo.nome] = int(bruto) if campo.tipo == "N" else bytes(bruto).decode(ENCODING).rstrip(" ")
+        return registro
+
+    def decode_lote(self, buffer):
+        """
+        View estruturada (sem cópia) sobre um buffer com registros completos deste layout:
+        cada campo é uma coluna de bytes de largura fixa. Use coluna_int/coluna_str para converter.
+        """
+        return np.frombuffer(buffer, dtype=self.dtype, count=len(buffer) // self.tamanho)
+
+    def coluna_int(self, registros, nome):
+        return registros[nome].astype(np.int64)
+
+    def coluna_str(self, registros, nome):
+        return np.char.rstrip(registros[nome].astype("U"), " ")
+
+    def __repr__(self):
+        return f"LayoutRegistro({self.nome!r}, {self.tamanho} bytes)"
+
+
+LAYOUTS = {}
+
+
+def registrar_layout(layout):
+    LAYOUTS[layout.nome] = layout
+    return layout
+
+
+def get_layout(nome):
+    try:
+        return LAYOUTS[nome]
+    except KeyError:
+        raise ValueError(f"Layout desconhecido: {nome}. Registrados: {', '.join(LAYOUTS)}") from None
+
+
+# Larguras dos campos de identificação acompanham o AlocadorIds
+# (ID de transação 19, NSU 12 e código de autorização 16 posições).
+LAYOUT_CAPTURA = registrar_layout(LayoutRegistro("captura_01", [
+    Campo("tipo_registro", 2, constante="01"),
+    Campo("id_transacao", 20),
+    Campo("valor_centavos", 10, "N"),
+    Campo("nsu", 12),
+    Campo("codigo_autorizacao", 16),
+    Campo("bin", 6),
+]))
+
+LAYOUT_LIQUIDACAO_ADQ = registrar_layout(LayoutRegistro("liquidacao_adq", [
+    Campo("id_transacao", 20),
+    Campo("valor_centavos", 10, "N"),
+    Campo("codigo_autorizacao", 16),
+    Campo("nsu", 12),
+    Campo("status_liquidacao", 10),
+]))
+
+LAYOUT_LIQUIDACAO_EMISSOR = registrar_layout(LayoutRegistro("liquidacao_emissor", [
+    Campo("id_transacao", 20),
+    Campo("valor_centavos", 10, "N"),
+    Campo("bin", 6),
+    Campo("codigo_autorizacao", 16),
+    Campo("data_hora", 14),
+    Campo("status_faturamento", 10),
+]))
+
+LAYOUT_CNAB_PAGAMENTO = registrar_layout(LayoutRegistro("cnab_p", [
+    Campo("tipo_registro", 1, constante="P"), # Pagamento
+    Campo("banco", 3, "N"),
+    Campo("agencia", 4, "N"),
+    Campo("conta", 8, "N"),
+    Campo("valor_centavos", 10, "N"),
+    Campo("id_transacao", 20),
+]))
+
+# Pagamento consolidado: uma instrução por conta de estabelecimento (ver settlement_engine.py)
+LAYOUT_CNAB_PAGAMENTO_CONSOLIDADO = registrar_layout(LayoutRegistro("cnab_c", [
+    Campo("tipo_registro", 1, constante="C"), # Crédito consolidado
+    Campo("banco", 3, "N"),
+    Campo("agencia", 4, "N"),
+    Campo("conta", 8, "N"),
+    Campo("quantidade_transacoes", 8, "N"),
+    Campo("valor_bruto_centavos", 13, "N"),
+    Campo("valor_tarifas_centavos", 12, "N"),
+    Campo("valor_liquido_centavos", 13, "N"),
+    Campo("id_instrucao", 20),
+]))
@@ -0,0 +1,232 @@
+# src/services/metrics.py
+import os
+import time
+import logging
+import threading
+from array import array
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BITS_PRECISAO = 8 # Erro relativo dos percentis abaixo de 2^-(bits-1), 0,8% com 8 bits
+QUANTIS_EXPORTADOS = (0.5, 0.9, 0.99, 0.999)
+
+# Métodos cronometrados em cada componente do PaymentSimulator (atributo do simulador -> métodos)
+PONTOS_INSTRUMENTADOS = (
+    ("adquirente", ("receber_transacao", "receber_lote", "processar_liquidacao", "enviar_reapresentacao")),
+    ("bandeira", ("solicitar_autorizacao", "rotear_autorizacao", "solicitar_autorizacao_lote", "processar_captura",
+                  "processar_captura_linhas", "iniciar_liquidacao", "registrar_chargeback", "receber_reapresentacao",
+                  "finalizar_chargeback")),
+    ("emissor", ("solicitar_autorizacao", "autorizar_linhas", "processar_liquidacao", "receber_solicitacao_chargeback",
+                 "encaminhar_chargeback_para_bandeira", "finalizar_chargeback")),
+    ("cb_processor", ("processar_chargeback",)),
+    ("regulatory_reporter", ("generate_all_reports",)),
+)
+
+
+class HistogramaHDR:
+    """
+    Histograma de latências (ns) no estilo HDR: buckets unitários até 2^bits e, acima
+    disso, 2^(bits-1) sub-buckets por potência de 2. A memória é fixa (alguns milhares de
+    contadores) e o erro relativo de qualquer percentil é o mesmo de ns a horas.
+    """
+    def __init__(self, bits=BITS_PRECISAO):
+        self.bits = bits
+        self._limite = 1 << bits
+        self._metade = 1 << (bits - 1)
+        self.contagens = array("q", bytes(8 * (self._indice((1 << 63) - 1) + 1)))
+        self.total = 0
+        self.soma = 0
+        self.maximo = 0
+
+    def _indice(self, valor):
+        if valor < self._limite:
+            return valor
+        deslocamento = valor.bit_length() - self.bits
+        return self._limite + (deslocamento - 1) * self._metade + (valor >> deslocamento) - self._metade
+
+    def _valor(self, indice):
+        """Valor representativo (meio) do bucket."""
+        if indice < self._limite:
+            return indice
+        deslocamento, sub_bucket = divmod(indice - self._limite, self._metade)
+        deslocamento += 1
+        return ((sub_bucket + self._metade) << deslocamento) + (1 << deslocamento) // 2
+
+    def registrar(self, valor_ns):
+        valor_ns = max(valor_ns, 0)
+        self.contagens[self._indice(valor_ns)] += 1
+        self.total += 1
+        self.soma += valor_ns
+        if valor_ns > self.maximo:
+            self.maximo = valor_ns
+
+    def percentis(self, quantis):
+        """Valores (ns) nos quantis pedidos (0 a 1), numa única passada acumulada."""
+        if not self.total:
+            return [0] * len(quantis)
+        acumulado = np.cumsum(np.frombuffer(self.contagens, dtype=np.int64))
+        posicoes = np.searchsorted(acumulado, [max(1, int(np.ceil(q * self.total))) for q in quantis])
+        return [min(self._valor(int(p)), self.maximo) for p in posicoes]
+
+    def media(self):
+        return self.soma / self.total if self.total else 0.0
+
+    def mesclar(self, outro):
+        if outro.bits != self.bits:
+            raise ValueError(f"Histogramas com precisões diferentes ({self.bits} e {outro.bits} bits).")
+        contagens = np.frombuffer(self.contagens, dtype=np.int64)
+        contagens += np.frombuffer(outro.contagens, dtype=np.int64)
+        self.total += outro.total
+        self.soma += outro.soma
+        self.maximo = max(self.maximo, outro.maximo)
+        return self
+
+    def __repr__(self):
+        return f"HistogramaHDR({self.total} amostras, média {self.media() / 1000:.1f}µs)"
+
+
+def _rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metricas:
+    """
+    Histogramas de latência e contadores por etapa (ex.: "Bandeira.processar_captura").
+    instrumentar troca métodos de uma instância por versões cronometradas (atributo de
+    instância sobre o método da classe); sem Metricas nada é trocado e o custo é zero.
+    Exporta no formato texto do Prometheus (arquivo ou endpoint HTTP) e em resumo tabular.
+    """
+    def __init__(self, prefixo="simulador_pagamentos", bits=BITS_PRECISAO):
+        self.prefixo = prefixo
+        self.bits = bits
+        self.histogramas = {} # etapa -> HistogramaHDR
+        self.contadores = {} # (nome, etapa) -> valor
+        self._instrumentados = []
+        self._servidor = None
+
+    def histograma(self, etapa):
+        histograma = self.histogramas.get(etapa)
+        if histograma is None:
+            histograma = self.histogramas[etapa] = HistogramaHDR(self.bits)
+        return histograma
+
+    def incrementar(self, nome, etapa, quantidade=1):
+        chave = (nome, etapa)
+        self.contadores[chave] = self.contadores.get(chave, 0) + quantidade
+
+    def envolver(self, funcao, etapa):
+        """Versão cronometrada de funcao: latência no histograma da etapa, exceções no contador de erros."""
+        registrar = self.histograma(etapa).registrar
+        incrementar = self.incrementar
+        relogio = time.perf_counter_ns
+
+        @wraps(funcao)
+        def cronometrada(*args, **kwargs):
+            inicio = relogio()
+            try:
+                return funcao(*args, **kwargs)
+            except Exception:
+                incrementar("erros", etapa)
+                raise
+            finally:
+                registrar(relogio() - inicio)
+        return cronometrada
+
+    def instrumentar(self, objeto, *metodos):
+        for metodo in metodos:
+            etapa = f"{type(objeto).__name__}.{metodo}"
+            setattr(objeto, metodo, self.envolver(getattr(objeto, metodo), etapa))
+            self._instrumentados.append((objeto, metodo))
+        return self
+
+    def instrumentar_simulador(self, simulador, pontos=PONTOS_INSTRUMENTADOS):
+        for atributo, metodos in pontos:
+            self.instrumentar(getattr(simulador, atributo), *metodos)
+        return self
+
+    def desinstrumentar(self):
+        """Devolve os métodos originais (remove os atributos de instância)."""
+        for objeto, metodo in reversed(self._instrumentados):
+            vars(objeto).pop(metodo, None)
+        self._instrumentados.clear()
+
+    def resumo(self):
+        """Uma linha por etapa (chamadas, erros, média, p50/p90/p99/p99.9 e máximo em ms), para tabelas."""
+        linhas = []
+        for etapa, histograma in sorted(self.histogramas.items()):
+            p50, p90, p99, p999 = histograma.percentis(QUANTIS_EXPORTADOS)
+            linhas.append({
+                "etapa": etapa,
+                "chamadas": histograma.total,
+                "erros": self.contadores.get(("erros", etapa), 0),
+                "media_ms": histograma.media() / 1e6,
+                "p50_ms": p50 / 1e6,
+                "p90_ms": p90 / 1e6,
+                "p99_ms": p99 / 1e6,
+                "p999_ms": p999 / 1e6,
+                "max_ms": histograma.maximo / 1e6,
+            })
+        return linhas
+
+    def exportar_prometheus(self):
+        """Métricas no formato texto de exposição do Prometheus (latências como summary)."""
+        nome = f"{self.prefixo}_latencia_segundos"
+        linhas = [f"# HELP {nome} Latência das chamadas instrumentadas por etapa.", f"# TYPE {nome} summary"]
+        for etapa, histograma in sorted(self.histogramas.items()):
+            rotulo = f'etapa="{_rotulo(etapa)}"'
+            for quantil, valor in zip(QUANTIS_EXPORTADOS, histograma.percentis(QUANTIS_EXPORTADOS)):
+                valor = f"{valor / 1e9:.9g}" if histograma.total else "NaN" # Sem amostras o quantil é indefinido
+                linhas.append(f'{nome}{{{rotulo},quantile="{quantil}"}} {valor}')
+            linhas.append(f"{nome}_sum{{{rotulo}}} {histograma.soma / 1e9:.9g}")
+            linhas.append(f"{nome}_count{{{rotulo}}} {histograma.total}")
+        for contador in sorted({nome for nome, _ in self.contadores}):
+            nome_total = f"{self.prefixo}_{contador}_total"
+            linhas.append(f"# TYPE {nome_total} counter")
+            for (nome_contador, etapa), valor in sorted(self.contadores.items()):
+                if nome_contador == contador:
+                    linhas.append(f'{nome_total}{{etapa="{_rotulo(etapa)}"}} {valor}')
+        return "\n".join(linhas) + "\n"
+
+    def gravar_prometheus(self, caminho):
+        """Grava o arquivo .prom de uma vez (temporário + os.replace), como o textfile collector espera."""
+        temporario = f"{caminho}.tmp{os.getpid()}"
+        with open(temporario, "w") as f:
+            f.write(self.exportar_prometheus())
+        os.replace(temporario, caminho)
+        return caminho
+
+    def servir(self, porta=9464, endereco="127.0.0.1"):
+        """Expõe GET /metrics numa thread daemon; retorna o servidor (parar com parar_servidor)."""
+        metricas = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                corpo = metricas.exportar_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, formato, *args):
+                logger.debug("Metricas: " + formato, *args)
+
+        self._servidor = ThreadingHTTPServer((endereco, porta), _Handler)
+        threading.Thread(target=self._servidor.serve_forever, name="metricas-http", daemon=True).start()
+        logger.info(f"Metricas: endpoint Prometheus em http://{endereco}:{self._servidor.server_port}/metrics")
+        return self._servidor
+
+    def parar_servidor(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __repr__(self):
+        return f"Metricas({len(self.histogramas)} etapas, {sum(h.total for h in self.histogramas.values())} chamadas)"
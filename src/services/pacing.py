@@ -0,0 +1,46 @@
+# src/services/pacing.py
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RealtimePacing:
+    """Ritmo da demonstração: cada passo dorme o tempo pedido para a animação acompanhar."""
+    nome = "realtime"
+    dorme = True
+
+    def pausa(self, segundos):
+        time.sleep(segundos)
+
+
+class UnpacedPacing:
+    """Ritmo de lote: nenhuma pausa, as transações fluem o mais rápido possível."""
+    nome = "unpaced"
+    dorme = False
+
+    def pausa(self, segundos):
+        pass
+
+
+PACINGS = {
+    RealtimePacing.nome: RealtimePacing,
+    UnpacedPacing.nome: UnpacedPacing,
+}
+
+
+def resolver_pacing(pacing=None):
+    """
+    Aceita None (padrão realtime), o nome de uma estratégia ("realtime"/"unpaced")
+    ou um objeto que já implemente pausa(segundos).
+    """
+    if pacing is None:
+        return RealtimePacing()
+    if isinstance(pacing, str):
+        try:
+            return PACINGS[pacing]()
+        except KeyError:
+            raise ValueError(f"Pacing desconhecido: {pacing}. Opções: {', '.join(PACINGS)}") from None
+    if not hasattr(pacing, "pausa"):
+        raise TypeError(f"Objeto de pacing inválido: {pacing!r}")
+    return pacing
@@ -1,74 +1,111 @@
+import csv
 import datetime
 import os
-import time
 import logging
+from src.services.pacing import resolver_pacing
+from src.services.event_bus import PublicadorEventos, INFO
+from src.services.aggregation import AgregadorTransacoes, STATUS_EFETIVADOS
 
 logger = logging.getLogger(__name__)
 
-class RegulatoryReporter:
-    def __init__(self, output_dir="data/output/", log_callback=None):
+
+def _reais(centavos):
+    return f"{centavos // 100}.{centavos % 100:02d}"
+
+
+def escrever_cadoc_3040(arquivo, reference_month_year):
+    with open(arquivo, "w") as f:
+        f.write(f"<CADOC3040><MesAno>{reference_month_year}</MesAno><DadosFicticios>...</DadosFicticios></CADOC3040>")
+    return arquivo
+
+
+def escrever_cadoc_5817(arquivo, agregado, reference_month_year, adquirente):
+    """Transações efetivadas no mês, por estabelecimento credenciado e tipo de cartão."""
+    mes = int(reference_month_year)
+    totais = agregado.totais(("estabelecimento", "tipo"), lambda g: g["mes"] == mes and g["status"] in STATUS_EFETIVADOS)
+    with open(arquivo, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("MesAno", "Adquirente", "Estabelecimento", "TipoCartao", "QuantidadeTransacoes", "VolumeTransacoes"))
+        writer.writerows((reference_month_year, adquirente, estabelecimento, tipo, quantidade, _reais(centavos))
+                         for (estabelecimento, tipo), (quantidade, centavos) in totais.items())
+    return arquivo
+
+
+def escrever_cadoc_6334(arquivo, agregado, reference_month_year):
+    """Todas as transações do mês (inclusive negadas/estornadas), por tipo de cartão e status."""
+    mes = int(reference_month_year)
+    totais = agregado.totais(("tipo", "status"), lambda g: g["mes"] == mes)
+    with open(arquivo, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("MesAno", "TipoCartao", "Status", "TotalTransacoes", "VolumeTotal"))
+        writer.writerows((reference_month_year, tipo, status, quantidade, _reais(centavos))
+                         for (tipo, status), (quantidade, centavos) in totais.items())
+    return arquivo
+
+
+def caminhos_cadoc(output_dir, reference_month_year):
+    """Nomes dos arquivos de cada CADOC: {"3040": ..., "5817": ..., "6334": ...}."""
+    return {
+        "3040": os.path.join(output_dir, f"REG_EMISSOR_CADOC_3040_SCR_{reference_month_year}.xml"),
+        "5817": os.path.join(output_dir, f"REG_ADQUIRENTE_CADOC_5817_CREDENCIADORAS_{reference_month_year}.csv"),
+        "6334": os.path.join(output_dir, f"REG_GERAL_CADOC_6334_ESTATISTICO_{reference_month_year}.csv"),
+    }
+
+
+class RegulatoryReporter(PublicadorEventos):
+    nome = "BCB" # logs do regulatório são sempre do ponto de vista do BCB ou da entidade reportando
+
+    def __init__(self, output_dir="data/output/", log_callback=None, pacing=None, eventos=None):
         self.output_dir = output_dir
         self.log_callback = log_callback
+        self.eventos = eventos
+        self.pacing = resolver_pacing(pacing)
         logger.debug("RegulatoryReporter inicializado.")
 
-    def _log(self, message, color_tag="black", animation_data=None):
-        if self.log_callback:
-            # logs do regulatório são sempre do ponto de vista do BCB ou da entidade reportando
-            self.log_callback(f"[BCB]: {message}", color_tag, animation_data)
+    def _evento_secao(self, template, *args, cor="white", animacao=None):
+        # Cabeçalhos de seção vão sem o prefixo [BCB]
+        self._publicar(None, template, args, cor, animacao, INFO)
+
+    def generate_all_reports(self, reference_month_year=None, tabela=None, adquirente="AdquirenteXPTO"):
+        """
+        Gera os CADOCs do mês de referência (AAAAMM; padrão: mês atual). Os números de
+        5817 e 6334 vêm de uma única passada de agregação sobre a tabela de transações.
+        """
+        reference_month_year = reference_month_year or datetime.date.today().strftime("%Y%m")
+        caminhos = caminhos_cadoc(self.output_dir, reference_month_year)
+        agregado = AgregadorTransacoes()
+        if tabela is not None:
+            agregado.consumir_tabela(tabela)
+        logger.info(f"RegulatoryReporter: {agregado} para {reference_month_year}.")
 
-    def generate_all_reports(self, reference_month_year="202505"):
-        self.log_callback("--- 7. ARQUIVOS REGULATÓRIOS (Adquirente/Emissor → Banco Central) ---", "white",
-                          {"description": "Iniciando Relatórios Regulatórios", "active_entities": ["bcb"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento_secao("--- 7. ARQUIVOS REGULATÓRIOS (Adquirente/Emissor → Banco Central) ---",
+                           cor="white", animacao=("Iniciando Relatórios Regulatórios", ("bcb",), None))
+        self._pausa(0.5)
 
         # CADOC 3040 (SCR - Sistema de Informações de Crédito) - Emissor reporta
-        self._log(
-            f"Iniciando geração do CADOC 3040 (SCR) para {reference_month_year}...",
-            "red",
-            {"description": "Gerando CADOC 3040 (Emissor para BCB)", "active_entities": ["issuer", "bcb"], "flow_path": "issuer_to_bcb_report"}
-        )
-        file_path_3040 = os.path.join(self.output_dir, f"REG_EMISSOR_CADOC_3040_SCR_{reference_month_year}.xml")
-        with open(file_path_3040, "w") as f:
-            f.write(f"<CADOC3040><MesAno>{reference_month_year}</MesAno><DadosFicticios>...</DadosFicticios></CADOC3040>")
-        self._log(
-            f"Gerado CADOC 3040 (SCR) em {file_path_3040}",
-            "green",
-            {"description": "CADOC 3040 Gerado", "active_entities": ["bcb"], "flow_path": None}
-        )
-        time.sleep(0.1)
+        self._evento("Iniciando geração do CADOC 3040 (SCR) para %s...", reference_month_year,
+                     cor="red", animacao=("Gerando CADOC 3040 (Emissor para BCB)", ("issuer", "bcb"), "issuer_to_bcb_report"))
+        file_path_3040 = escrever_cadoc_3040(caminhos["3040"], reference_month_year)
+        self._evento("Gerado CADOC 3040 (SCR) em %s", file_path_3040,
+                     cor="green", animacao=("CADOC 3040 Gerado", ("bcb",), None))
+        self._pausa(0.1)
 
         # CADOC 5817 (Credenciadoras/Adquirentes)
-        self._log(
-            f"Iniciando geração do CADOC 5817 (Credenciadoras) para {reference_month_year}...",
-            "blue",
-            {"description": "Gerando CADOC 5817 (Adquirente para BCB)", "active_entities": ["acquirer", "bcb"], "flow_path": "acquirer_to_bcb_report"}
-        )
-        file_path_5817 = os.path.join(self.output_dir, f"REG_ADQUIRENTE_CADOC_5817_CREDENCIADORAS_{reference_month_year}.csv")
-        with open(file_path_5817, "w") as f:
-            f.write(f"MesAno,Adquirente,VolumeTransacoes\n{reference_month_year},AdquirenteXPTO,1500000.00")
-        self._log(
-            f"Gerado CADOC 5817 (Credenciadoras) em {file_path_5817}",
-            "green",
-            {"description": "CADOC 5817 Gerado", "active_entities": ["bcb"], "flow_path": None}
-        )
-        time.sleep(0.1)
+        self._evento("Iniciando geração do CADOC 5817 (Credenciadoras) para %s...", reference_month_year,
+                     cor="blue", animacao=("Gerando CADOC 5817 (Adquirente para BCB)", ("acquirer", "bcb"), "acquirer_to_bcb_report"))
+        file_path_5817 = escrever_cadoc_5817(caminhos["5817"], agregado, reference_month_year, adquirente)
+        self._evento("Gerado CADOC 5817 (Credenciadoras) em %s", file_path_5817,
+                     cor="green", animacao=("CADOC 5817 Gerado", ("bcb",), None))
+        self._pausa(0.1)
 
         # CADOC 6334 (Estatístico - geral)
-        self._log(
-            f"Iniciando geração do CADOC 6334 (Estatístico) para {reference_month_year}...",
-            "yellow",
-            {"description": "Gerando CADOC 6334 (Geral para BCB)", "active_entities": ["flag", "bcb"], "flow_path": "flag_to_bcb_report"} # Ou general
-        )
-        file_path_6334 = os.path.join(self.output_dir, f"REG_GERAL_CADOC_6334_ESTATISTICO_{reference_month_year}.csv")
-        with open(file_path_6334, "w") as f:
-            f.write(f"MesAno,TotalTransacoes,VolumeTotal\n{reference_month_year},10,1350.00")
-        self._log(
-            f"Gerado CADOC 6334 (Estatístico) em {file_path_6334}",
-            "green",
-            {"description": "CADOC 6334 Gerado", "active_entities": ["bcb"], "flow_path": None}
-        )
-        time.sleep(0.1)
-
-        self.log_callback("--- FIM DOS REGULATÓRIOS ---", "white",
-                          {"description": "Relatórios Regulatórios Concluídos", "active_entities": ["bcb"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("Iniciando geração do CADOC 6334 (Estatístico) para %s...", reference_month_year,
+                     cor="yellow", animacao=("Gerando CADOC 6334 (Geral para BCB)", ("flag", "bcb"), "flag_to_bcb_report")) # Ou general
+        file_path_6334 = escrever_cadoc_6334(caminhos["6334"], agregado, reference_month_year)
+        self._evento("Gerado CADOC 6334 (Estatístico) em %s", file_path_6334,
+                     cor="green", animacao=("CADOC 6334 Gerado", ("bcb",), None))
+        self._pausa(0.1)
+
+        self._evento_secao("--- FIM DOS REGULATÓRIOS ---",
+                           cor="white", animacao=("Relatórios Regulatórios Concluídos", ("bcb",), None))
+        self._pausa(0.5)
@@ -0,0 +1,208 @@
+# src/services/report_pipeline.py
+import os
+import time
+import shutil
+import logging
+import argparse
+import datetime
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+from src.models.entities import StatusTransacao, _CODIGO_POR_STATUS
+from src.models.transaction_table import TabelaTransacoes
+from src.services.aggregation import AgregadorTransacoes
+from src.services.file_generator import write_faturamento_3040_file_from_table
+from src.services.settlement_engine import MotorLiquidacao, escrever_cnab_pagamentos
+from src.services.regulatory_reporter import escrever_cadoc_3040, escrever_cadoc_5817, escrever_cadoc_6334, caminhos_cadoc
+
+logger = logging.getLogger(__name__)
+
+# Tabela aberta por snapshot em cada processo (mmap somente leitura, aberta uma vez por worker)
+_TABELAS = {}
+
+
+def _tabela(snapshot):
+    tabela = _TABELAS.get(snapshot)
+    if tabela is None:
+        tabela = _TABELAS[snapshot] = TabelaTransacoes.carregar(snapshot)
+    return tabela
+
+
+def _liquidadas(tabela):
+    return np.flatnonzero(tabela.coluna("status") == _CODIGO_POR_STATUS[StatusTransacao.LIQUIDATED])
+
+
+def _executar_no(funcao, snapshot, destino, args, dependencias):
+    """
+    Roda um nó no worker. Com destino, a função escreve em um arquivo temporário no mesmo
+    diretório, renomeado com os.replace só no fim (quem lê nunca vê um arquivo pela metade).
+    Retorna (resultado, duração em segundos).
+    """
+    inicio = time.perf_counter()
+    if destino is None:
+        return funcao(_tabela(snapshot), *args, **dependencias), time.perf_counter() - inicio
+    temporario = f"{destino}.tmp{os.getpid()}"
+    try:
+        resultado = funcao(_tabela(snapshot), temporario, *args, **dependencias)
+        if resultado is None: # Nada a gravar (ex.: nenhuma transação liquidada)
+            return None, time.perf_counter() - inicio
+        os.replace(temporario, destino)
+        return destino, time.perf_counter() - inicio
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+# Nós do fechamento do dia: recebem a tabela do snapshot, o arquivo de saída (temporário)
+# e os resultados das dependências como argumentos nomeados.
+def no_agregado(tabela):
+    return AgregadorTransacoes().consumir_tabela(tabela)
+
+
+def no_cadoc_3040(tabela, arquivo, reference_month_year):
+    return escrever_cadoc_3040(arquivo, reference_month_year)
+
+
+def no_cadoc_5817(tabela, arquivo, reference_month_year, adquirente, agregado):
+    return escrever_cadoc_5817(arquivo, agregado, reference_month_year, adquirente)
+
+
+def no_cadoc_6334(tabela, arquivo, reference_month_year, agregado):
+    return escrever_cadoc_6334(arquivo, agregado, reference_month_year)
+
+
+def no_faturamento_3040(tabela, arquivo):
+    return write_faturamento_3040_file_from_table(tabela, _liquidadas(tabela), arquivo)
+
+
+def no_pagamento_cnab(tabela, arquivo):
+    # Uma instrução por conta de estabelecimento, com o líquido da liquidação multilateral
+    return escrever_cnab_pagamentos(MotorLiquidacao().liquidar(tabela, _liquidadas(tabela)), arquivo)
+
+
+class PipelineRelatorios:
+    """
+    Grafo de dependências de arquivos de saída renderizados em paralelo em um pool de
+    processos, todos lendo o mesmo snapshot somente leitura da tabela de transações.
+    Cada nó é submetido assim que suas dependências terminam; o resultado de uma
+    dependência chega ao nó como argumento nomeado (nome do nó). processos=0 roda tudo
+    em sequência no próprio processo (útil para comparar).
+    """
+    def __init__(self, processos=None, contexto="spawn"):
+        self.processos = (os.cpu_count() or 1) if processos is None else processos
+        # "spawn" por padrão, como no ShardedSimulator: o filho não herda locks/threads do pai
+        self.contexto = multiprocessing.get_context(contexto)
+        self.nos = {} # nome -> (função, destino, args, dependências)
+        self.duracoes = {}
+
+    def adicionar(self, nome, funcao, *args, destino=None, depende_de=()):
+        if nome in self.nos:
+            raise ValueError(f"Nó {nome} já existe no pipeline.")
+        self.nos[nome] = (funcao, destino, args, tuple(depende_de))
+        return self
+
+    def ordem(self):
+        """Ordem topológica dos nós; ValueError para dependência desconhecida ou ciclo."""
+        pendentes = {}
+        for nome, (_, _, _, dependencias) in self.nos.items():
+            desconhecidas = set(dependencias) - set(self.nos)
+            if desconhecidas:
+                raise ValueError(f"Nó {nome} depende de nós inexistentes: {', '.join(sorted(desconhecidas))}")
+            pendentes[nome] = set(dependencias)
+        ordem = []
+        while pendentes:
+            prontos = [nome for nome, dependencias in pendentes.items() if not dependencias]
+            if not prontos:
+                raise ValueError(f"Ciclo de dependências entre: {', '.join(sorted(pendentes))}")
+            for nome in prontos:
+                del pendentes[nome]
+                ordem.append(nome)
+            for dependencias in pendentes.values():
+                dependencias.difference_update(prontos)
+        return ordem
+
+    def _argumentos(self, nome, snapshot, resultados):
+        funcao, destino, args, dependencias = self.nos[nome]
+        return funcao, snapshot, destino, args, {d: resultados[d] for d in dependencias}
+
+    def executar(self, snapshot):
+        """Roda o grafo sobre o snapshot (diretório de TabelaTransacoes.salvar); retorna {nome: resultado}."""
+        ordem = self.ordem()
+        resultados = {}
+        inicio = time.perf_counter()
+        if self.processos == 0:
+            for nome in ordem:
+                resultados[nome], self.duracoes[nome] = _executar_no(*self._argumentos(nome, snapshot, resultados))
+        else:
+            with ProcessPoolExecutor(max_workers=self.processos, mp_context=self.contexto) as pool:
+                em_execucao = {}
+                restantes = list(ordem)
+                while restantes or em_execucao:
+                    for nome in [n for n in restantes if all(d in resultados for d in self.nos[n][3])]:
+                        restantes.remove(nome)
+                        em_execucao[pool.submit(_executar_no, *self._argumentos(nome, snapshot, resultados))] = nome
+                    concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                    for futuro in concluidos:
+                        nome = em_execucao.pop(futuro)
+                        resultados[nome], self.duracoes[nome] = futuro.result()
+        self.duracao = time.perf_counter() - inicio
+        logger.info(f"PipelineRelatorios: {len(ordem)} nós em {self.duracao:.3f}s ({self.processos} processo(s)); "
+                    f"mais lento: {max(self.duracoes, key=self.duracoes.get)} ({max(self.duracoes.values()):.3f}s).")
+        return resultados
+
+
+def pipeline_fim_do_dia(output_dir, reference_month_year=None, adquirente="AdquirenteXPTO", data_arquivo=None,
+                        processos=None, contexto="spawn"):
+    """Grafo padrão do fechamento: CADOCs 3040/5817/6334 (5817 e 6334 sobre um agregado comum), faturamento 3040 e CNAB."""
+    reference_month_year = reference_month_year or datetime.date.today().strftime("%Y%m")
+    data_arquivo = data_arquivo or datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    caminhos = caminhos_cadoc(output_dir, reference_month_year)
+    pipeline = PipelineRelatorios(processos, contexto)
+    pipeline.adicionar("agregado", no_agregado)
+    pipeline.adicionar("cadoc_3040", no_cadoc_3040, reference_month_year, destino=caminhos["3040"])
+    pipeline.adicionar("cadoc_5817", no_cadoc_5817, reference_month_year, adquirente, destino=caminhos["5817"], depende_de=("agregado",))
+    pipeline.adicionar("cadoc_6334", no_cadoc_6334, reference_month_year, destino=caminhos["6334"], depende_de=("agregado",))
+    pipeline.adicionar("faturamento_3040", no_faturamento_3040,
+                       destino=os.path.join(output_dir, f"EMISSOR_FATURAMENTO_3040_SIMULADO_{data_arquivo}.xml"))
+    pipeline.adicionar("pagamento_cnab", no_pagamento_cnab,
+                       destino=os.path.join(output_dir, f"ADQUIRENTE_PAGAMENTO_CNAB_{data_arquivo}.txt"))
+    return pipeline
+
+
+def gerar_relatorios(tabela, output_dir, pipeline=None, **parametros):
+    """
+    Congela a tabela em um snapshot temporário dentro de output_dir, roda o pipeline
+    (padrão: pipeline_fim_do_dia) e remove o snapshot. Retorna {nome: arquivo gerado}.
+    """
+    pipeline = pipeline or pipeline_fim_do_dia(output_dir, **parametros)
+    snapshot = tempfile.mkdtemp(prefix=".snapshot_", dir=output_dir)
+    try:
+        tabela.salvar(snapshot)
+        return pipeline.executar(snapshot)
+    finally:
+        shutil.rmtree(snapshot, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # python -m src.services.report_pipeline --transacoes 1000000 --processos 4
+    from src.services.simulation import PaymentSimulator
+
+    parser = argparse.ArgumentParser(description="Geração paralela dos relatórios de fechamento a partir de um snapshot.")
+    parser.add_argument("--transacoes", type=int, default=500000)
+    parser.add_argument("--processos", type=int, nargs="+", default=[0, os.cpu_count() or 1])
+    parser.add_argument("--output-dir", default="data/output/")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    simulator = PaymentSimulator(output_dir=args.output_dir, pacing="unpaced", saldo_inicial=1e12)
+    simulator.run_authorization_load(args.transacoes, 1.00)
+    simulator.bandeira.processar_captura(simulator.adquirente.transacoes_aprovadas)
+    simulator.bandeira.iniciar_liquidacao(simulator.adquirente, simulator.emissor, args.output_dir)
+    for processos in args.processos:
+        pipeline = pipeline_fim_do_dia(args.output_dir, adquirente=simulator.adquirente.nome, processos=processos)
+        gerar_relatorios(simulator.tabela, args.output_dir, pipeline)
+        mais_lento = max(pipeline.duracoes.values())
+        print(f"{processos:>2} processo(s): {pipeline.duracao:.3f}s (nó mais lento: {mais_lento:.3f}s; "
+              f"soma dos nós: {sum(pipeline.duracoes.values()):.3f}s)")
@@ -0,0 +1,254 @@
+# src/services/settlement_engine.py
+import os
+import re
+import time
+import zlib
+import logging
+import argparse
+import datetime
+import tempfile
+import numpy as np
+
+from src.services.file_generator import write_consolidated_payment_cnab_file, TAMANHO_CHUNK_PADRAO
+
+logger = logging.getLogger(__name__)
+
+# Tarifas em pontos-base (1 bp = 0,01%) sobre o valor de cada transação, por tipo de cartão
+MDR_PADRAO_BPS = {"credito": 199, "debito": 99} # Cobrado do estabelecimento pela adquirente
+INTERCAMBIO_PADRAO_BPS = {"credito": 140, "debito": 50} # Pago pela adquirente ao emissor
+TAXA_BANDEIRA_BPS = 5 # Cobrada da adquirente pela bandeira
+
+# Domicílio bancário dos estabelecimentos sem conta cadastrada (o antigo fixo do CNAB)
+BANCO_PADRAO = 1
+AGENCIA_PADRAO = 1234
+
+_BPS = 10_000
+_DIGITOS_FINAIS = re.compile(r"(\d+)$")
+
+
+def tarifa_centavos(valores_centavos, bps):
+    """Tarifa em centavos inteiros, arredondada meio para cima (valores e bps em int64, vetorizado)."""
+    return (valores_centavos * bps + _BPS // 2) // _BPS
+
+
+def conta_padrao(estabelecimento_id):
+    """Conta (banco, agência, conta) derivada do id: dígitos finais do id ou, sem eles, um CRC32."""
+    digitos = _DIGITOS_FINAIS.search(estabelecimento_id)
+    conta = int(digitos.group(1)) if digitos else zlib.crc32(estabelecimento_id.encode("utf-8"))
+    return BANCO_PADRAO, AGENCIA_PADRAO, conta % 100_000_000
+
+
+class TabelaTarifas:
+    """
+    MDR e intercâmbio em bps por tipo de cartão, com condições negociadas por
+    estabelecimento (estabelecimento_id -> {tipo: bps}) sobrepondo o padrão, e a taxa
+    da bandeira. matrizes() resolve tudo para os códigos de uma TabelaTransacoes.
+    """
+    def __init__(self, mdr_bps=None, intercambio_bps=None, taxa_bandeira_bps=TAXA_BANDEIRA_BPS,
+                 mdr_por_estabelecimento=None, intercambio_por_estabelecimento=None):
+        self.mdr_bps = dict(MDR_PADRAO_BPS if mdr_bps is None else mdr_bps)
+        self.intercambio_bps = dict(INTERCAMBIO_PADRAO_BPS if intercambio_bps is None else intercambio_bps)
+        self.taxa_bandeira_bps = taxa_bandeira_bps
+        self.mdr_por_estabelecimento = {e: dict(t) for e, t in (mdr_por_estabelecimento or {}).items()}
+        self.intercambio_por_estabelecimento = {e: dict(t) for e, t in (intercambio_por_estabelecimento or {}).items()}
+        for bps in (*self.mdr_bps.values(), *self.intercambio_bps.values(), taxa_bandeira_bps):
+            self._validar(bps)
+
+    @staticmethod
+    def _validar(bps):
+        if not 0 <= bps <= _BPS:
+            raise ValueError(f"Tarifa fora de 0 a {_BPS} bps: {bps}")
+
+    def definir_mdr(self, estabelecimento_id, tipo, bps):
+        self._validar(bps)
+        self.mdr_por_estabelecimento.setdefault(estabelecimento_id, {})[tipo] = bps
+
+    def definir_intercambio(self, estabelecimento_id, tipo, bps):
+        self._validar(bps)
+        self.intercambio_por_estabelecimento.setdefault(estabelecimento_id, {})[tipo] = bps
+
+    def _matriz(self, padrao, excecoes, estabelecimentos, tipos):
+        nomes_tipos = [tipos.valor(codigo) for codigo in range(len(tipos))]
+        faltando = [tipo for tipo in nomes_tipos if tipo not in padrao]
+        if faltando:
+            raise ValueError(f"Sem tarifa padrão para o(s) tipo(s) de cartão: {', '.join(faltando)}")
+        matriz = np.empty((max(len(estabelecimentos), 1), max(len(tipos), 1)), dtype=np.int64)
+        matriz[:, :len(tipos)] = [padrao[tipo] for tipo in nomes_tipos]
+        for codigo in range(len(estabelecimentos)):
+            negociadas = excecoes.get(estabelecimentos.valor(codigo))
+            if negociadas:
+                for codigo_tipo, tipo in enumerate(nomes_tipos):
+                    if tipo in negociadas:
+                        matriz[codigo, codigo_tipo] = negociadas[tipo]
+        return matriz
+
+    def matrizes(self, tabela):
+        """(mdr, intercâmbio) em bps indexados por [código do estabelecimento, código do tipo] da tabela."""
+        return (self._matriz(self.mdr_bps, self.mdr_por_estabelecimento, tabela.estabelecimentos, tabela.tipos),
+                self._matriz(self.intercambio_bps, self.intercambio_por_estabelecimento, tabela.estabelecimentos, tabela.tipos))
+
+    def __repr__(self):
+        return (f"TabelaTarifas(mdr={self.mdr_bps}, intercambio={self.intercambio_bps}, bandeira={self.taxa_bandeira_bps}bps, "
+                f"{len(self.mdr_por_estabelecimento) + len(self.intercambio_por_estabelecimento)} condições negociadas)")
+
+
+class ResultadoLiquidacao:
+    """
+    Posições líquidas de uma janela de liquidação, em centavos. Convenção: positivo é
+    a receber, negativo a pagar; a soma das posições de todos os participantes é zero.
+    """
+    def __init__(self, adquirente, bandeira, estabelecimento_ids, quantidades, bruto, mdr, emissores):
+        self.adquirente = adquirente
+        self.bandeira = bandeira
+        # Por estabelecimento (só os que tiveram transações na janela), arrays alinhados
+        self.estabelecimento_ids = estabelecimento_ids
+        self.quantidades = quantidades
+        self.bruto = bruto
+        self.mdr = mdr
+        self.liquido = bruto - mdr
+        self.emissores = emissores # nome -> {"quantidade", "bruto", "intercambio", "taxa_bandeira"}
+        self.transacoes = int(quantidades.sum())
+        self.bruto_total = int(bruto.sum())
+        self.mdr_total = int(mdr.sum())
+        self.intercambio_total = sum(e["intercambio"] for e in emissores.values())
+        self.taxa_bandeira_total = sum(e["taxa_bandeira"] for e in emissores.values())
+
+    def posicoes(self):
+        """Lista de (participante, papel, posição em centavos) de todos os participantes."""
+        posicoes = [(self.adquirente, "adquirente", self.mdr_total - self.intercambio_total - self.taxa_bandeira_total),
+                    (self.bandeira, "bandeira", self.taxa_bandeira_total)]
+        posicoes.extend((nome, "emissor", -(e["bruto"] - e["intercambio"])) for nome, e in sorted(self.emissores.items()))
+        posicoes.extend(zip(self.estabelecimento_ids, ["estabelecimento"] * len(self.estabelecimento_ids), self.liquido.tolist()))
+        return posicoes
+
+    def conferir(self):
+        """Garante que a liquidação fecha: as posições somam zero."""
+        saldo = sum(posicao for _, _, posicao in self.posicoes())
+        if saldo != 0:
+            raise ValueError(f"Liquidação não fecha: posições somam {saldo} centavos.")
+        return self
+
+    def instrucoes_pagamento(self, contas=None, data=None):
+        """
+        Uma instrução por conta de destino (estabelecimentos da mesma conta são somados):
+        tuplas (banco, agência, conta, quantidade, bruto, tarifas, líquido, id_instrucao) no
+        layout cnab_c. contas: estabelecimento_id -> (banco, agência, conta); sem cadastro, conta_padrao.
+        """
+        if not len(self.estabelecimento_ids):
+            return []
+        contas = contas or {}
+        domicilios = np.array([contas.get(e) or conta_padrao(e) for e in self.estabelecimento_ids], dtype=np.int64)
+        chave = (domicilios[:, 0] * 10_000 + domicilios[:, 1]) * 100_000_000 + domicilios[:, 2]
+        unicas, inverso = np.unique(chave, return_inverse=True)
+        somas = np.zeros((len(unicas), 3), dtype=np.int64)
+        np.add.at(somas, inverso, np.column_stack((self.quantidades, self.bruto, self.mdr)))
+        data = (data or datetime.date.today()).strftime("%Y%m%d")
+        return [(domicilio // 1_000_000_000_000, domicilio // 100_000_000 % 10_000, domicilio % 100_000_000,
+                 quantidade, bruto, mdr, bruto - mdr, f"PG{data}{sequencia:06d}")
+                for sequencia, (domicilio, (quantidade, bruto, mdr)) in enumerate(zip(unicas.tolist(), somas.tolist()), 1)]
+
+    def resumo(self):
+        return (f"{self.transacoes} transações, bruto R${self.bruto_total / 100:.2f}, MDR R${self.mdr_total / 100:.2f}, "
+                f"intercâmbio R${self.intercambio_total / 100:.2f}, bandeira R${self.taxa_bandeira_total / 100:.2f}, "
+                f"{len(self.estabelecimento_ids)} estabelecimentos")
+
+    def __repr__(self):
+        return f"ResultadoLiquidacao({self.resumo()})"
+
+
+class MotorLiquidacao:
+    """
+    Liquidação multilateral líquida a partir das colunas da TabelaTransacoes: MDR,
+    intercâmbio e taxa da bandeira calculados em centavos inteiros e somados por
+    estabelecimento e por emissor numa única passada vetorizada (em chunks). Em vez de
+    um crédito por transação, cada participante fica com uma posição líquida.
+
+    emissor_por_bin (bin -> nome do emissor) reparte as transações entre emissores; BINs
+    fora dele ficam com o emissor informado em liquidar.
+    """
+    def __init__(self, tarifas=None, emissor_por_bin=None, tamanho_chunk=1 << 16):
+        self.tarifas = tarifas or TabelaTarifas()
+        self.emissor_por_bin = {str(b).encode("ascii"): e for b, e in (emissor_por_bin or {}).items()}
+        self.tamanho_chunk = tamanho_chunk
+
+    def _emissores(self, bins, emissor, nomes):
+        """Código (posição em `nomes`) do emissor de cada linha, pelo BIN."""
+        if not self.emissor_por_bin:
+            return np.zeros(len(bins), dtype=np.int64)
+        unicos, inverso = np.unique(bins, return_inverse=True)
+        codigos = []
+        for bin_ in unicos.tolist():
+            nome = self.emissor_por_bin.get(bin_, emissor)
+            if nome not in nomes:
+                nomes[nome] = len(nomes)
+            codigos.append(nomes[nome])
+        return np.asarray(codigos, dtype=np.int64)[inverso]
+
+    def liquidar(self, tabela, linhas, adquirente="ADQUIRENTE", emissor="EMISSOR", bandeira="BANDEIRA"):
+        """Posições líquidas das `linhas` da tabela (ex.: as capturadas da janela); retorna ResultadoLiquidacao conferido."""
+        linhas = np.asarray(linhas, dtype=np.int64)
+        mdr_bps, intercambio_bps = self.tarifas.matrizes(tabela)
+        estabelecimentos = len(mdr_bps)
+        quantidades = np.zeros(estabelecimentos, dtype=np.int64)
+        bruto = np.zeros(estabelecimentos, dtype=np.int64)
+        mdr = np.zeros(estabelecimentos, dtype=np.int64)
+        nomes = {emissor: 0}
+        por_emissor = np.zeros((0, 4), dtype=np.int64) # quantidade, bruto, intercâmbio, taxa da bandeira
+        for inicio in range(0, len(linhas), self.tamanho_chunk):
+            chunk = linhas[inicio:inicio + self.tamanho_chunk]
+            estab = tabela.estabelecimento[chunk]
+            tipo = tabela.tipo[chunk]
+            valor = tabela.valor_centavos[chunk]
+            np.add.at(quantidades, estab, 1)
+            np.add.at(bruto, estab, valor)
+            np.add.at(mdr, estab, tarifa_centavos(valor, mdr_bps[estab, tipo]))
+            codigos = self._emissores(tabela.bin[chunk], emissor, nomes)
+            if len(por_emissor) < len(nomes):
+                por_emissor = np.vstack((por_emissor, np.zeros((len(nomes) - len(por_emissor), 4), dtype=np.int64)))
+            np.add.at(por_emissor, codigos, np.column_stack((np.ones(len(chunk), dtype=np.int64), valor,
+                                                              tarifa_centavos(valor, intercambio_bps[estab, tipo]),
+                                                              tarifa_centavos(valor, self.tarifas.taxa_bandeira_bps))))
+        ativos = np.flatnonzero(quantidades)
+        emissores = {nome: dict(zip(("quantidade", "bruto", "intercambio", "taxa_bandeira"), por_emissor[codigo].tolist()))
+                     for nome, codigo in nomes.items() if codigo < len(por_emissor) and por_emissor[codigo, 0]}
+        resultado = ResultadoLiquidacao(adquirente, bandeira, [tabela.estabelecimentos.valor(c) for c in ativos.tolist()],
+                                        quantidades[ativos], bruto[ativos], mdr[ativos], emissores).conferir()
+        logger.info(f"MotorLiquidacao: {resultado.resumo()}.")
+        return resultado
+
+
+def escrever_cnab_pagamentos(resultado, arquivo, contas=None, data=None, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """CNAB de pagamento consolidado (uma linha por conta de estabelecimento); None se não houver pagamentos."""
+    return write_consolidated_payment_cnab_file(resultado.instrucoes_pagamento(contas, data), arquivo, tamanho_chunk)
+
+
+if __name__ == "__main__":
+    # python -m src.services.settlement_engine --transacoes 1000000
+    from src.services.simulation import PaymentSimulator
+    from src.services.file_generator import write_payment_cnab_file_from_table
+    from src.models.entities import StatusTransacao, _CODIGO_POR_STATUS
+
+    parser = argparse.ArgumentParser(description="Liquidação multilateral líquida de um dia de carga sintética.")
+    parser.add_argument("--transacoes", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    simulator = PaymentSimulator(pacing="unpaced", seed=args.seed, saldo_inicial=1e9)
+    simulator.run_workload(args.transacoes)
+    tabela = simulator.tabela
+    linhas = np.flatnonzero(tabela.coluna("status") == _CODIGO_POR_STATUS[StatusTransacao.APROVADA])
+
+    inicio = time.perf_counter()
+    resultado = MotorLiquidacao().liquidar(tabela, linhas, simulator.adquirente.nome, simulator.emissor.nome, simulator.bandeira.nome)
+    duracao = time.perf_counter() - inicio
+    print(f"{resultado.resumo()} em {duracao:.3f}s ({len(linhas) / duracao:.0f} transações/s)")
+    for participante, papel, posicao in resultado.posicoes()[:3]:
+        print(f"  {papel:<10} {participante:<20} {posicao / 100:>18,.2f}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome, escrever in (("por transação", lambda f: write_payment_cnab_file_from_table(tabela, linhas, f)),
+                               ("consolidado", lambda f: escrever_cnab_pagamentos(resultado, f))):
+            arquivo = os.path.join(diretorio, "cnab.txt")
+            inicio = time.perf_counter()
+            escrever(arquivo)
+            print(f"CNAB {nome:<14} {os.path.getsize(arquivo) / 1e6:>10.3f} MB em {time.perf_counter() - inicio:.3f}s")
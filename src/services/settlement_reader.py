@@ -0,0 +1,146 @@
+# src/services/settlement_reader.py
+import mmap
+import os
+import logging
+import numpy as np
+
+from src.services.layouts import get_layout
+
+logger = logging.getLogger(__name__)
+
+# Registros convertidos por vez: só as colunas de um chunk são copiadas para a memória,
+# o restante do arquivo fica no page cache via mmap.
+TAMANHO_CHUNK_PADRAO = 1 << 16
+
+
+def iter_registros(caminho, layout, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """
+    Mapeia o arquivo em memória e devolve, chunk a chunk, views estruturadas (sem cópia)
+    dos registros de largura fixa do layout. Um registro incompleto no final gera ValueError.
+    """
+    layout = get_layout(layout) if isinstance(layout, str) else layout
+    tamanho = os.path.getsize(caminho)
+    if tamanho % layout.tamanho:
+        raise ValueError(f"{caminho}: tamanho {tamanho} não é múltiplo do registro {layout.nome} ({layout.tamanho} bytes).")
+    if tamanho == 0:
+        return
+    with open(caminho, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Sem close explícito: as views do NumPy mantêm o mmap vivo enquanto forem usadas
+    # e ele é liberado quando a última sair de escopo.
+    registros = layout.decode_lote(mm)
+    del mm
+    for inicio in range(0, len(registros), tamanho_chunk):
+        yield registros[inicio:inicio + tamanho_chunk]
+
+
+class IndiceConciliacao:
+    """Índice hash id_transacao -> posição, com o valor esperado (centavos) de cada transação."""
+    def __init__(self, ids, valores_centavos):
+        self.ids = list(ids)
+        self.posicoes = {txn_id: posicao for posicao, txn_id in enumerate(self.ids)}
+        self.valores_centavos = np.asarray(valores_centavos, dtype=np.int64)
+
+    @classmethod
+    def de_transacoes(cls, transacoes):
+        """
+        Aceita uma ListaTransacoes/MapaTransacoes (lida direto das colunas da tabela) ou
+        qualquer iterável de objetos com id e valor.
+        """
+        tabela = getattr(transacoes, "_tabela", None)
+        if tabela is not None:
+            linhas = transacoes.linhas
+            return cls(tabela.ids[linhas].tolist(), tabela.valor_centavos[linhas])
+        ids, valores = [], []
+        for transacao in transacoes:
+            ids.append(transacao.id.encode("ascii"))
+            valores.append(round(transacao.valor * 100))
+        return cls(ids, valores)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class RelatorioConciliacao:
+    """
+    Resultado da conciliação de um arquivo: contadores por tipo de divergência e uma
+    amostra limitada de ids de cada tipo (para a memória não crescer com o arquivo).
+    """
+    LIMITE_AMOSTRA = 1000
+
+    def __init__(self, arquivo, layout):
+        self.arquivo = arquivo
+        self.layout = layout
+        self.registros_lidos = 0
+        self.conciliados = 0 # Transações esperadas que vieram no arquivo com o valor autorizado (uma vez por id)
+        self.faltantes = 0 # Esperados que não vieram no arquivo
+        self.duplicados = 0 # Cópias extras de ids esperados
+        self.divergentes = 0 # Valor do arquivo diferente do autorizado
+        self.inesperados = 0 # Registros sem transação correspondente (cada cópia conta)
+        self.amostras = {"faltantes": [], "duplicados": [], "divergentes": [], "inesperados": []}
+
+    def _amostrar(self, tipo, itens):
+        amostra = self.amostras[tipo]
+        espaco = self.LIMITE_AMOSTRA - len(amostra)
+        if espaco > 0:
+            amostra.extend(itens[:espaco])
+
+    @property
+    def ok(self):
+        return not (self.faltantes or self.duplicados or self.divergentes or self.inesperados)
+
+    def resumo(self):
+        return (f"{self.registros_lidos} registros, {self.conciliados} conciliados, {self.faltantes} faltantes, "
+                f"{self.duplicados} duplicados, {self.divergentes} com valor divergente, {self.inesperados} inesperados")
+
+    def __repr__(self):
+        return f"RelatorioConciliacao({os.path.basename(self.arquivo)}: {self.resumo()})"
+
+
+def conciliar_arquivo(caminho, layout, indice, tamanho_chunk=TAMANHO_CHUNK_PADRAO):
+    """
+    Concilia um arquivo de liquidação (layout "liquidacao_adq" ou "liquidacao_emissor")
+    contra as transações autorizadas/capturadas do índice. Lê o arquivo via mmap em chunks,
+    então arquivos de vários GB são processados com memória limitada ao índice + um chunk.
+    Ids fora do índice não são guardados (só a amostra): cada registro deles conta como
+    inesperado, e duplicados são detectados entre os ids esperados.
+    """
+    layout = get_layout(layout) if isinstance(layout, str) else layout
+    relatorio = RelatorioConciliacao(caminho, layout.nome)
+    vistos = np.zeros(len(indice), dtype=np.uint32)
+    batidos = np.zeros(len(indice), dtype=bool) # Vieram ao menos uma vez com o valor autorizado
+    posicao_de = indice.posicoes.get
+
+    for registros in iter_registros(caminho, layout, tamanho_chunk):
+        ids = np.char.rstrip(registros["id_transacao"], b" ").tolist()
+        valores = registros["valor_centavos"].astype(np.int64)
+        posicoes = np.fromiter((posicao_de(txn_id, -1) for txn_id in ids), dtype=np.int64, count=len(ids))
+        relatorio.registros_lidos += len(ids)
+
+        conhecidos = posicoes >= 0
+        posicoes_conhecidas = posicoes[conhecidos]
+        np.add.at(vistos, posicoes_conhecidas, 1)
+
+        divergentes = valores[conhecidos] != indice.valores_centavos[posicoes_conhecidas]
+        batidos[posicoes_conhecidas[~divergentes]] = True
+        if divergentes.any():
+            relatorio.divergentes += int(divergentes.sum())
+            esperado = indice.valores_centavos[posicoes_conhecidas[divergentes]].tolist()
+            no_arquivo = valores[conhecidos][divergentes].tolist()
+            ids_divergentes = [indice.ids[p].decode("ascii") for p in posicoes_conhecidas[divergentes][:RelatorioConciliacao.LIMITE_AMOSTRA]]
+            relatorio._amostrar("divergentes", list(zip(ids_divergentes, esperado, no_arquivo)))
+
+        desconhecidos = np.flatnonzero(~conhecidos)
+        if len(desconhecidos):
+            relatorio.inesperados += len(desconhecidos)
+            relatorio._amostrar("inesperados", [ids[p].decode("ascii") for p in desconhecidos[:RelatorioConciliacao.LIMITE_AMOSTRA].tolist()])
+
+    faltantes = np.flatnonzero(vistos == 0)
+    duplicados = np.flatnonzero(vistos > 1)
+    relatorio.conciliados = int(batidos.sum())
+    relatorio.faltantes = len(faltantes)
+    relatorio.duplicados += int((vistos[duplicados] - 1).sum())
+    relatorio._amostrar("faltantes", [indice.ids[p].decode("ascii") for p in faltantes[:RelatorioConciliacao.LIMITE_AMOSTRA].tolist()])
+    relatorio._amostrar("duplicados", [indice.ids[p].decode("ascii") for p in duplicados[:RelatorioConciliacao.LIMITE_AMOSTRA].tolist()])
+    logger.info(f"Conciliação {relatorio}")
+    return relatorio
@@ -0,0 +1,255 @@
+# src/services/sharded_runner.py
+import os
+import time
+import zlib
+import random
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from src.models.entities import Adquirente, Emissor, Bandeira, Estabelecimento, Portador, StatusTransacao
+from src.models.id_allocator import ALOCADOR_PADRAO, configurar_alocador_padrao
+from src.models.transaction_table import TabelaTransacoes
+from src.services.chargeback_processor import ChargebackProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def shard_de(entidade_id, total_shards):
+    """Shard dono de um portador/estabelecimento: crc32 do id (estável entre processos, ao contrário de hash())."""
+    return zlib.crc32(entidade_id.encode("utf-8")) % total_shards
+
+
+def id_portador(indice):
+    return f"PORT{indice:07d}"
+
+
+def id_estabelecimento(indice):
+    return f"ESTAB{indice:06d}"
+
+
+def _carga_do_portador(seed, indice, quantidade, total_estabelecimentos):
+    """
+    Compras de um portador: valores (centavos), estabelecimentos e sorteio de chargeback.
+    Cada portador tem o próprio gerador (seed, índice), então a carga não depende do
+    número de shards nem da ordem em que os shards rodam.
+    """
+    rng = np.random.default_rng([seed, indice])
+    valores = rng.integers(500, 50_000, size=quantidade) # R$ 5,00 a R$ 500,00
+    estabelecimentos = rng.integers(0, total_estabelecimentos, size=quantidade)
+    sorteio_chargeback = rng.random(quantidade)
+    return valores, estabelecimentos, sorteio_chargeback
+
+
+def _rng_disputa(seed, indice):
+    """Gerador da decisão da disputa da transação global `indice`: não depende do shard que a processa."""
+    return random.Random(f"disputa:{seed}:{indice}")
+
+
+def executar_shard(shard, total_shards, total_transacoes, total_portadores=10_000, total_estabelecimentos=100,
+                   seed=42, taxa_chargeback=0.005, output_dir=None, no=None):
+    """
+    Roda um shard completo (autorização → captura → liquidação → chargebacks) com entidades
+    próprias, sem pacing e sem log. A transação i da carga global pertence ao portador
+    i % total_portadores; o shard processa as transações dos portadores que são seus.
+    Retorna um dict serializável com os resultados parciais para o merge.
+    """
+    inicio = time.perf_counter()
+    alocador = configurar_alocador_padrao(no or ALOCADOR_PADRAO.no, shard) # Entidades sem alocador usam o do shard
+    tabela = TabelaTransacoes()
+    adquirente = Adquirente(f"Adquirente-{shard:02d}", pacing="unpaced", alocador=alocador)
+    emissor = Emissor(f"Emissor-{shard:02d}", pacing="unpaced")
+    bandeira = Bandeira(f"Bandeira-{shard:02d}", pacing="unpaced", seed=seed) # rng trocado por disputa (ver _rng_disputa)
+    cb_processor = ChargebackProcessor(output_dir=output_dir, pacing="unpaced")
+
+    # Transações da carga global que caem neste shard, na ordem global de chegada
+    indices, valores, estabs, sorteios = [], [], [], []
+    portadores = {}
+    for indice in range(total_portadores):
+        portador_id = id_portador(indice)
+        if shard_de(portador_id, total_shards) != shard:
+            continue
+        quantidade = total_transacoes // total_portadores + (indice < total_transacoes % total_portadores)
+        if quantidade == 0:
+            continue
+        portador = Portador(portador_id, portador_id, pacing="unpaced")
+        portadores[portador_id] = portador
+        emissor.cadastrar_portador(portador)
+        v, e, s = _carga_do_portador(seed, indice, quantidade, total_estabelecimentos)
+        indices.append(indice + np.arange(quantidade, dtype=np.int64) * total_portadores)
+        valores.append(v)
+        estabs.append(e)
+        sorteios.append(s)
+
+    estabelecimentos = {}
+    aprovadas = 0
+    chargebacks_a_abrir = []
+    if indices:
+        indices = np.concatenate(indices)
+        ordem = np.argsort(indices, kind="stable")
+        indices, valores = indices[ordem], np.concatenate(valores)[ordem]
+        estabs, sorteios = np.concatenate(estabs)[ordem], np.concatenate(sorteios)[ordem]
+
+        for indice, valor_centavos, estab_indice, sorteio in zip(indices.tolist(), valores.tolist(), estabs.tolist(), sorteios.tolist()):
+            estab_id = id_estabelecimento(estab_indice)
+            estabelecimento = estabelecimentos.get(estab_id)
+            if estabelecimento is None:
+                # Estabelecimentos não têm estado de autorização: cada shard cria os que usa
+                # e o merge soma os lotes de captura por estabelecimento.
+                estabelecimento = Estabelecimento(estab_id, estab_id, pacing="unpaced", tabela=tabela, alocador=alocador)
+                estabelecimentos[estab_id] = estabelecimento
+                adquirente.cadastrar_estabelecimento(estabelecimento)
+            portador = portadores[id_portador(indice % total_portadores)]
+            if estabelecimento.iniciar_transacao(portador, valor_centavos / 100, adquirente, bandeira, emissor):
+                aprovadas += 1
+                if sorteio < taxa_chargeback:
+                    chargebacks_a_abrir.append((indice, estabelecimento, len(estabelecimento.transacoes) - 1))
+
+    # Captura e liquidação do shard
+    if len(adquirente.transacoes_aprovadas):
+        bandeira.processar_captura(adquirente.transacoes_aprovadas)
+        adquirente.limpar_transacoes_aprovadas()
+    linhas = bandeira.transacoes_capturadas.linhas
+    lotes_captura = {}
+    if len(linhas):
+        codigos = tabela.estabelecimento[linhas]
+        quantidades = np.bincount(codigos, minlength=len(tabela.estabelecimentos))
+        totais = np.zeros(len(tabela.estabelecimentos), dtype=np.int64) # Centavos exatos (bincount com pesos usaria float)
+        np.add.at(totais, codigos, tabela.valor_centavos[linhas])
+        for codigo in np.flatnonzero(quantidades).tolist():
+            lotes_captura[tabela.estabelecimentos.valor(codigo)] = (int(quantidades[codigo]), int(totais[codigo]))
+    valor_liquidado = int(tabela.valor_centavos[linhas].sum()) if len(linhas) else 0
+
+    diretorio_shard = None
+    if output_dir is not None:
+        diretorio_shard = os.path.join(output_dir, f"shard_{shard:02d}")
+        os.makedirs(diretorio_shard, exist_ok=True)
+    bandeira.iniciar_liquidacao(adquirente, emissor, diretorio_shard)
+    conciliacoes = [getattr(entidade, "ultima_conciliacao", None) for entidade in (adquirente, emissor)]
+    conciliado = None if None in conciliacoes else all(relatorio.ok for relatorio in conciliacoes)
+
+    # Chargebacks sorteados entre as aprovadas; cada disputa decide com o gerador da sua
+    # transação global, então o resultado é o mesmo com qualquer número de shards
+    chargebacks = []
+    for indice, estabelecimento, posicao in chargebacks_a_abrir:
+        transacao = estabelecimento.transacoes[posicao]
+        portador = portadores[transacao.portador_id]
+        bandeira.rng = _rng_disputa(seed, indice)
+        cb_processor.processar_chargeback(portador, emissor, bandeira, adquirente, estabelecimento, transacao)
+        dados = emissor.chargebacks[transacao.id]
+        if "Portador" in dados["resolucao"]:
+            transacao.status = StatusTransacao.REVERSED
+        chargebacks.append((indice, dados["cb_id"], transacao.id, estabelecimento.id, transacao.valor_centavos, dados["resolucao"]))
+
+    duracao = time.perf_counter() - inicio
+    transacoes = len(tabela)
+    return {
+        "shard": shard,
+        "portadores": len(portadores),
+        "estabelecimentos": len(estabelecimentos),
+        "transacoes": transacoes,
+        "aprovadas": aprovadas,
+        "negadas": transacoes - aprovadas,
+        "duracao_s": duracao,
+        "tps": transacoes / duracao if duracao > 0 else float("inf"),
+        "lotes_captura": lotes_captura,
+        "liquidacao": {"transacoes": int(len(linhas)), "valor_centavos": valor_liquidado, "conciliado": conciliado},
+        "chargebacks": chargebacks,
+    }
+
+
+def merge_resultados(parciais):
+    """
+    Junta os resultados dos shards de forma determinística: soma os contadores, soma os
+    lotes de captura por estabelecimento (ordenados por id) e ordena os chargebacks pelo
+    índice global da transação (os ids levam o prefixo do shard).
+    """
+    parciais = sorted(parciais, key=lambda parcial: parcial["shard"])
+    lotes = {}
+    for parcial in parciais:
+        for estab_id, (quantidade, centavos) in parcial["lotes_captura"].items():
+            total = lotes.setdefault(estab_id, [0, 0])
+            total[0] += quantidade
+            total[1] += centavos
+    conciliados = [parcial["liquidacao"]["conciliado"] for parcial in parciais]
+    return {
+        "shards": len(parciais),
+        "transacoes": sum(parcial["transacoes"] for parcial in parciais),
+        "aprovadas": sum(parcial["aprovadas"] for parcial in parciais),
+        "negadas": sum(parcial["negadas"] for parcial in parciais),
+        "lotes_captura": {estab_id: tuple(lotes[estab_id]) for estab_id in sorted(lotes)},
+        "liquidacao": {
+            "transacoes": sum(parcial["liquidacao"]["transacoes"] for parcial in parciais),
+            "valor_centavos": sum(parcial["liquidacao"]["valor_centavos"] for parcial in parciais),
+            "conciliado": None if None in conciliados else all(conciliados),
+        },
+        "chargebacks": sorted(cb for parcial in parciais for cb in parcial["chargebacks"]),
+        "tps_shards": [parcial["tps"] for parcial in sorted(parciais, key=lambda parcial: parcial["shard"])],
+    }
+
+
+class ShardedSimulator:
+    """
+    Simulação particionada: os portadores são distribuídos por hash do id entre shards, e
+    cada shard roda em um processo do pool com seu próprio pipeline de autorização/captura/
+    liquidação e seu próprio AlocadorIds (prefixo de shard, sem colisão). A transação é
+    roteada para o shard do portador, dono do saldo. Os estabelecimentos não são
+    particionados: não guardam estado que decida a autorização, então cada shard cria os
+    que usa e o merge soma os lotes de captura por estabelecimento. Com a mesma seed, os
+    totais (inclusive as decisões dos chargebacks) não dependem do número de shards.
+    """
+    def __init__(self, shards=None, total_portadores=10_000, total_estabelecimentos=100, seed=42,
+                 taxa_chargeback=0.005, output_dir=None, processos=None, contexto="spawn"):
+        self.shards = shards or os.cpu_count() or 1
+        self.total_portadores = total_portadores
+        self.total_estabelecimentos = total_estabelecimentos
+        self.seed = seed
+        self.taxa_chargeback = taxa_chargeback
+        self.output_dir = output_dir
+        self.processos = processos or min(self.shards, os.cpu_count() or 1)
+        # "spawn" por padrão: o filho não herda locks/threads do pai (ver AlocadorIds)
+        self.contexto = multiprocessing.get_context(contexto)
+
+    def run(self, total_transacoes):
+        parametros = dict(total_transacoes=total_transacoes, total_portadores=self.total_portadores,
+                          total_estabelecimentos=self.total_estabelecimentos, seed=self.seed,
+                          taxa_chargeback=self.taxa_chargeback, output_dir=self.output_dir, no=ALOCADOR_PADRAO.no)
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.processos, mp_context=self.contexto) as pool:
+            futuros = [pool.submit(executar_shard, shard, self.shards, **parametros) for shard in range(self.shards)]
+            parciais = [futuro.result() for futuro in futuros]
+        duracao = time.perf_counter() - inicio
+
+        resultado = merge_resultados(parciais)
+        resultado["processos"] = self.processos
+        resultado["duracao_s"] = duracao
+        resultado["tps"] = resultado["transacoes"] / duracao if duracao > 0 else float("inf")
+        logger.info(f"ShardedSimulator: {resultado['transacoes']} transações em {self.shards} shard(s) / "
+                    f"{self.processos} processo(s): {duracao:.3f}s ({resultado['tps']:.0f} TPS).")
+        return resultado
+
+
+if __name__ == "__main__":
+    # python -m src.services.sharded_runner --shards 8 --transacoes 1000000
+    parser = argparse.ArgumentParser(description="Simulação particionada em múltiplos processos.")
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--transacoes", type=int, default=200000)
+    parser.add_argument("--portadores", type=int, default=10000)
+    parser.add_argument("--estabelecimentos", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--taxa-chargeback", type=float, default=0.005)
+    parser.add_argument("--output-dir", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    simulador = ShardedSimulator(args.shards, args.portadores, args.estabelecimentos, args.seed,
+                                 args.taxa_chargeback, args.output_dir, args.processos)
+    resultado = simulador.run(args.transacoes)
+    liquidacao = resultado["liquidacao"]
+    print(f"{resultado['transacoes']} transações ({resultado['aprovadas']} aprovadas) em {resultado['shards']} shard(s): "
+          f"{resultado['duracao_s']:.3f}s - {resultado['tps']:.0f} TPS")
+    print(f"Liquidação: {liquidacao['transacoes']} transações, R$ {liquidacao['valor_centavos'] / 100:.2f} "
+          f"(conciliado: {liquidacao['conciliado']}); chargebacks: {len(resultado['chargebacks'])}")
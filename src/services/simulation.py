@@ -1,116 +1,259 @@
 import time
+import random
 import datetime
 import logging
-from src.models.entities import Adquirente, Emissor, Bandeira, Estabelecimento, Portador, Transacao, StatusTransacao
+import argparse
+import numpy as np
+from src.models.entities import Adquirente, Emissor, Bandeira, Estabelecimento, Portador, Transacao, StatusTransacao, _CODIGO_POR_STATUS
+from src.models.transaction_table import TabelaTransacoes
+from src.models.ledger import SQLiteLedger
 from src.services.chargeback_processor import ChargebackProcessor
 from src.services.regulatory_reporter import RegulatoryReporter
+from src.services.pacing import resolver_pacing
+from src.services.event_bus import PublicadorEventos, EventBus, SinkArquivo
+from src.services.journal import JournalSimulacao
+from src.services.report_pipeline import gerar_relatorios
+from src.services.workload import GeradorCarga, TAMANHO_LOTE_PADRAO
+from src.services.metrics import Metricas
+from src.services.capture_batcher import TAMANHO_MAXIMO_LOTE, IDADE_MAXIMA_LOTE_S, LOTES_EM_VOO
 
 logger = logging.getLogger(__name__)
 
-class PaymentSimulator:
-    def __init__(self, output_dir="data/output/", log_callback=None):
+TAXA_DISPUTA = 0.0075 # Fração das capturadas que vira chargeback em run_ciclo_chargebacks
+DIAS_CICLO_CHARGEBACK = 120
+# Só transações capturadas (ou já liquidadas) podem ser disputadas
+_CODIGOS_DISPUTAVEIS = np.array([_CODIGO_POR_STATUS[s] for s in (StatusTransacao.CAPTURED, StatusTransacao.LIQUIDATED,
+                                                                  StatusTransacao.SETTLED)], dtype=np.uint8)
+
+class PaymentSimulator(PublicadorEventos):
+    def __init__(self, output_dir="data/output/", log_callback=None, pacing="realtime", eventos=None, seed=None, journal=None,
+                 ledger=None, saldo_inicial=2000.00, metricas=None):
         self.output_dir = output_dir
         self.log_callback = log_callback
+        # EventBus opcional: com ele os logs viram eventos em lote (ver event_bus.py) em vez de callbacks
+        self.eventos = eventos
+        # "realtime" para a demonstração no Streamlit, "unpaced" para execuções em lote
+        self.pacing = resolver_pacing(pacing)
+        # Seed das decisões simuladas; sem seed explícita sorteia uma e a guarda no journal
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2**63)
+        # Journal binário opcional (caminho ou JournalSimulacao) das transições de estado, para replay
+        if isinstance(journal, str):
+            journal = JournalSimulacao(journal, self.seed)
+        self.journal = journal
+        # Ledger dos saldos do emissor: em memória por padrão, ou SQLite (caminho) persistente
+        if isinstance(ledger, str):
+            ledger = SQLiteLedger(ledger)
+        self.ledger = ledger
 
-        logger.info("PaymentSimulator: Inicializando simulador.")
+        logger.info(f"PaymentSimulator: Inicializando simulador (pacing={self.pacing.nome}, seed={self.seed}).")
 
-        # Passa o callback para todas as entidades/serviços
-        self.adquirente = Adquirente("AdquirenteXPTO", log_callback=self.log_callback)
-        self.emissor = Emissor("BancoAlpha", log_callback=self.log_callback)
-        self.bandeira = Bandeira("BandeiraPrincipal", log_callback=self.log_callback)
-        self.cb_processor = ChargebackProcessor(log_callback=self.log_callback, output_dir=self.output_dir)
-        self.regulatory_reporter = RegulatoryReporter(output_dir=self.output_dir, log_callback=self.log_callback)
+        # Passa o callback, o bus de eventos e o pacing para todas as entidades/serviços
+        saida = {"log_callback": self.log_callback, "pacing": self.pacing, "eventos": self.eventos}
+        self.adquirente = Adquirente("AdquirenteXPTO", journal=self.journal, **saida)
+        self.emissor = Emissor("BancoAlpha", journal=self.journal, ledger=self.ledger, saldo_inicial=saldo_inicial, **saida)
+        self.bandeira = Bandeira("BandeiraPrincipal", seed=self.seed, journal=self.journal, **saida)
+        if self.ledger is not None:
+            self.ledger.continuar_sequencia(self.adquirente.alocador) # Ids não colidem com as aprovações já persistidas
+        self.cb_processor = ChargebackProcessor(output_dir=self.output_dir, **saida)
+        self.regulatory_reporter = RegulatoryReporter(output_dir=self.output_dir, **saida)
+        # Metricas opcional: cronometra as chamadas das entidades (sem ela nenhum método é envolvido)
+        self.metricas = metricas
+        if self.metricas is not None:
+            self.metricas.instrumentar_simulador(self)
 
-        self.estab_1 = Estabelecimento("Loja do Zé", "ESTAB001", log_callback=self.log_callback)
-        self.portador_1 = Portador("Maria Silva", "PORT001", log_callback=self.log_callback)
-        self.portador_2 = Portador("João Pereira", "PORT002", log_callback=self.log_callback)
+        # Todas as transações da simulação ficam em uma única tabela colunar
+        self.tabela = TabelaTransacoes()
+        self.estab_1 = Estabelecimento("Loja do Zé", "ESTAB001", tabela=self.tabela, **saida)
+        self.portador_1 = Portador("Maria Silva", "PORT001", **saida)
+        self.portador_2 = Portador("João Pereira", "PORT002", **saida)
+        if self.journal is not None:
+            self.journal.vincular(self.tabela, self.emissor.saldos)
 
         # Cadastro inicial dos dados
         self.adquirente.cadastrar_estabelecimento(self.estab_1)
         self.emissor.cadastrar_portador(self.portador_1)
         self.emissor.cadastrar_portador(self.portador_2)
 
+    def run_authorization_load(self, total_transacoes, valor=1.00):
+        """
+        Empurra total_transacoes autorizações pelo mesmo caminho da demonstração
+        (Estabelecimento → Adquirente → Bandeira → Emissor), alternando os portadores.
+        Retorna as estatísticas da execução, incluindo o TPS medido.
+        """
+        portadores = (self.portador_1, self.portador_2)
+        aprovadas = 0
+        inicio = time.perf_counter()
+        for i in range(total_transacoes):
+            if self.estab_1.iniciar_transacao(portadores[i % 2], valor, self.adquirente, self.bandeira, self.emissor):
+                aprovadas += 1
+        duracao = time.perf_counter() - inicio
+        if self.eventos is not None:
+            self.eventos.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        self.emissor.saldos.flush()
+        estatisticas = {
+            "pacing": self.pacing.nome,
+            "transacoes": total_transacoes,
+            "aprovadas": aprovadas,
+            "negadas": total_transacoes - aprovadas,
+            "duracao_s": duracao,
+            "tps": total_transacoes / duracao if duracao > 0 else float("inf"),
+        }
+        logger.info(f"PaymentSimulator: {total_transacoes} autorizações em {duracao:.3f}s ({estatisticas['tps']:.0f} TPS). "
+                    f"Tabela de transações: {self.tabela}")
+        return estatisticas
+
+    def run_workload(self, total_transacoes, gerador=None, tamanho_lote=TAMANHO_LOTE_PADRAO, captura_continua=False, **politica_captura):
+        """
+        Injeta um dia de carga sintética (GeradorCarga; por padrão com a seed do simulador)
+        em lotes colunares: cada lote vai direto para a tabela e passa pela autorização em
+        lote (Adquirente → Bandeira → Emissor). Retorna as mesmas estatísticas de run_authorization_load.
+        Com captura_continua, as aprovadas são capturadas durante a carga pelo LoteadorCaptura
+        da adquirente (politica_captura: tamanho_maximo, idade_maxima_s, lotes_em_voo).
+        """
+        gerador = gerador or GeradorCarga(self.seed)
+        self.emissor.cadastrar_portadores_lote(gerador.portador_ids)
+        if captura_continua:
+            self.adquirente.iniciar_captura_continua(self.bandeira, **politica_captura)
+        pendente = _CODIGO_POR_STATUS[StatusTransacao.PENDENTE]
+        aprovadas = 0
+        inicio = time.perf_counter()
+        try:
+            for lote in gerador.lotes(total_transacoes, tamanho_lote):
+                linhas = self.tabela.adicionar_lote(self.adquirente.alocador.ids_transacao_lote(len(lote)), lote.portador_ids,
+                                                    lote.estabelecimento_ids, lote.valores_centavos, lote.tipos, pendente,
+                                                    lote.timestamps_ns, lote.bins)
+                aprovadas += int(self.adquirente.receber_lote(self.tabela, np.arange(linhas.start, linhas.stop), lote.portador_ids,
+                                                              self.bandeira, self.emissor).sum())
+        finally:
+            captura = self.adquirente.encerrar_captura_continua() if captura_continua else None # Encerra a thread mesmo com erro
+        duracao = time.perf_counter() - inicio
+        if self.eventos is not None:
+            self.eventos.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        self.emissor.saldos.flush()
+        estatisticas = {
+            "pacing": self.pacing.nome,
+            "transacoes": total_transacoes,
+            "aprovadas": aprovadas,
+            "negadas": total_transacoes - aprovadas,
+            "duracao_s": duracao,
+            "tps": total_transacoes / duracao if duracao > 0 else float("inf"),
+        }
+        if captura is not None:
+            estatisticas["captura"] = captura
+        logger.info(f"PaymentSimulator: carga sintética de {total_transacoes} transações em {duracao:.3f}s "
+                    f"({estatisticas['tps']:.0f} TPS). Tabela de transações: {self.tabela}")
+        return estatisticas
+
+    def run_ciclo_chargebacks(self, dias=DIAS_CICLO_CHARGEBACK, taxa_disputa=TAXA_DISPUTA):
+        """
+        Abre disputas (taxa_disputa das transações já capturadas) pela Bandeira, como no fluxo
+        de chargeback, e avança o ciclo de vida delas em lote por `dias` dias; as transições
+        ficam no registro de chargebacks da Bandeira. Retorna a contagem por status.
+        """
+        tabela = self.tabela
+        elegiveis = np.flatnonzero(np.isin(tabela.coluna("status"), _CODIGOS_DISPUTAVEIS))
+        rng = np.random.default_rng([self.seed, 3, len(self.bandeira.chargebacks)]) # Outra amostra a cada chamada
+        disputadas = np.sort(rng.choice(elegiveis, int(rng.binomial(len(elegiveis), taxa_disputa)), replace=False))
+        registro = self.bandeira.chargebacks
+        abertas = 0
+        for txn_id in tabela.ids[disputadas].tolist():
+            txn_id = txn_id.decode("ascii")
+            if registro.por_transacao(txn_id) is None:
+                self.bandeira.registrar_chargeback(f"CB{txn_id}", txn_id, "Mercadoria Não Recebida")
+                abertas += 1
+        self.bandeira.avancar_ciclo_chargebacks(dias)
+        if self.eventos is not None:
+            self.eventos.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        logger.info(f"PaymentSimulator: {abertas} disputas abertas entre {len(elegiveis)} capturadas; ciclo de {dias} dias.")
+        return registro.contagem_por_status()
+
+    def gerar_relatorios_fim_do_dia(self, reference_month_year=None, processos=None):
+        """
+        Fechamento do dia sem pausas: CADOCs, faturamento 3040 e CNAB renderizados em paralelo
+        (ver report_pipeline.py) a partir de um snapshot da tabela. Retorna {relatório: arquivo}.
+        """
+        return gerar_relatorios(self.tabela, self.output_dir, reference_month_year=reference_month_year,
+                                adquirente=self.adquirente.nome, processos=processos)
+
     def run_full_simulation(self):
-        self.log_callback(
-            "[Simulador → Interno] Início: Iniciando a simulação completa...",
-            "black",
-            {"description": "Iniciando Simulação Completa...", "active_entities": [], "flow_path": None}
-        )
-        time.sleep(0.5)
+        self._evento("[Simulador → Interno] Início: Iniciando a simulação completa...",
+                     animacao=("Iniciando Simulação Completa...", (), None))
+        self._pausa(0.5)
 
         # --- 1. FLUXO DE AUTORIZAÇÃO EM TEMPO REAL (ISO 8583) ---
-        self.log_callback("--- 1. FLUXO DE AUTORIZAÇÃO EM TEMPO REAL (ISO 8583) ---", "white",
-                          {"description": "Fluxo de Autorização (ISO 8583)", "active_entities": [], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 1. FLUXO DE AUTORIZAÇÃO EM TEMPO REAL (ISO 8583) ---",
+                     cor="white", animacao=("Fluxo de Autorização (ISO 8583)", (), None))
+        self._pausa(0.5)
 
         # Transação Aprovada
-        self.log_callback(
-            f"[Portador → Estabelecimento] Passagem de Cartão: Cartão {self.portador_1.numero_cartao} - R150.00",
-            "black",
-            {"description": "Cliente passa cartão", "active_entities": ["client", "store"], "flow_path": "client_to_store_token"}
-        )
+        self._evento("[Portador → Estabelecimento] Passagem de Cartão: Cartão %s - R150.00", self.portador_1.numero_cartao,
+                     animacao=("Cliente passa cartão", ("client", "store"), "client_to_store_token"))
         autorizada_1 = self.estab_1.iniciar_transacao(self.portador_1, 150.00, self.adquirente, self.bandeira, self.emissor)
         
         # Transação Negada (Saldo Insuficiente)
-        self.log_callback(
-            f"[Portador -> Estabelecimento] Passagem de Cartão: Cartão {self.portador_2.numero_cartao} - R1200.00",
-            "black",
-            {"description": "Cliente passa cartão", "active_entities": ["client", "store"], "flow_path": "client_to_store_token"}
-        )
+        self._evento("[Portador -> Estabelecimento] Passagem de Cartão: Cartão %s - R1200.00", self.portador_2.numero_cartao,
+                     animacao=("Cliente passa cartão", ("client", "store"), "client_to_store_token"))
         autorizada_2 = self.estab_1.iniciar_transacao(self.portador_2, 1200.00, self.adquirente, self.bandeira, self.emissor)
         
-        self.log_callback("--- FIM DA AUTORIZAÇÃO ---", "white",
-                          {"description": "Autorização Concluída", "active_entities": [], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- FIM DA AUTORIZAÇÃO ---",
+                     cor="white", animacao=("Autorização Concluída", (), None))
+        self._pausa(0.5)
 
         # --- 2. PROCESSO DE CAPTURA (Lotes - Adquirente → Bandeira) ---
-        self.log_callback("--- 2. PROCESSO DE CAPTURA (Lotes - Adquirente → Bandeira) ---", "white",
-                          {"description": "Iniciando Captura de Lotes", "active_entities": ["acquirer"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 2. PROCESSO DE CAPTURA (Lotes - Adquirente → Bandeira) ---",
+                     cor="white", animacao=("Iniciando Captura de Lotes", ("acquirer",), None))
+        self._pausa(0.5)
         # Adquirente envia lote de transações aprovadas para a Bandeira
         lote_captura = self.adquirente.transacoes_aprovadas
         if lote_captura:
             self.bandeira.processar_captura(lote_captura)
             self.adquirente.limpar_transacoes_aprovadas() # Limpa após enviar para captura
         else:
-            self.log_callback("Nenhuma transação para capturar.", "black")
-        self.log_callback("--- FIM DA CAPTURA ---", "white",
-                          {"description": "Captura Concluída", "active_entities": ["acquirer", "flag"], "flow_path": None})
-        time.sleep(0.5)
+            self._evento("Nenhuma transação para capturar.")
+        self._evento("--- FIM DA CAPTURA ---",
+                     cor="white", animacao=("Captura Concluída", ("acquirer", "flag"), None))
+        self._pausa(0.5)
 
         # --- 3. PROCESSO DE LIQUIDAÇÃO (Lotes - Bandeira → Adquirente e Emissor) ---
-        self.log_callback("--- 3. PROCESSO DE LIQUIDAÇÃO (Lotes - Bandeira → Adquirente e Emissor) ---", "white",
-                          {"description": "Iniciando Liquidação", "active_entities": ["flag"], "flow_path": None})
-        time.sleep(0.5)
-        self.bandeira.iniciar_liquidacao(self.adquirente, self.emissor)
-        self.log_callback("--- FIM DA LIQUIDAÇÃO ---", "white",
-                          {"description": "Liquidação Concluída", "active_entities": ["flag", "acquirer", "issuer"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 3. PROCESSO DE LIQUIDAÇÃO (Lotes - Bandeira → Adquirente e Emissor) ---",
+                     cor="white", animacao=("Iniciando Liquidação", ("flag",), None))
+        self._pausa(0.5)
+        self.bandeira.iniciar_liquidacao(self.adquirente, self.emissor, self.output_dir)
+        self._evento("--- FIM DA LIQUIDAÇÃO ---",
+                     cor="white", animacao=("Liquidação Concluída", ("flag", "acquirer", "issuer"), None))
+        self._pausa(0.5)
 
         # --- 4. PROCESSO DE PAGAMENTO (Lotes - Adquirente → Bancos dos Estabelecimentos - CNAB) ---
-        self.log_callback("--- 4. PROCESSO DE PAGAMENTO (Lotes - Adquirente → Bancos dos Estabelecimentos - CNAB) ---", "white",
-                          {"description": "Iniciando Pagamento ao Lojista (CNAB)", "active_entities": ["acquirer"], "flow_path": None})
-        time.sleep(0.5)
-        self.adquirente.iniciar_pagamento_estabelecimentos()
-        self.log_callback("--- FIM DO PAGAMENTO ---", "white",
-                          {"description": "Pagamento Concluído", "active_entities": ["acquirer", "store"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 4. PROCESSO DE PAGAMENTO (Lotes - Adquirente → Bancos dos Estabelecimentos - CNAB) ---",
+                     cor="white", animacao=("Iniciando Pagamento ao Lojista (CNAB)", ("acquirer",), None))
+        self._pausa(0.5)
+        self.adquirente.iniciar_pagamento_estabelecimentos(self.bandeira.ultima_liquidacao, self.output_dir)
+        self._evento("--- FIM DO PAGAMENTO ---",
+                     cor="white", animacao=("Pagamento Concluído", ("acquirer", "store"), None))
+        self._pausa(0.5)
 
         # --- 5. PROCESSO DE FATURAMENTO (Lotes - Emissor → Sistemas Internos/Regulatórios) ---
-        self.log_callback("--- 5. PROCESSO DE FATURAMENTO (Lotes - Emissor → Sistemas Internos/Regulatórios) ---", "white",
-                          {"description": "Iniciando Faturamento do Emissor", "active_entities": ["issuer"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 5. PROCESSO DE FATURAMENTO (Lotes - Emissor → Sistemas Internos/Regulatórios) ---",
+                     cor="white", animacao=("Iniciando Faturamento do Emissor", ("issuer",), None))
+        self._pausa(0.5)
         self.emissor.iniciar_faturamento()
-        self.log_callback("--- FIM DO FATURAMENTO ---", "white",
-                          {"description": "Faturamento Concluído", "active_entities": ["issuer", "client"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- FIM DO FATURAMENTO ---",
+                     cor="white", animacao=("Faturamento Concluído", ("issuer", "client"), None))
+        self._pausa(0.5)
 
         # --- 6. FLUXO DE CHARGEBACK (DISPUTA DE COMPRA) ---
-        self.log_callback("--- 6. FLUXO DE CHARGEBACK (DISPUTA DE COMPRA) ---", "white",
-                          {"description": "Iniciando Fluxo de Chargeback", "active_entities": ["client"], "flow_path": None})
-        time.sleep(0.5)
+        self._evento("--- 6. FLUXO DE CHARGEBACK (DISPUTA DE COMPRA) ---",
+                     cor="white", animacao=("Iniciando Fluxo de Chargeback", ("client",), None))
+        self._pausa(0.5)
         # Vamos simular um chargeback para a primeira transação (aprovada)
-        transacao_para_chargeback = next((t for t in self.bandeira.transacoes_capturadas if t.portador_id == self.portador_1.id), None)
+        capturadas = self.bandeira.capturadas_do_portador(self.portador_1.id)
+        transacao_para_chargeback = capturadas[0] if capturadas else None
         if transacao_para_chargeback:
             self.cb_processor.processar_chargeback(
                 self.portador_1, 
@@ -121,24 +264,99 @@ class PaymentSimulator:
                 transacao_para_chargeback
             )
         else:
-            self.log_callback("Nenhuma transação capturada para simular chargeback.", "orange",
-                              {"description": "Chargeback Não Simulado", "active_entities": [], "flow_path": None})
-        self.log_callback("--- FIM DO CHARGEBACK ---", "white",
-                          {"description": "Fluxo de Chargeback Concluído", "active_entities": [], "flow_path": None})
-        time.sleep(0.5)
+            self._evento("Nenhuma transação capturada para simular chargeback.",
+                         cor="orange", animacao=("Chargeback Não Simulado", (), None))
+        self._evento("--- FIM DO CHARGEBACK ---",
+                     cor="white", animacao=("Fluxo de Chargeback Concluído", (), None))
+        self._pausa(0.5)
 
         # --- 7. ARQUIVOS REGULATÓRIOS (Adquirente/Emissor → Banco Central) ---
-        self.log_callback("--- 7. ARQUIVOS REGULATÓRIOS (Adquirente/Emissor → Banco Central) ---", "white",
-                          {"description": "Iniciando Relatórios Regulatórios", "active_entities": ["bcb"], "flow_path": None})
-        time.sleep(0.5)
-        self.regulatory_reporter.generate_all_reports()
-        self.log_callback("--- FIM DOS REGULATÓRIOS ---", "white",
-                          {"description": "Relatórios Regulatórios Concluídos", "active_entities": ["bcb"], "flow_path": None})
-        time.sleep(0.5)
-
-
-        self.log_callback(
-            "[Simulador → Interno] Fim: Simulação completa concluída!",
-            "green",
-            {"description": "Simulação Concluída!", "active_entities": [], "flow_path": None}
-        )
+        self._evento("--- 7. ARQUIVOS REGULATÓRIOS (Adquirente/Emissor → Banco Central) ---",
+                     cor="white", animacao=("Iniciando Relatórios Regulatórios", ("bcb",), None))
+        self._pausa(0.5)
+        self.regulatory_reporter.generate_all_reports(tabela=self.tabela, adquirente=self.adquirente.nome)
+        self._evento("--- FIM DOS REGULATÓRIOS ---",
+                     cor="white", animacao=("Relatórios Regulatórios Concluídos", ("bcb",), None))
+        self._pausa(0.5)
+
+
+        self._evento("[Simulador → Interno] Fim: Simulação completa concluída!",
+                     cor="green", animacao=("Simulação Concluída!", (), None))
+        if self.eventos is not None:
+            self.eventos.flush()
+        if self.journal is not None:
+            self.journal.flush()
+        self.emissor.saldos.flush()
+
+
+if __name__ == "__main__":
+    # Execução headless: python -m src.services.simulation --pacing unpaced --transacoes 100000
+    parser = argparse.ArgumentParser(description="Simulador de pagamentos em modo headless.")
+    parser.add_argument("--pacing", default="unpaced", choices=["realtime", "unpaced"])
+    parser.add_argument("--transacoes", type=int, default=100000)
+    parser.add_argument("--valor", type=float, default=1.00)
+    parser.add_argument("--log-eventos", default=None, help="Arquivo que recebe os eventos de log/animação.")
+    parser.add_argument("--nivel-eventos", default="INFO", choices=["DEBUG", "INFO"])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ledger", default=None, help="Banco SQLite dos saldos do emissor (persiste entre execuções).")
+    parser.add_argument("--saldo-inicial", type=float, default=2000.00)
+    parser.add_argument("--journal", default=None, help="Arquivo do journal binário (replay: python -m src.services.journal).")
+    parser.add_argument("--snapshot-a-cada", type=int, default=None, help="Registros do journal entre snapshots.")
+    parser.add_argument("--metricas", default=None, help="Arquivo .prom (formato Prometheus) com as latências por etapa.")
+    parser.add_argument("--metricas-porta", type=int, default=None, help="Expõe /metrics nesta porta durante a execução.")
+    parser.add_argument("--carga-sintetica", action="store_true",
+                        help="Injeta --transacoes de carga sintética (GeradorCarga) em lotes, em vez de --valor repetido.")
+    parser.add_argument("--captura-continua", action="store_true",
+                        help="Com --carga-sintetica, captura as aprovadas durante a carga em lotes por tamanho/idade.")
+    parser.add_argument("--lote-captura", type=int, default=TAMANHO_MAXIMO_LOTE, help="Transações por lote de captura.")
+    parser.add_argument("--idade-lote-captura", type=float, default=IDADE_MAXIMA_LOTE_S,
+                        help="Segundos até um lote de captura incompleto ser enviado.")
+    parser.add_argument("--lotes-em-voo", type=int, default=LOTES_EM_VOO,
+                        help="Lotes aguardando a Bandeira antes de a adquirente bloquear (backpressure).")
+    parser.add_argument("--ciclo-chargebacks", type=int, default=None, metavar="DIAS",
+                        help="Depois da carga, abre disputas entre as capturadas e avança o ciclo delas por DIAS dias.")
+    parser.add_argument("--taxa-disputa", type=float, default=TAXA_DISPUTA)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    eventos = None
+    if args.log_eventos:
+        eventos = EventBus(nivel=getattr(logging, args.nivel_eventos))
+        eventos.adicionar_sink(SinkArquivo(args.log_eventos, "w"))
+    seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2**63)
+    journal = JournalSimulacao(args.journal, seed, args.snapshot_a_cada) if args.journal else None
+    metricas = Metricas() if args.metricas or args.metricas_porta is not None else None
+    if args.metricas_porta is not None:
+        metricas.servir(args.metricas_porta)
+    simulator = PaymentSimulator(pacing=args.pacing, eventos=eventos, seed=seed, journal=journal,
+                                 ledger=args.ledger, saldo_inicial=args.saldo_inicial, metricas=metricas)
+    if args.carga_sintetica:
+        resultado = simulator.run_workload(args.transacoes, captura_continua=args.captura_continua,
+                                           tamanho_maximo=args.lote_captura, idade_maxima_s=args.idade_lote_captura,
+                                           lotes_em_voo=args.lotes_em_voo)
+    else:
+        resultado = simulator.run_authorization_load(args.transacoes, args.valor)
+    chargebacks = simulator.run_ciclo_chargebacks(args.ciclo_chargebacks, args.taxa_disputa) if args.ciclo_chargebacks else None
+    if eventos is not None:
+        eventos.fechar()
+    if journal is not None:
+        journal.fechar()
+        print(f"Journal: {journal}")
+    if simulator.ledger is not None:
+        simulator.ledger.fechar()
+        print(f"Ledger: {simulator.ledger}")
+    print(f"{resultado['transacoes']} transações ({resultado['aprovadas']} aprovadas) em "
+          f"{resultado['duracao_s']:.3f}s - {resultado['tps']:.0f} TPS [{resultado['pacing']}]")
+    if "captura" in resultado:
+        captura = resultado["captura"]
+        print(f"Captura contínua: {captura['capturadas']} capturadas em {captura['lotes']} lotes {captura['lotes_por_motivo']}, "
+              f"{captura['bloqueios']} bloqueios ({captura['tempo_bloqueado_s']:.3f}s bloqueado)")
+    if chargebacks is not None:
+        print(f"Chargebacks após {args.ciclo_chargebacks} dias: {chargebacks}")
+    if metricas is not None:
+        for linha in (linha for linha in metricas.resumo() if linha["chamadas"]):
+            print(f"{linha['etapa']:<42}{linha['chamadas']:>10} chamadas  p50 {linha['p50_ms']:.3f}ms  "
+                  f"p99 {linha['p99_ms']:.3f}ms  máx {linha['max_ms']:.3f}ms")
+        if args.metricas:
+            print(f"Métricas: {metricas.gravar_prometheus(args.metricas)}")
+        metricas.parar_servidor()
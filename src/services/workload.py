@@ -0,0 +1,153 @@
+# src/services/workload.py
+import math
+import random
+import logging
+import argparse
+import datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Peso relativo de cada hora do dia (0h a 23h): madrugada quase parada, pico no almoço e no fim da tarde
+CURVA_DIURNA_PADRAO = (0.6, 0.35, 0.25, 0.2, 0.25, 0.5, 1.2, 2.6, 4.2, 5.4, 6.2, 7.4,
+                       8.3, 7.6, 6.4, 6.0, 6.3, 7.1, 8.0, 7.8, 6.5, 4.6, 2.8, 1.4)
+
+# Faixas de BIN por tipo de cartão: (início, fim, peso) — 4xxxxx no padrão Visa, 51-55 e 2221-2720 no Mastercard, Elo
+FAIXAS_BIN_PADRAO = {
+    "credito": ((400000, 499999, 0.45), (510000, 559999, 0.35), (222100, 272099, 0.05), (636368, 636369, 0.15)),
+    "debito": ((400000, 499999, 0.5), (510000, 559999, 0.2), (506699, 506778, 0.3)),
+}
+
+TAMANHO_LOTE_PADRAO = 1 << 16
+_NS_POR_HORA = 3_600 * 1_000_000_000
+
+
+def _acumulada(pesos):
+    """Distribuição acumulada normalizada (última posição exatamente 1.0, para o searchsorted)."""
+    acumulada = np.cumsum(np.asarray(pesos, dtype=np.float64))
+    acumulada /= acumulada[-1]
+    acumulada[-1] = 1.0
+    return acumulada
+
+
+class LoteCarga:
+    """Um lote colunar de transações sintéticas, no formato de TabelaTransacoes.adicionar_lote."""
+    __slots__ = ("indice", "portador_ids", "estabelecimento_ids", "valores_centavos", "tipos", "bins", "timestamps_ns")
+
+    def __init__(self, indice, portador_ids, estabelecimento_ids, valores_centavos, tipos, bins, timestamps_ns):
+        self.indice = indice
+        self.portador_ids = portador_ids
+        self.estabelecimento_ids = estabelecimento_ids
+        self.valores_centavos = valores_centavos
+        self.tipos = tipos
+        self.bins = bins
+        self.timestamps_ns = timestamps_ns
+
+    def __len__(self):
+        return len(self.valores_centavos)
+
+    def __repr__(self):
+        return f"LoteCarga(#{self.indice}, {len(self)} transações)"
+
+
+class GeradorCarga:
+    """
+    Gerador de carga sintética com seed: popularidade dos estabelecimentos em Zipf
+    (expoente_zipf), tíquete log-normal (mediana em reais e dispersão do log), chegadas
+    distribuídas pela curva diurna ao longo de `dia`, mix crédito/débito e BINs sorteados
+    nas faixas de cada tipo. Portadores são escolhidos uniformemente na população.
+
+    Os lotes saem em ordem de chegada e cada um usa um gerador próprio derivado de
+    (seed, índice do lote): o dia não é materializado e o lote N sai igual em qualquer
+    execução, gerado em sequência ou isoladamente.
+    """
+    def __init__(self, seed=None, estabelecimentos=1000, portadores=100_000, expoente_zipf=1.1, ticket_mediano=85.0,
+                 dispersao_ticket=0.9, fracao_credito=0.65, curva_diurna=CURVA_DIURNA_PADRAO, faixas_bin=FAIXAS_BIN_PADRAO, dia=None):
+        if len(curva_diurna) != 24:
+            raise ValueError(f"A curva diurna precisa de 24 pesos (um por hora), recebeu {len(curva_diurna)}.")
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2**63)
+        self.estabelecimento_ids = np.array([f"ESTAB{i:06d}" for i in range(1, estabelecimentos + 1)], dtype=object)
+        self.portador_ids = np.array([f"PORT{i:08d}" for i in range(1, portadores + 1)], dtype=object)
+        self.expoente_zipf = expoente_zipf
+        self.log_ticket_mediano = math.log(ticket_mediano * 100) # Log-normal em centavos
+        self.dispersao_ticket = dispersao_ticket
+        self.fracao_credito = fracao_credito
+        self._acumulada_estabelecimentos = _acumulada(np.arange(1, estabelecimentos + 1, dtype=np.float64) ** -expoente_zipf)
+        self._acumulada_horas = np.r_[0.0, _acumulada(curva_diurna)]
+        self._faixas = {}
+        for tipo, faixas in faixas_bin.items():
+            inicios, fins, pesos = (np.array(coluna) for coluna in zip(*faixas))
+            self._faixas[tipo] = (inicios, fins, _acumulada(pesos))
+        dia = dia or datetime.date.today()
+        self.dia = dia
+        self.inicio_ns = int(datetime.datetime.combine(dia, datetime.time()).timestamp()) * 1_000_000_000
+
+    def _instantes(self, quantis):
+        """Inverte a curva diurna (constante por hora): quantil do dia em [0, 1) -> timestamp em ns."""
+        acumulada = self._acumulada_horas
+        hora = np.clip(np.searchsorted(acumulada, quantis, side="right") - 1, 0, 23)
+        fracao = (quantis - acumulada[hora]) / (acumulada[hora + 1] - acumulada[hora])
+        return self.inicio_ns + ((hora + fracao) * _NS_POR_HORA).astype(np.int64)
+
+    def _bins(self, rng, credito):
+        bins = np.empty(len(credito), dtype=np.int64)
+        for tipo, selecao in (("credito", credito), ("debito", ~credito)):
+            quantidade = int(selecao.sum())
+            inicios, fins, acumulada = self._faixas[tipo]
+            faixa = np.searchsorted(acumulada, rng.random(quantidade), side="right")
+            bins[selecao] = rng.integers(inicios[faixa], fins[faixa] + 1)
+        return bins.astype("S6")
+
+    def lote(self, indice, tamanho, total):
+        """Lote `indice` (até tamanho transações) de um dia com `total` transações."""
+        inicio = indice * tamanho
+        quantidade = min(tamanho, total - inicio)
+        if quantidade <= 0:
+            raise IndexError(f"Lote {indice} fora do dia de {total} transações em lotes de {tamanho}.")
+        rng = np.random.default_rng([self.seed, indice])
+        # Este lote cobre a fatia [inicio, inicio + quantidade) / total da curva do dia, em ordem de chegada
+        quantis = (inicio + np.sort(rng.random(quantidade)) * quantidade) / total
+        estabelecimentos = np.searchsorted(self._acumulada_estabelecimentos, rng.random(quantidade), side="right")
+        portadores = rng.integers(0, len(self.portador_ids), quantidade)
+        valores = np.maximum(np.rint(rng.lognormal(self.log_ticket_mediano, self.dispersao_ticket, quantidade)), 1).astype(np.int64)
+        credito = rng.random(quantidade) < self.fracao_credito
+        return LoteCarga(indice, self.portador_ids[portadores], self.estabelecimento_ids[estabelecimentos], valores,
+                         np.where(credito, "credito", "debito").tolist(), self._bins(rng, credito), self._instantes(quantis))
+
+    def lotes(self, total, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        """Gera os lotes do dia em sequência; só um lote fica em memória por vez."""
+        for indice in range(math.ceil(total / tamanho_lote)):
+            yield self.lote(indice, tamanho_lote, total)
+
+    def __repr__(self):
+        return (f"GeradorCarga(seed={self.seed}, {len(self.estabelecimento_ids)} estabelecimentos, "
+                f"{len(self.portador_ids)} portadores, dia={self.dia.isoformat()})")
+
+
+if __name__ == "__main__":
+    # python -m src.services.workload --transacoes 5000000 --seed 42
+    from src.services.simulation import PaymentSimulator
+
+    parser = argparse.ArgumentParser(description="Carga sintética de um dia de transações injetada no simulador em lotes.")
+    parser.add_argument("--transacoes", type=int, default=1_000_000)
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_PADRAO)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--estabelecimentos", type=int, default=1000)
+    parser.add_argument("--portadores", type=int, default=100_000)
+    parser.add_argument("--saldo-inicial", type=float, default=20_000.00)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    gerador = GeradorCarga(args.seed, args.estabelecimentos, args.portadores)
+    simulator = PaymentSimulator(pacing="unpaced", seed=gerador.seed, saldo_inicial=args.saldo_inicial)
+    resultado = simulator.run_workload(args.transacoes, gerador, args.tamanho_lote)
+    tabela = simulator.tabela
+    valores = tabela.coluna("valor_centavos") / 100
+    estabelecimentos = np.bincount(tabela.coluna("estabelecimento"))
+    horas = np.bincount((tabela.coluna("timestamp_ns") - gerador.inicio_ns) // _NS_POR_HORA, minlength=24)
+    print(f"{gerador}")
+    print(f"{resultado['transacoes']} transações ({resultado['aprovadas']} aprovadas) em "
+          f"{resultado['duracao_s']:.3f}s - {resultado['tps']:.0f} TPS")
+    print(f"Tíquete: mediana R${np.median(valores):.2f}, média R${valores.mean():.2f}, p99 R${np.percentile(valores, 99):.2f}")
+    print(f"Top 10 estabelecimentos: {np.sort(estabelecimentos)[::-1][:10].sum() / len(valores):.1%} das transações")
+    print("Transações por hora: " + " ".join(f"{h:02d}h={q}" for h, q in enumerate(horas.tolist())))
@@ -0,0 +1,133 @@
+# src/services/xml_writer.py
+import re
+import gzip
+from itertools import chain, islice
+
+# Quantos caracteres ficam acumulados antes de codificar e gravar: a memória do escritor
+# é a de um buffer, independente de quantos registros passam por ele.
+TAMANHO_BUFFER_PADRAO = 1 << 20
+
+# Registros formatados por vez em escrever_registros
+TAMANHO_CHUNK_REGISTROS = 1024
+
+# Caracteres proibidos em XML 1.0: controles fora tab/LF/CR, U+FFFE e U+FFFF. Em
+# escrever_registros o NUL separa os valores unidos (a contagem dos pedaços é que o detecta).
+_PROIBIDOS_SEM_NUL = "\x01-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff"
+_ESPECIAIS = re.compile(f'[&<>"\x00{_PROIBIDOS_SEM_NUL}]').search
+_INVALIDOS = re.compile(f"[\x00{_PROIBIDOS_SEM_NUL}]").search
+_ESPECIAIS_SEM_NUL = re.compile(f'[&<>"{_PROIBIDOS_SEM_NUL}]').search
+_INVALIDOS_SEM_NUL = re.compile(f"[{_PROIBIDOS_SEM_NUL}]").search
+
+
+def _escapar(texto, especiais, invalidos):
+    if especiais(texto) is None: # Caso comum: uma varredura só, sem cópia
+        return texto
+    invalido = invalidos(texto)
+    if invalido is not None:
+        raise ValueError(f"Caractere U+{ord(invalido.group()):04X} não é permitido em XML.")
+    return (texto.replace("&", "&amp;").replace("<", "&lt;")
+            .replace(">", "&gt;").replace('"', "&quot;"))
+
+
+def escapar(valor):
+    """
+    Texto do valor com &, <, > e aspas escapados (serve para conteúdo e para atributos).
+    Caracteres que não podem aparecer em XML 1.0 levantam ValueError.
+    """
+    return _escapar(str(valor), _ESPECIAIS, _INVALIDOS)
+
+
+class EscritorXML:
+    """
+    Emissor de XML incremental: elementos são escritos na ordem em que chegam, com
+    valores escapados, em um buffer gravado (UTF-8, opcionalmente em gzip) a cada
+    tamanho_buffer caracteres. escrever_registros consome um iterador de tuplas com um
+    modelo montado uma vez por tipo de registro, o caminho rápido para arquivos grandes.
+    """
+    def __init__(self, caminho, compactar=False, tamanho_buffer=TAMANHO_BUFFER_PADRAO, nivel_compressao=6, indentacao="  "):
+        self.caminho = caminho
+        self.tamanho_buffer = tamanho_buffer
+        self.indentacao = indentacao
+        self._arquivo = gzip.open(caminho, "wb", compresslevel=nivel_compressao) if compactar else open(caminho, "wb")
+        self._buffer = []
+        self._pendente = 0 # Caracteres no buffer
+        self._abertos = [] # Pilha de tags abertas
+        self.bytes_escritos = 0 # Bytes de XML (antes da compressão)
+
+    def _escrever(self, texto):
+        self._buffer.append(texto)
+        self._pendente += len(texto)
+        if self._pendente >= self.tamanho_buffer:
+            self.flush()
+
+    def _recuo(self):
+        return self.indentacao * len(self._abertos)
+
+    @staticmethod
+    def _atributos(atributos):
+        return "".join(f' {nome}="{escapar(valor)}"' for nome, valor in atributos.items())
+
+    def iniciar(self, tag, **atributos):
+        """Abre <tag ...> e passa a indentar os filhos um nível abaixo."""
+        self._escrever(f"{self._recuo()}<{tag}{self._atributos(atributos)}>\n")
+        self._abertos.append(tag)
+        return self
+
+    def terminar(self):
+        """Fecha a última tag aberta."""
+        tag = self._abertos.pop()
+        self._escrever(f"{self._recuo()}</{tag}>\n")
+        return self
+
+    def elemento(self, tag, texto, **atributos):
+        self._escrever(f"{self._recuo()}<{tag}{self._atributos(atributos)}>{escapar(texto)}</{tag}>\n")
+        return self
+
+    def escrever_registros(self, tag, atributos, campos, registros, tamanho_chunk=TAMANHO_CHUNK_REGISTROS):
+        """
+        Um <tag atributos...> com um elemento filho por campo para cada tupla de registros
+        (valores dos atributos e depois dos campos, na ordem). Retorna quantos foram escritos.
+        Os valores de um chunk de registros são unidos por NUL (proibido em XML) e escapados
+        de uma vez; o modelo repetido tamanho_chunk vezes formata o chunk em uma chamada.
+        """
+        recuo = self._recuo()
+        modelo = (f"{recuo}<{tag}" + "".join(f' {nome}="{{}}"' for nome in atributos) + ">\n"
+                  + "".join(f"{recuo}{self.indentacao}<{campo}>{{}}</{campo}>\n" for campo in campos)
+                  + f"{recuo}</{tag}>\n")
+        valores_por_registro = len(atributos) + len(campos)
+        modelo_chunk = modelo * tamanho_chunk
+        registros = iter(registros)
+        quantidade = 0
+        while True:
+            chunk = list(islice(registros, tamanho_chunk))
+            if not chunk:
+                return quantidade
+            valores = _escapar("\0".join(map(str, chain.from_iterable(chunk))), _ESPECIAIS_SEM_NUL, _INVALIDOS_SEM_NUL).split("\0")
+            if len(valores) != len(chunk) * valores_por_registro:
+                raise ValueError(f"Registro de {tag} com quantidade de valores diferente de {valores_por_registro} ou com caractere NUL.")
+            self._escrever((modelo_chunk if len(chunk) == tamanho_chunk else modelo * len(chunk)).format(*valores))
+            quantidade += len(chunk)
+
+    def flush(self):
+        if self._buffer:
+            dados = "".join(self._buffer).encode("utf-8")
+            self._arquivo.write(dados)
+            self.bytes_escritos += len(dados)
+            self._buffer = []
+            self._pendente = 0
+
+    def fechar(self):
+        """Fecha as tags ainda abertas, grava o buffer e fecha o arquivo."""
+        if self._arquivo is None:
+            return
+        while self._abertos:
+            self.terminar()
+        self.flush()
+        self._arquivo.close()
+        self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        self.fechar()